@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Downloader throughput benchmark for Naturschutzgebiete PDFs.
+
+Serves the PDFs in scripts/pdfExtractor/data/ from a local stand-in for the
+LANIS server with configurable latency, bandwidth cap and injected failures
+(truncated bodies, 429, 500), runs the download engine of download_pdfs.py
+against it and reports files/s, MB/s and retries. Results can be appended to
+a JSON lines file to compare changes to the download engine run-over-run.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from download_pdfs import DEFAULT_WORKERS, create_session, download_all
+from manifest import DownloadManifest
+from store import STORES
+from throttle import DEFAULT_RATE, DEFAULT_RETRY_BUDGET, Throttle
+
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "pdfExtractor" / "data"
+DEFAULT_PORT = 8780
+SEND_BLOCK = 16384
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """GET handler with ETag/Range support and fault injection, configured on the server."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        entry = server.files.get(self.path.lstrip('/'))
+        if entry is None:
+            self._send_empty(404)
+            return
+        
+        if server.latency:
+            time.sleep(server.latency)
+        
+        roll = server.rng.random()
+        if roll < server.fail_429:
+            self._send_empty(429, {'Retry-After': '1'})
+            return
+        roll -= server.fail_429
+        if roll < server.fail_500:
+            self._send_empty(500)
+            return
+        roll -= server.fail_500
+        truncate = roll < server.truncate
+        
+        path, etag = entry
+        if self.headers.get('If-None-Match') == etag:
+            self._send_empty(304, {'ETag': etag})
+            return
+        
+        size = os.path.getsize(path)
+        start = 0
+        range_header = self.headers.get('Range', '')
+        if_range = self.headers.get('If-Range')
+        if range_header.startswith('bytes=') and range_header.endswith('-') and if_range in (None, etag):
+            start = int(range_header[len('bytes='):-1])
+            if start >= size:
+                self._send_empty(416, {'Content-Range': f'bytes */{size}'})
+                return
+        
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+        self.end_headers()
+        
+        # A truncated response stops halfway and drops the connection
+        stop = start + (size - start) // 2 if truncate else size
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                block = f.read(min(SEND_BLOCK, remaining))
+                if not block:
+                    break
+                self.wfile.write(block)
+                remaining -= len(block)
+                if server.bandwidth:
+                    time.sleep(len(block) / server.bandwidth)
+        if truncate:
+            self.close_connection = True
+    
+    def _send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def serve(data_dir, port, latency, bandwidth, fail_429, fail_500, truncate, seed):
+    """Run the stand-in server until the process is terminated."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    server.daemon_threads = True
+    server.files = {}
+    for pdf in sorted(Path(data_dir).glob('*.pdf')):
+        etag = '"' + hashlib.sha256(pdf.read_bytes()).hexdigest()[:16] + '"'
+        server.files[pdf.name] = (str(pdf), etag)
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.fail_429 = fail_429
+    server.fail_500 = fail_500
+    server.truncate = truncate
+    server.rng = random.Random(seed)
+    server.serve_forever()
+
+
+def wait_for_server(port, timeout=10):
+    """Block until the stand-in server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Stand-in server did not start on port {port}")
+
+
+def run_once(urls, output_dir, workers, layout, rate, retry_budget):
+    """Run the download engine once and return its stats plus timing."""
+    session = create_session(workers)
+    store = STORES[layout](output_dir)
+    manifest = DownloadManifest(Path(output_dir) / "manifest.json")
+    throttle = Throttle(rate, workers, retry_budget)
+    
+    started = time.perf_counter()
+    stats = download_all(urls, store, session, workers, manifest, throttle=throttle)
+    elapsed = time.perf_counter() - started
+    store.save()
+    manifest.save()
+    session.close()
+    
+    downloaded = sum(
+        entry['size'] for name, entry in manifest.files.items()
+        if name in manifest.last_sync.get('new', []) + manifest.last_sync.get('updated', [])
+    )
+    completed = stats['new'] + stats['updated'] + stats['unchanged']
+    return {
+        'seconds': round(elapsed, 3),
+        'files': completed,
+        'failed': stats['failed'],
+        'megabytes': round(downloaded / 1e6, 3),
+        'files_per_s': round(completed / elapsed, 2) if elapsed else None,
+        'mb_per_s': round(downloaded / 1e6 / elapsed, 3) if elapsed else None,
+        'retries': throttle.budget.retries,
+        'retries_refused': throttle.budget.denied,
+        'hosts': throttle.summary(),
+    }
+
+
+def print_result(name, result):
+    print(f"{name}: {result['files']} files in {result['seconds']:.2f}s "
+          f"({result['files_per_s']} files/s, {result['mb_per_s']} MB/s), "
+          f"{result['failed']} failed, {result['retries']} retries "
+          f"({result['retries_refused']} refused)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark download_pdfs.py against a local stand-in server'
+    )
+    parser.add_argument('--data-dir', default=str(DEFAULT_DATA_DIR), help='Directory with the PDFs to serve')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Server port (default: {DEFAULT_PORT})')
+    parser.add_argument('--limit', type=int, help='Only serve the first N PDFs')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS,
+                        help=f'Concurrent downloads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--layout', choices=sorted(STORES), default='flat', help='Output layout (default: flat)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f'Client rate limit per host in requests/s (default: {DEFAULT_RATE:g})')
+    parser.add_argument('--retry-budget', type=float, default=DEFAULT_RETRY_BUDGET,
+                        help=f'Client retry budget ratio (default: {DEFAULT_RETRY_BUDGET:g})')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Server delay before each response in seconds (default: 0.05)')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Per-connection bandwidth cap in KB/s (default: unlimited)')
+    parser.add_argument('--fail-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--fail-500', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--truncate', type=float, default=0.0,
+                        help='Fraction of responses cut off halfway through the body')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the failure injection (default: 0)')
+    parser.add_argument('--resync', action='store_true',
+                        help='Also time a second, conditional re-sync run against the same output')
+    parser.add_argument('--label', default='', help='Free-form label stored with the results')
+    parser.add_argument('--results', help='Append the results as one JSON line to this file')
+    args = parser.parse_args()
+    
+    data_dir = Path(args.data_dir)
+    names = sorted(p.name for p in data_dir.glob('*.pdf'))[:args.limit]
+    if not names:
+        print(f"Error: no PDFs found in {data_dir}")
+        sys.exit(1)
+    
+    serve_dir = tempfile.mkdtemp(prefix='nsg-bench-serve-')
+    output_dir = tempfile.mkdtemp(prefix='nsg-bench-out-')
+    for name in names:
+        os.symlink(data_dir.resolve() / name, Path(serve_dir) / name)
+    
+    server = multiprocessing.Process(
+        target=serve,
+        args=(serve_dir, args.port, args.latency, args.bandwidth * 1024,
+              args.fail_429, args.fail_500, args.truncate, args.seed),
+        daemon=True
+    )
+    server.start()
+    workers = max(1, args.workers)
+    try:
+        wait_for_server(args.port)
+        urls = [f"http://127.0.0.1:{args.port}/{name}" for name in names]
+        
+        print(f"Serving {len(names)} PDFs on port {args.port} "
+              f"(latency {args.latency}s, bandwidth {args.bandwidth or 'unlimited'} KB/s, "
+              f"429 {args.fail_429:.0%}, 500 {args.fail_500:.0%}, truncate {args.truncate:.0%})")
+        results = {'cold': run_once(urls, output_dir, workers, args.layout, args.rate, args.retry_budget)}
+        if args.resync:
+            results['resync'] = run_once(urls, output_dir, workers, args.layout, args.rate, args.retry_budget)
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(serve_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    print()
+    for name, result in results.items():
+        print_result(name, result)
+    
+    if args.results:
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'label': args.label,
+            'config': {
+                key: getattr(args, key)
+                for key in ('workers', 'layout', 'rate', 'retry_budget', 'latency', 'bandwidth',
+                            'fail_429', 'fail_500', 'truncate', 'seed', 'limit')
+            },
+            'files_served': len(names),
+            **results,
+        }
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,44 @@ PDF Downloader Script for Naturschutzgebiete
 Downloads PDF files from links extracted from Excel file.
 """
 
+import argparse
+import base64
+import binascii
+import json
 import os
 import sys
 import re
+import time
+import zipfile
 import requests
-import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
 from pathlib import Path
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from manifest import DownloadManifest, sha256_file
+from store import STORES
+from throttle import (
+    DEFAULT_RATE, DEFAULT_RETRY_BUDGET, RETRY_STATUSES, Throttle, backoff_delay, parse_retry_after
+)
+
+
+DEFAULT_WORKERS = 8
+URL_COLUMN = "Rechtsverordnung"
+MANIFEST_FILENAME = "manifest.json"
+DEFAULT_RESUME_ATTEMPTS = 5
+
+PDF_MAGIC = b'%PDF-'
+PDF_EOF_MARKER = b'%%EOF'
+PDF_TAIL_WINDOW = 2048
+
 
 def extract_pdf_url(html_content):
     """Extract PDF URL from HTML anchor tag."""
-    if pd.isna(html_content) or not html_content:
+    if not html_content or not isinstance(html_content, str):
         return None
     
     # Extract URL from <a href="...pdf" ...> pattern
@@ -24,6 +49,35 @@ def extract_pdf_url(html_content):
     return match.group(1) if match else None
 
 
+def iter_pdf_urls(excel_file, column=URL_COLUMN):
+    """
+    Lazily yield PDF URLs from one column of an Excel export.
+    
+    The workbook is opened read-only and only the requested column is read,
+    so memory stays flat regardless of the number of rows.
+    """
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # LANIS exports declare a bogus A1:A1 dimension; scan the real extent
+        sheet.reset_dimensions()
+        
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        if column not in header:
+            raise KeyError(
+                f"'{column}' column not found in Excel file. "
+                f"Available columns: {[c for c in header if c is not None]}"
+            )
+        col = header.index(column) + 1
+        
+        for (content,) in sheet.iter_rows(min_row=2, min_col=col, max_col=col, values_only=True):
+            url = extract_pdf_url(content)
+            if url:
+                yield url
+    finally:
+        workbook.close()
+
+
 def get_filename_from_url(url):
     """Extract filename from URL."""
     parsed = urlparse(url)
@@ -31,26 +85,399 @@ def get_filename_from_url(url):
     return filename if filename.endswith('.pdf') else f"{filename}.pdf"
 
 
-def download_file(url, filepath, session):
-    """Download a single file with error handling."""
+def create_session(workers):
+    """Create a session whose keep-alive pool holds one connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    })
+    return session
+
+
+def parse_digest_header(headers):
+    """Return the hex SHA-256 announced via Repr-Digest or Digest, if any."""
+    for name in ('Repr-Digest', 'Digest'):
+        value = headers.get(name)
+        if not value:
+            continue
+        for item in value.split(','):
+            algorithm, _, encoded = item.strip().partition('=')
+            if algorithm.lower() != 'sha-256' or not encoded:
+                continue
+            try:
+                return base64.b64decode(encoded.strip(':')).hex()
+            except (ValueError, binascii.Error):
+                return None
+    return None
+
+
+def verify_pdf(filepath, expected_size=None, expected_sha256=None):
+    """
+    Check that a file on disk is a complete PDF.
+    
+    Returns an error message, or None if the file passed all checks.
+    """
+    size = filepath.stat().st_size
+    if expected_size is not None and size != expected_size:
+        return f"size mismatch: got {size} bytes, expected {expected_size}"
+    
+    with open(filepath, 'rb') as f:
+        head = f.read(len(PDF_MAGIC))
+        f.seek(max(0, size - PDF_TAIL_WINDOW))
+        tail = f.read()
+    if head != PDF_MAGIC:
+        return "not a PDF (missing %PDF- header)"
+    if PDF_EOF_MARKER not in tail:
+        return "truncated PDF (missing %%EOF marker)"
+    
+    if expected_sha256:
+        sha256 = sha256_file(filepath)
+        if sha256 != expected_sha256.lower():
+            return f"hash mismatch: got {sha256}, expected {expected_sha256}"
+    return None
+
+
+def _load_partial(state_path, url):
+    """Return the saved state of an interrupted download of url, if any."""
     try:
-        response = session.get(url, stream=True, timeout=30)
-        response.raise_for_status()
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return state if state.get('url') == url else None
+
+
+def _discard_partial(part_path, state_path):
+    part_path.unlink(missing_ok=True)
+    state_path.unlink(missing_ok=True)
+
+
+def download_file(url, filepath, session, cached=None, expected_sha256=None,
+                  max_attempts=DEFAULT_RESUME_ATTEMPTS, throttle=None):
+    """
+    Download a single file with error handling.
+    
+    If a manifest entry is given, the request carries its validators and a
+    304 response leaves the file on disk untouched. The body is streamed to a
+    .part file; a transfer that breaks off is resumed with an HTTP Range
+    request (guarded by If-Range), both within this call and on later runs.
+    The .part file only replaces filepath after it passed verify_pdf.
+    
+    With a Throttle, every request waits for its host's token bucket and
+    concurrency limit, and 429/5xx responses and network errors are retried
+    with jittered backoff only while the shared retry budget lasts.
+    
+    Returns (success, error, info) where info holds the response validators
+    and, unless 'not_modified' is set, the size and sha256 of the new file.
+    """
+    part_path = filepath.with_name(filepath.name + '.part')
+    state_path = filepath.with_name(filepath.name + '.part.json')
+    
+    state = _load_partial(state_path, url)
+    if state is None or not part_path.exists():
+        _discard_partial(part_path, state_path)
+        state = None
+    offset = part_path.stat().st_size if state else 0
+    
+    host = throttle.for_url(url) if throttle else None
+    attempts = 0
+    delay = 0
+    while True:
+        if delay:
+            time.sleep(delay)
+            delay = 0
+        
+        headers = {}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            validator = state.get('etag') or state.get('last_modified')
+            if validator:
+                headers['If-Range'] = validator
+        elif cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        started = host.acquire() if host else None
+        status = retry_after = latency = None
+        try:
+            if throttle:
+                throttle.budget.record_request()
+            response = session.get(url, stream=True, timeout=30, headers=headers)
+            status = response.status_code
+            if host:
+                latency = time.monotonic() - started
+            info = {
+                'not_modified': status == 304,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            if info['not_modified']:
+                response.close()
+                return True, None, info
+            if status == 416:
+                # Stale partial the server cannot continue; start over
+                response.close()
+                _discard_partial(part_path, state_path)
+                state, offset = None, 0
+                attempts += 1
+                if attempts >= max_attempts:
+                    return False, "range not satisfiable", None
+                continue
+            if status in RETRY_STATUSES:
+                response.close()
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                attempts += 1
+                if attempts >= max_attempts or (throttle and not throttle.budget.try_spend()):
+                    return False, f"HTTP {status} (gave up after {attempts} attempts)", None
+                delay = backoff_delay(attempts, retry_after)
+                continue
+            response.raise_for_status()
+            
+            resumed = offset > 0 and status == 206 and \
+                response.headers.get('Content-Range', '').startswith(f'bytes {offset}-')
+            if not resumed:
+                offset = 0
+            
+            total = None
+            content_range = response.headers.get('Content-Range', '')
+            if resumed and '/' in content_range and not content_range.endswith('/*'):
+                total = int(content_range.rsplit('/', 1)[1])
+            elif not resumed and response.headers.get('Content-Length'):
+                total = int(response.headers['Content-Length'])
+            
+            if not resumed:
+                state = {
+                    'url': url,
+                    'etag': info['etag'],
+                    'last_modified': info['last_modified'],
+                    'total': total,
+                    'sha256': parse_digest_header(response.headers),
+                }
+                with open(state_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+            
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+                    offset += len(chunk)
+            break
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            attempts += 1
+            offset = part_path.stat().st_size if state and part_path.exists() else 0
+            if attempts >= max_attempts or (throttle and not throttle.budget.try_spend()):
+                # Keep the partial file so the next run resumes instead of restarting
+                return False, f"{e} ({offset} bytes kept for resume)", None
+            delay = backoff_delay(attempts)
+        except Exception as e:
+            _discard_partial(part_path, state_path)
+            return False, str(e), None
+        finally:
+            if host:
+                host.release(started, status, retry_after, latency)
+    
+    error = verify_pdf(
+        part_path,
+        expected_size=state.get('total'),
+        expected_sha256=expected_sha256 or state.get('sha256')
+    )
+    if error:
+        _discard_partial(part_path, state_path)
+        return False, f"verification failed: {error}", None
+    
+    os.replace(part_path, filepath)
+    state_path.unlink(missing_ok=True)
+    
+    info['etag'] = info['etag'] or state.get('etag')
+    info['last_modified'] = info['last_modified'] or state.get('last_modified')
+    info['size'] = offset
+    info['sha256'] = sha256_file(filepath)
+    return True, None, info
+
+
+def _prepare_target(filename, url, store, manifest):
+    """Drop corrupt leftovers and return the manifest entry to validate against."""
+    current = store.locate(filename)
+    corrupt = verify_pdf(current) if current else None
+    if corrupt:
+        # Truncated leftovers from older versions of this script
+        tqdm.write(f"Discarding corrupt {filename}: {corrupt}")
+        store.discard(filename)
+        current = None
+    if current is None:
+        # Validators are meaningless without the file they describe
+        manifest.forget(filename)
+    elif manifest.get(filename) is None:
+        manifest.adopt(filename, url, current)
+    return manifest.get(filename)
+
+
+def download_all(pdf_urls, store, session, workers, manifest, refresh=True, on_ready=None,
+                 throttle=None):
+    """
+    Download all URLs into store using a pool of worker threads.
+    
+    pdf_urls may be any iterable, including a lazy generator: URLs are
+    dispatched as they arrive and at most a few per worker are queued, so a
+    large export is never held in memory as a whole.
+    
+    Files already in the store are re-validated with conditional requests
+    against the manifest unless refresh is False, in which case they are skipped;
+    files that fail verify_pdf are downloaded again either way.
+    
+    If given, on_ready(filename, url, path, status, sha256) is called from the
+    calling thread as soon as each PDF is final on disk (status 'new',
+    'updated', 'unchanged' or 'skipped'), so later stages can start on it
+    while the remaining downloads are still running.
+    
+    A Throttle, if given, paces and retries the requests of every worker.
+    
+    Returns a dict with 'found', 'new', 'updated', 'unchanged', 'skipped',
+    'failed' and 'duplicates' counts.
+    """
+    stats = {
+        'found': 0, 'new': 0, 'updated': 0, 'unchanged': 0,
+        'skipped': 0, 'failed': 0, 'duplicates': 0
+    }
+    changes = {'new': [], 'updated': [], 'unchanged': [], 'failed': []}
+    max_queued = workers * 2
+    
+    # Several rows may link the same file; only one worker may write each target
+    seen = set()
+    pending = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            tqdm(total=0, desc="Downloading PDFs") as progress:
         
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return True, None
-    except Exception as e:
-        return False, str(e)
+        def collect(done):
+            for future in done:
+                url, filename = pending.pop(future)
+                success, error, info = future.result()
+                if not success:
+                    status = 'failed'
+                    tqdm.write(f"Failed to download {url}: {error}")
+                elif info['not_modified']:
+                    status = 'unchanged'
+                    manifest.touch(filename, info['etag'], info['last_modified'])
+                else:
+                    if store.commit(filename, url, info['sha256']):
+                        stats['duplicates'] += 1
+                    status = manifest.record(
+                        filename, url, info['etag'], info['last_modified'],
+                        info['size'], info['sha256']
+                    )
+                stats[status] += 1
+                changes[status].append(filename)
+                if on_ready and success:
+                    on_ready(filename, url, store.locate(filename), status,
+                             info.get('sha256') or manifest.get(filename)['sha256'])
+                progress.set_postfix(file=filename, failed=stats['failed'])
+                progress.update(1)
+        
+        for url in pdf_urls:
+            stats['found'] += 1
+            filename = get_filename_from_url(url)
+            if filename in seen:
+                stats['skipped'] += 1
+                continue
+            seen.add(filename)
+            
+            # Verified first, so a corrupt copy is downloaded again instead of skipped
+            cached = _prepare_target(filename, url, store, manifest)
+            if not refresh and cached:
+                stats['skipped'] += 1
+                if on_ready:
+                    on_ready(filename, url, store.locate(filename), 'skipped', cached['sha256'])
+                continue
+            
+            future = executor.submit(
+                download_file, url, store.target(filename), session, cached, throttle=throttle
+            )
+            pending[future] = (url, filename)
+            progress.total += 1
+            progress.refresh()
+            
+            if len(pending) >= max_queued:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    
+    manifest.set_last_sync(changes)
+    return stats
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python download_pdfs.py <excel_file_path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Download Rechtsverordnung PDFs linked from a LANIS Excel export'
+    )
+    parser.add_argument('excel_file', help='Path to the Excel export (e.g. TableExport.xlsx)')
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f'Number of concurrent downloads (default: {DEFAULT_WORKERS})'
+    )
+    parser.add_argument(
+        '--layout',
+        choices=sorted(STORES),
+        default='flat',
+        help='Output layout: flat (one file per URL filename, default) or '
+             'cas (content-addressed blobs plus index.json, duplicates stored once)'
+    )
+    parser.add_argument(
+        '--skip-existing',
+        action='store_true',
+        help='Do not re-validate files already on disk (no conditional requests)'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=DEFAULT_RATE,
+        help=f'Maximum requests per second per host (default: {DEFAULT_RATE:g})'
+    )
+    parser.add_argument(
+        '--retry-budget',
+        type=float,
+        default=DEFAULT_RETRY_BUDGET,
+        help='Retries allowed as a fraction of all requests, on top of 10 '
+             f'(default: {DEFAULT_RETRY_BUDGET:g})'
+    )
+    parser.add_argument(
+        '--emit-jsonl',
+        action='store_true',
+        help='Print one JSON line per finished PDF to stdout (for piping into '
+             '"nsgx stream"); all other output goes to stderr'
+    )
+    args = parser.parse_args()
     
-    excel_file = sys.argv[1]
+    excel_file = args.excel_file
+    workers = max(1, args.workers)
+    
+    on_ready = None
+    if args.emit_jsonl:
+        # stdout carries the JSON lines; progress and summary move to stderr
+        ready_stream = sys.stdout
+        sys.stdout = sys.stderr
+        
+        def on_ready(filename, url, path, status, sha256):
+            record = {
+                'filename': filename,
+                'url': url,
+                'path': str(path.resolve()),
+                'status': status,
+                'sha256': sha256,
+            }
+            ready_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            ready_stream.flush()
     
     if not os.path.exists(excel_file):
         print(f"Error: Excel file '{excel_file}' not found.")
@@ -61,66 +488,49 @@ def main():
     output_dir.mkdir(exist_ok=True)
     print(f"Output directory: {output_dir.absolute()}")
     
-    # Read Excel file
-    print(f"Reading Excel file: {excel_file}")
+    # Download PDFs while the Excel file is streamed
+    print(f"Reading PDF URLs from column '{URL_COLUMN}' of {excel_file}")
+    session = create_session(workers)
+    store = STORES[args.layout](output_dir)
+    manifest = DownloadManifest(output_dir / MANIFEST_FILENAME)
+    throttle = Throttle(max(0.1, args.rate), workers, max(0.0, args.retry_budget))
+    
+    print(f"Starting downloads with {workers} workers...")
     try:
-        df = pd.read_excel(excel_file)
-    except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        stats = download_all(
+            iter_pdf_urls(excel_file), store, session, workers, manifest,
+            refresh=not args.skip_existing, on_ready=on_ready, throttle=throttle
+        )
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
         sys.exit(1)
-    
-    # Check if 'Rechtsverordnung' column exists
-    if 'Rechtsverordnung' not in df.columns:
-        print("Error: 'Rechtsverordnung' column not found in Excel file.")
-        print(f"Available columns: {list(df.columns)}")
+    except (InvalidFileException, zipfile.BadZipFile) as e:
+        print(f"Error reading Excel file: {e}")
         sys.exit(1)
+    finally:
+        store.save()
+        manifest.save()
     
-    # Extract PDF URLs
-    print("Extracting PDF URLs...")
-    pdf_urls = []
-    for idx, content in enumerate(df['Rechtsverordnung']):
-        url = extract_pdf_url(content)
-        if url:
-            pdf_urls.append(url)
-    
-    print(f"Found {len(pdf_urls)} PDF URLs to download")
-    
-    if not pdf_urls:
+    if not stats['found']:
         print("No PDF URLs found. Exiting.")
         sys.exit(0)
     
-    # Download PDFs
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    })
-    
-    downloaded = 0
-    skipped = 0
-    failed = 0
-    
-    print("Starting downloads...")
-    for url in tqdm(pdf_urls, desc="Downloading PDFs"):
-        filename = get_filename_from_url(url)
-        filepath = output_dir / filename
-        
-        if filepath.exists():
-            skipped += 1
-            continue
-        
-        success, error = download_file(url, filepath, session)
-        if success:
-            downloaded += 1
-        else:
-            failed += 1
-            print(f"\nFailed to download {url}: {error}")
-    
     # Summary
     print(f"\nDownload complete!")
-    print(f"Downloaded: {downloaded}")
-    print(f"Skipped (already exists): {skipped}")
-    print(f"Failed: {failed}")
-    print(f"Total files in directory: {len(list(output_dir.glob('*.pdf')))}")
+    print(f"PDF URLs found: {stats['found']}")
+    print(f"Downloaded (new): {stats['new']}")
+    print(f"Updated: {stats['updated']}")
+    print(f"Unchanged: {stats['unchanged']}")
+    print(f"Skipped: {stats['skipped']}")
+    print(f"Failed: {stats['failed']}")
+    if store.layout == 'cas':
+        print(f"Duplicate content (stored once): {stats['duplicates']}")
+    print(f"Retries: {throttle.budget.retries} ({throttle.budget.denied} refused by the retry budget)")
+    for host, info in throttle.summary().items():
+        print(f"  {host}: {info['throttled']} throttled responses, "
+              f"final concurrency {info['concurrency']}/{workers}")
+    print(f"Manifest: {manifest.path}")
+    print(f"Total files in store: {store.count()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+"""
+Download manifest for the Naturschutzgebiete PDF downloader.
+Remembers URL, ETag, Last-Modified, size and content hash per PDF so that
+re-runs can issue conditional requests and report what actually changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+MANIFEST_VERSION = 1
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def sha256_file(path, chunk_size=65536):
+    """Return the hex SHA-256 of a file on disk."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """JSON manifest keyed by output filename, safe to update from worker threads."""
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        self.last_sync = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: ignoring unreadable manifest {self.path}: {e}")
+            return
+        self.files = data.get('files', {})
+        self.last_sync = data.get('last_sync', {})
+    
+    def get(self, filename):
+        """Return the stored entry for filename, or None."""
+        with self._lock:
+            entry = self.files.get(filename)
+            return dict(entry) if entry else None
+    
+    def record(self, filename, url, etag, last_modified, size, sha256):
+        """
+        Store the metadata of a freshly downloaded file.
+        
+        Returns 'new', 'updated' or 'unchanged' depending on the previous content hash.
+        """
+        with self._lock:
+            previous = self.files.get(filename)
+            if previous is None:
+                status = 'new'
+            elif previous.get('sha256') != sha256:
+                status = 'updated'
+            else:
+                status = 'unchanged'
+            
+            now = _now()
+            self.files[filename] = {
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': size,
+                'sha256': sha256,
+                'checked_at': now,
+                'changed_at': now if status != 'unchanged' else (previous.get('changed_at') or now),
+            }
+            return status
+    
+    def adopt(self, filename, url, filepath):
+        """Seed an entry from a file downloaded before the manifest existed."""
+        sha256 = sha256_file(filepath)
+        with self._lock:
+            if filename in self.files:
+                return
+            self.files[filename] = {
+                'url': url,
+                'etag': None,
+                'last_modified': None,
+                'size': Path(filepath).stat().st_size,
+                'sha256': sha256,
+                'checked_at': None,
+                'changed_at': None,
+            }
+    
+    def touch(self, filename, etag=None, last_modified=None):
+        """Mark an entry as verified by a 304 response, refreshing validators if sent."""
+        with self._lock:
+            entry = self.files.get(filename)
+            if entry is None:
+                return
+            entry['checked_at'] = _now()
+            if etag:
+                entry['etag'] = etag
+            if last_modified:
+                entry['last_modified'] = last_modified
+    
+    def forget(self, filename):
+        """Drop an entry, e.g. because its file vanished from disk."""
+        with self._lock:
+            self.files.pop(filename, None)
+    
+    def set_last_sync(self, changes):
+        """Remember which files a run added, updated, left untouched or failed on."""
+        with self._lock:
+            self.last_sync = {
+                'finished_at': _now(),
+                **{key: sorted(names) for key, names in changes.items()},
+            }
+    
+    def save(self):
+        """Write the manifest atomically next to its final location."""
+        with self._lock:
+            data = {
+                'version': MANIFEST_VERSION,
+                'last_sync': self.last_sync,
+                'files': dict(sorted(self.files.items())),
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,145 @@
+"""
+Output layouts for the Naturschutzgebiete PDF downloader.
+
+FlatStore keeps the original layout: one file per URL-derived filename.
+ContentStore keeps each distinct PDF once under blobs/<aa>/<sha256>.pdf and
+maps filenames and NSG IDs to those blobs in index.json, so LANIS rows that
+link byte-identical regulations share one copy on disk and downstream.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+
+
+def doc_id_from_filename(filename):
+    """Return the NSG-XXXX-XXX ID in filename, or its stem as a fallback."""
+    match = re.search(r'NSG-\d{4}-\d{3}', filename)
+    return match.group(0) if match else Path(filename).stem
+
+
+class FlatStore:
+    """PDFs stored under their URL-derived filenames in one directory."""
+    
+    layout = 'flat'
+    
+    def __init__(self, root):
+        self.root = Path(root)
+    
+    def target(self, filename):
+        """Path the downloader should write filename to."""
+        return self.root / filename
+    
+    def locate(self, filename):
+        """Path of the current copy of filename, or None if there is none."""
+        path = self.root / filename
+        return path if path.exists() else None
+    
+    def discard(self, filename):
+        """Remove the current copy of filename."""
+        (self.root / filename).unlink(missing_ok=True)
+    
+    def commit(self, filename, url, sha256):
+        """Finalize a download written to target(filename). Returns True if it was a duplicate."""
+        return False
+    
+    def count(self):
+        return len(list(self.root.glob('*.pdf')))
+    
+    def save(self):
+        pass
+
+
+class ContentStore:
+    """
+    Content-addressed PDFs with a filename/ID index.
+    
+    Downloads are staged in .incoming/ and moved into blobs/ by commit();
+    commit() and discard() must be called from one thread only.
+    """
+    
+    layout = 'cas'
+    
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blob_dir = self.root / 'blobs'
+        self.incoming_dir = self.root / '.incoming'
+        self.index_path = self.root / INDEX_FILENAME
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        self.documents = {}
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f).get('documents', {})
+    
+    def blob_path(self, sha256):
+        return self.blob_dir / sha256[:2] / f"{sha256}.pdf"
+    
+    def target(self, filename):
+        return self.incoming_dir / filename
+    
+    def locate(self, filename):
+        entry = self.documents.get(filename)
+        if not entry:
+            return None
+        path = self.blob_path(entry['sha256'])
+        return path if path.exists() else None
+    
+    def discard(self, filename):
+        """Drop the mapping of filename, and its blob unless another filename shares it."""
+        entry = self.documents.pop(filename, None)
+        if entry:
+            self._release_blob(entry['sha256'])
+    
+    def commit(self, filename, url, sha256):
+        staged = self.target(filename)
+        blob = self.blob_path(sha256)
+        duplicate = blob.exists()
+        if duplicate:
+            staged.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, blob)
+        
+        previous = self.documents.get(filename)
+        self.documents[filename] = {
+            'doc_id': doc_id_from_filename(filename),
+            'url': url,
+            'sha256': sha256,
+            'blob': blob.relative_to(self.root).as_posix(),
+        }
+        if previous and previous['sha256'] != sha256:
+            # The document changed; its old content may now be unreferenced
+            self._release_blob(previous['sha256'])
+        return duplicate
+    
+    def _release_blob(self, sha256):
+        """Delete the blob for sha256 if no filename maps to it any more."""
+        if any(entry['sha256'] == sha256 for entry in self.documents.values()):
+            return
+        self.blob_path(sha256).unlink(missing_ok=True)
+    
+    def count(self):
+        return len(list(self.blob_dir.glob('*/*.pdf')))
+    
+    def save(self):
+        """Write index.json atomically."""
+        data = {
+            'version': INDEX_VERSION,
+            'layout': self.layout,
+            'documents': dict(sorted(self.documents.items())),
+        }
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+
+STORES = {
+    FlatStore.layout: FlatStore,
+    ContentStore.layout: ContentStore,
+}
@@ -0,0 +1,218 @@
+"""
+Per-host request throttling for the Naturschutzgebiete PDF downloader.
+
+Each host gets a token bucket that caps the request rate and an adaptive
+concurrency limit: it grows by one slot per limit's worth of successful
+responses and is halved when the server answers 429/503 or its latency
+rises well above the best latency seen so far. Retries draw on a shared
+budget so a struggling server is not buried under retry traffic.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+DEFAULT_RATE = 10.0
+DEFAULT_RETRY_BUDGET = 0.2
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Back off when the smoothed latency exceeds this multiple of the best seen
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_CAP * 4))
+    return delay
+
+
+def parse_retry_after(value):
+    """Return the seconds a Retry-After header asks to wait, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, at most burst saved up."""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def pause(self, seconds):
+        """Hand out no tokens for the next seconds (e.g. a Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+    
+    def take(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.updated = self.paused_until
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit between 1 and maximum, blocking callers above it."""
+    
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.best_latency = None
+        self.latency = None
+        self.decreases = 0
+        self._since_decrease = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+    
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+    
+    def on_success(self, latency):
+        with self._cond:
+            self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+            self.latency = latency if self.latency is None else \
+                (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * latency
+            self._since_decrease += 1
+            if self.latency > LATENCY_TOLERANCE * self.best_latency:
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+    
+    def on_throttle(self):
+        with self._cond:
+            self._since_decrease += 1
+            self._decrease()
+    
+    def _decrease(self):
+        # Responses already in flight reflect the old limit; halve at most once per window
+        if self._since_decrease < int(self.limit) and self.decreases:
+            return
+        self.limit = max(1.0, self.limit / 2)
+        self.decreases += 1
+        self._since_decrease = 0
+        self.latency = self.best_latency
+
+
+class RetryBudget:
+    """Allow retries up to a fraction of all requests, plus a small fixed allowance."""
+    
+    def __init__(self, ratio=DEFAULT_RETRY_BUDGET, minimum=10):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def try_spend(self):
+        """Take one retry from the budget; False if it is used up."""
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.requests:
+                self.denied += 1
+                return False
+            self.retries += 1
+            return True
+
+
+class HostThrottle:
+    """Rate limit and adaptive concurrency for one host."""
+    
+    def __init__(self, rate, max_concurrency):
+        self.bucket = TokenBucket(rate, burst=max_concurrency)
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.throttled = 0
+    
+    def acquire(self):
+        """Wait for a request slot; returns the start time to pass to release()."""
+        self.limit.acquire()
+        self.bucket.take()
+        return time.monotonic()
+    
+    def release(self, started, status=None, retry_after=None, latency=None):
+        """
+        Free the slot taken by acquire() and feed the outcome back.
+        
+        latency is the time to the response headers; it defaults to the time
+        since acquire(). A status of None means the request did not complete.
+        """
+        self.limit.release()
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            self.limit.on_throttle()
+            if retry_after:
+                self.bucket.pause(retry_after)
+        elif status is not None and status < 500:
+            self.limit.on_success(latency if latency is not None else time.monotonic() - started)
+
+
+class Throttle:
+    """Registry of HostThrottle objects plus the retry budget shared by all hosts."""
+    
+    def __init__(self, rate=DEFAULT_RATE, max_concurrency=8, retry_budget=DEFAULT_RETRY_BUDGET):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.budget = RetryBudget(retry_budget)
+        self.hosts = {}
+        self._lock = threading.Lock()
+    
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostThrottle(self.rate, self.max_concurrency)
+            return self.hosts[host]
+    
+    def summary(self):
+        """Per-host throttled responses and concurrency limit, for the final report."""
+        return {
+            host: {
+                'throttled': throttle.throttled,
+                'concurrency': int(throttle.limit.limit),
+                'latency': throttle.limit.latency,
+            }
+            for host, throttle in sorted(self.hosts.items())
+        }
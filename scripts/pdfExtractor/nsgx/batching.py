@@ -0,0 +1,74 @@
+"""Packing several chunks or paragraphs into one API request."""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .tokens import count_tokens
+
+# max_tokens of a batched request: DeepSeek's output limit
+BATCH_MAX_OUTPUT_TOKENS = 8192
+# Tells the model how the items are marked and how to answer; replaces the single-item user message
+BATCH_INSTRUCTION = (
+    "The text below holds {count} separate items, each starting with a line '### id: <id>'. "
+    "Analyze each item on its own, exactly as if it were the only input. Return one JSON object "
+    "{{\"items\": [...]}} with one entry per item, in the same order: the JSON object you would "
+    "return for that item alone, plus an \"id\" field with the item's id."
+)
+
+
+def batch_max_items(item_max_tokens: int) -> int:
+    """Most items whose answers, each allowed item_max_tokens on its own, fit one batched answer."""
+    return max(1, BATCH_MAX_OUTPUT_TOKENS // item_max_tokens)
+
+
+def plan_batches(items: Sequence[Tuple[str, str]], token_budget: int,
+                 item_max_tokens: int) -> List[List[Tuple[str, str]]]:
+    """
+    Group (id, text) items in order into batches whose texts total at most token_budget tokens.
+    
+    An item over the budget by itself gets a batch of its own. No batch
+    holds more items than batch_max_items(item_max_tokens), the max_tokens
+    of a single-item request.
+    """
+    max_items = batch_max_items(item_max_tokens)
+    batches: List[List[Tuple[str, str]]] = []
+    batch: List[Tuple[str, str]] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = count_tokens(item[1])
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def format_batch(items: Sequence[Tuple[str, str]]) -> str:
+    """User message carrying several (id, text) items."""
+    parts = [BATCH_INSTRUCTION.format(count=len(items))]
+    for item_id, text in items:
+        parts.append(f"### id: {item_id}\n{text}")
+    return "\n\n".join(parts)
+
+
+def split_batch_response(data: Dict[str, Any], ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    The answer for each item of a batched request, keyed by id.
+    
+    Entries with an unknown or repeated id, or that are not objects, are
+    dropped; callers send the items left without an answer on their own.
+    """
+    answers: Dict[str, Dict[str, Any]] = {}
+    wanted = set(ids)
+    entries: Optional[List[Any]] = data.get('items')
+    if not isinstance(entries, list):
+        return answers
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        item_id = str(entry.get('id', ''))
+        if item_id in wanted and item_id not in answers:
+            answers[item_id] = entry
+    return answers
@@ -0,0 +1,260 @@
+"""Benchmarks of the PDF extraction backends on a PDF corpus and of the text chunker."""
+
+import logging
+import re
+import resource
+import shutil
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pdfminer
+import pypdf
+from pdfminer.layout import LAParams
+
+from .pack import PAGE_ITERATORS, find_pdf_files, pdftotext_version, pymupdf, score_extracted_text
+from .utils import chunk_spans, save_json_file
+
+# Written by nsgx bench
+BENCH_RESULTS_FILENAME = "bench_results.json"
+# pdfminer layout settings compared by the benchmark; "pdfminer" is what pack uses
+PDFMINER_VARIANTS = {
+    "pdfminer": {},
+    "pdfminer-noflow": {"boxes_flow": None},
+    "pdfminer-tight": {"char_margin": 1.0, "line_margin": 0.3},
+}
+# Resolution xmlFiller renders pages at for OCR (2x zoom)
+OCR_DPI = 144
+# Section markers such as "§ 3" or "§3"
+SECTION_MARKER = re.compile(r'§\s*\d+')
+# Sections of a synthetic regulation, each about 1.1k characters, cycled by the chunker benchmark
+SYNTHETIC_SECTION = (
+    "\n§ {number}\nVerbote\n\n"
+    "(1) In dem Naturschutzgebiet sind alle Handlungen verboten, die zu einer Zerstörung, Beschädigung oder "
+    "Veränderung des Gebietes oder seiner Bestandteile oder zu einer nachhaltigen Störung führen können. "
+    "Dies gilt auch für Handlungen außerhalb des Gebietes, die in das Gebiet hineinwirken.\n\n"
+    "(2) Insbesondere ist es verboten, die Wege zu verlassen, Hunde frei laufen zu lassen, zu zelten oder "
+    "zu lagern, Feuer zu entzünden, wild lebende Tiere zu beunruhigen, zu fangen oder zu töten, Pflanzen "
+    "oder Pflanzenteile zu entnehmen, mit Fahrzeugen aller Art außerhalb der dafür zugelassenen Wege zu "
+    "fahren oder diese dort abzustellen. Ausgenommen sind Maßnahmen der ordnungsgemäßen Land- und "
+    "Forstwirtschaft im Sinne des § 5 Abs. 2 des Bundesnaturschutzgesetzes.\n\n"
+    "(3) Die obere Naturschutzbehörde kann im Einzelfall Ausnahmen zulassen, wenn der Schutzzweck nicht "
+    "beeinträchtigt wird! Anträge sind schriftlich zu stellen. Sind die Voraussetzungen erfüllt? Dann "
+    "wird die Ausnahme befristet erteilt.\n"
+)
+
+
+def _iter_pages_ocr(pdf_path: str) -> Iterator[Dict[str, Any]]:
+    """OCR every page with PyMuPDF's Tesseract binding."""
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc:
+            textpage = page.get_textpage_ocr(language="deu", dpi=OCR_DPI, full=True)
+            yield {"page_num": page.number + 1, "text": page.get_text(textpage=textpage)}
+
+
+def bench_backends() -> Dict[str, Optional[Callable[[str], Iterator[Dict[str, Any]]]]]:
+    """Page iterator per benchmark backend, None for backends that are not installed."""
+    backends: Dict[str, Optional[Callable[[str], Iterator[Dict[str, Any]]]]] = {
+        name: partial(PAGE_ITERATORS["pdfminer"], laparams=LAParams(**params))
+        for name, params in PDFMINER_VARIANTS.items()
+    }
+    backends["pypdf"] = PAGE_ITERATORS["pypdf"]
+    backends["pymupdf"] = PAGE_ITERATORS["pymupdf"] if pymupdf is not None else None
+    backends["pdftotext"] = PAGE_ITERATORS["pdftotext"] if pdftotext_version() else None
+    backends["ocr"] = _iter_pages_ocr if pymupdf is not None and shutil.which("tesseract") else None
+    return backends
+
+
+def backend_versions() -> Dict[str, Optional[str]]:
+    """Versions of the extraction libraries, recorded with the results."""
+    return {
+        "pdfminer": pdfminer.__version__,
+        "pypdf": pypdf.__version__,
+        "pymupdf": pymupdf.VersionBind if pymupdf is not None else None,
+        "pdftotext": pdftotext_version(),
+    }
+
+
+# BaseException so the extractors' `except Exception` fallbacks cannot swallow it
+class PdfTimeoutError(BaseException):
+    """A PDF exceeded its time limit in the benchmark."""
+
+
+def _raise_bench_timeout(signum, frame) -> None:
+    raise PdfTimeoutError()
+
+
+def _bench_document(iterate: Callable[[str], Iterator[Dict[str, Any]]], pdf_path: str,
+                    timeout: float) -> Dict[str, Any]:
+    """Extract one PDF and measure time and output quality."""
+    record: Dict[str, Any] = {"file": pdf_path, "error": None}
+    started = time.perf_counter()
+    use_timer = bool(timeout) and hasattr(signal, "setitimer")
+    if use_timer:
+        signal.signal(signal.SIGALRM, _raise_bench_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        pages = list(iterate(pdf_path))
+    except PdfTimeoutError:
+        record["error"] = f"timeout after {timeout}s"
+        return record
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+        return record
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        record["seconds"] = round(time.perf_counter() - started, 4)
+    
+    text = '\n'.join(page["text"] for page in pages)
+    record.update({
+        "pages": len(pages),
+        "chars": len(text),
+        "section_markers": len(SECTION_MARKER.findall(text)),
+        "empty_pages": sum(1 for page in pages if not page["text"].strip()),
+        "score": score_extracted_text(text, pages),
+    })
+    return record
+
+
+def _bench_worker(backend: str, pdf_paths: List[str], timeout: float) -> Dict[str, Any]:
+    """Run one backend over all PDFs in a fresh process, so its peak RSS is its own."""
+    iterate = bench_backends()[backend]
+    records = [_bench_document(iterate, pdf_path, timeout) for pdf_path in pdf_paths]
+    # ru_maxrss is in KiB on Linux
+    return {"records": records, "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def summarize_backend(records: List[Dict[str, Any]], peak_rss_mb: Optional[float]) -> Dict[str, Any]:
+    """Aggregate the per-document records of one backend."""
+    succeeded = [record for record in records if record["error"] is None]
+    pages = sum(record["pages"] for record in succeeded)
+    seconds = sum(record["seconds"] for record in succeeded)
+    return {
+        "documents": len(records),
+        "failures": len(records) - len(succeeded),
+        "failure_rate": round((len(records) - len(succeeded)) / len(records), 4) if records else 0.0,
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 2) if seconds else None,
+        "peak_rss_mb": peak_rss_mb,
+        "chars": sum(record["chars"] for record in succeeded),
+        "section_markers": sum(record["section_markers"] for record in succeeded),
+        "empty_pages": sum(record["empty_pages"] for record in succeeded),
+        "empty_page_ratio": round(sum(record["empty_pages"] for record in succeeded) / pages, 4) if pages else None,
+        "mean_score": round(sum(record["score"] for record in succeeded) / len(succeeded), 1) if succeeded else None,
+    }
+
+
+def sample_pdfs(pdfdir: str, sample: int) -> List[Path]:
+    """All PDFs under pdfdir in name order, or `sample` of them evenly spread."""
+    pdfs = sorted(find_pdf_files(pdfdir))
+    if sample and sample < len(pdfs):
+        step = len(pdfs) / sample
+        pdfs = [pdfs[int(i * step)] for i in range(sample)]
+    return pdfs
+
+
+def run_benchmark(pdfdir: str, backends: List[str], sample: int, timeout: float, output_file: str,
+                  logger: logging.Logger) -> Dict[str, Any]:
+    """Run each backend over the PDFs and write summary and per-document results to output_file."""
+    available = bench_backends()
+    unknown = [backend for backend in backends if backend not in available]
+    if unknown:
+        raise ValueError(f"Unknown backends: {', '.join(unknown)} (choose from {', '.join(available)})")
+    
+    pdfs = sample_pdfs(pdfdir, sample)
+    if not pdfs:
+        raise ValueError(f"No PDF files found in {pdfdir}")
+    pdf_paths = [str(pdf) for pdf in pdfs]
+    logger.info(f"Benchmarking {len(backends)} backends on {len(pdf_paths)} PDFs")
+    
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "pdfdir": pdfdir,
+        "pdfs": len(pdf_paths),
+        "timeout": timeout,
+        "versions": backend_versions(),
+        # Each backend runs in a child forked from this process, which starts at this size
+        "baseline_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "backends": {},
+        "documents": {},
+    }
+    
+    for backend in backends:
+        if available[backend] is None:
+            logger.warning(f"Skipping {backend}: not installed")
+            results["backends"][backend] = {"skipped": "not installed"}
+            continue
+        
+        logger.info(f"Running {backend}...")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                outcome = executor.submit(_bench_worker, backend, pdf_paths, timeout).result()
+            except BrokenProcessPool:
+                logger.error(f"{backend} crashed its benchmark process")
+                results["backends"][backend] = {"skipped": "crashed"}
+                continue
+        
+        summary = summarize_backend(outcome["records"], outcome["peak_rss_mb"])
+        results["backends"][backend] = summary
+        results["documents"][backend] = outcome["records"]
+        logger.info(
+            f"  {backend}: {summary['pages_per_second']} pages/s, peak RSS {summary['peak_rss_mb']} MB, "
+            f"{summary['failures']}/{summary['documents']} failed, {summary['chars']} chars, "
+            f"{summary['section_markers']} § markers, {summary['empty_pages']} empty pages, "
+            f"mean score {summary['mean_score']}"
+        )
+    
+    save_json_file(results, output_file)
+    logger.info(f"Wrote benchmark results to {output_file}")
+    return results
+
+
+def synthetic_regulation(chars: int) -> str:
+    """A regulation-like text of about `chars` characters with numbered sections, paragraphs and sentences."""
+    sections = []
+    length = 0
+    while length < chars:
+        section = SYNTHETIC_SECTION.format(number=len(sections) + 1)
+        sections.append(section)
+        length += len(section)
+    return "".join(sections)[:chars]
+
+
+def run_chunk_benchmark(sizes: List[int], max_chars: int, repeat: int, output_file: str,
+                        logger: logging.Logger) -> Dict[str, Any]:
+    """Time chunk_spans on synthetic regulations of increasing size and write the results to output_file."""
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "max_chars": max_chars,
+        "repeat": repeat,
+        "runs": [],
+    }
+    for size in sorted(sizes):
+        text = synthetic_regulation(size)
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            spans = list(chunk_spans(text, max_chars))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        run = {
+            "chars": len(text),
+            "chunks": len(spans),
+            "seconds": round(best, 6),
+            # Constant for a linear-time chunker
+            "ns_per_char": round(best / len(text) * 1e9, 1),
+        }
+        results["runs"].append(run)
+        logger.info(f"  {run['chars']} chars: {run['chunks']} chunks in {run['seconds'] * 1000:.1f} ms "
+                    f"({run['ns_per_char']} ns/char)")
+    
+    save_json_file(results, output_file)
+    logger.info(f"Wrote chunker benchmark results to {output_file}")
+    return results
@@ -32,29 +32,149 @@ def cli(ctx: click.Context, verbose: bool) -> None:
 @click.option('--pdfdir', required=True, help='Directory containing PDF files (recursive)')
 @click.option('--max-chars', default=4000, help='Maximum characters per chunk (default: 4000)')
 @click.option('--output-dir', default='out', help='Output directory (default: out)')
+@click.option('--workers', default=1, help='Number of extraction processes (default: 1)')
+@click.option('--timeout', default=120.0, help='Seconds allowed per PDF; 0 for no limit (default: 120)')
+@click.option('--extract-mode', type=click.Choice(['fallback', 'routed']), default='fallback',
+              help='fallback: pdfminer first; routed: fastest backend first, pdfminer on a low quality score')
+@click.option('--max-rss-mb', default=2048, help='Memory allowed per extraction process; 0 for no limit (default: 2048)')
+@click.option('--max-tasks-per-child', default=50,
+              help='PDFs per extraction process before it is replaced; 0 for never (default: 50)')
+@click.option('--quarantine-file', default=None,
+              help='PDFs that hung, ran out of memory or crashed, skipped on later runs '
+                   '(default: OUTPUT_DIR/quarantine.json)')
+@click.option('--token-budget', default=0,
+              help='Input tokens per run request, system prompt included; chunks by tokens instead of '
+                   '--max-chars (default: 0, off)')
+@click.option('--fresh', is_flag=True, help='Start over instead of resuming an interrupted pack')
 @click.pass_context
-def pack(ctx: click.Context, pdfdir: str, max_chars: int, output_dir: str) -> None:
+def pack(ctx: click.Context, pdfdir: str, max_chars: int, output_dir: str, workers: int, timeout: float,
+         extract_mode: str, max_rss_mb: int, max_tasks_per_child: int, quarantine_file: str,
+         token_budget: int, fresh: bool) -> None:
     """Convert PDFs to text chunks (JSONL format)."""
     from .pack import pack_pdfs_to_chunks
     
     logger = ctx.obj['logger']
-    logger.info(f"Starting pack command: pdfdir={pdfdir}, max_chars={max_chars}")
+    logger.info(
+        f"Starting pack command: pdfdir={pdfdir}, max_chars={max_chars}, token_budget={token_budget}, "
+        f"workers={workers}, extract_mode={extract_mode}"
+    )
     
     try:
-        pack_pdfs_to_chunks(pdfdir, max_chars, output_dir, logger)
+        pack_pdfs_to_chunks(pdfdir, max_chars, output_dir, logger, max(1, workers), timeout, extract_mode,
+                            max_rss_mb, max_tasks_per_child, quarantine_file, token_budget, not fresh)
         logger.info("Pack command completed successfully")
     except Exception as e:
         logger.error(f"Pack command failed: {e}")
         raise click.ClickException(f"Failed to pack PDFs: {e}")
 
 
+@cli.command()
+@click.option('--input', 'source', type=click.File('r'), default='-',
+              help='JSON lines from download_pdfs.py --emit-jsonl, or one PDF path per line (default: stdin)')
+@click.option('--max-chars', default=4000, help='Maximum characters per chunk (default: 4000)')
+@click.option('--output-dir', default='out', help='Output directory (default: out)')
+@click.option('--workers', default=4, help='Number of extraction processes (default: 4)')
+@click.option('--timeout', default=120.0, help='Seconds allowed per PDF; 0 for no limit (default: 120)')
+@click.option('--extract-mode', type=click.Choice(['fallback', 'routed']), default='fallback',
+              help='fallback: pdfminer first; routed: fastest backend first, pdfminer on a low quality score')
+@click.option('--max-rss-mb', default=2048, help='Memory allowed per extraction process; 0 for no limit (default: 2048)')
+@click.option('--max-tasks-per-child', default=50,
+              help='PDFs per extraction process before it is replaced; 0 for never (default: 50)')
+@click.option('--quarantine-file', default=None,
+              help='PDFs that hung, ran out of memory or crashed, skipped on later runs '
+                   '(default: OUTPUT_DIR/quarantine.json)')
+@click.option('--token-budget', default=0,
+              help='Input tokens per run request, system prompt included; chunks by tokens instead of '
+                   '--max-chars (default: 0, off)')
+@click.pass_context
+def stream(ctx: click.Context, source, max_chars: int, output_dir: str, workers: int, timeout: float,
+           extract_mode: str, max_rss_mb: int, max_tasks_per_child: int, quarantine_file: str,
+           token_budget: int) -> None:
+    """Extract and filter PDFs as the downloader finishes them."""
+    from .stream import stream_pdfs
+    
+    logger = ctx.obj['logger']
+    logger.info(
+        f"Starting stream command: max_chars={max_chars}, token_budget={token_budget}, "
+        f"workers={workers}, extract_mode={extract_mode}"
+    )
+    
+    try:
+        stream_pdfs(source, max_chars, output_dir, max(1, workers), logger, extract_mode, timeout, max_rss_mb,
+                    max_tasks_per_child, quarantine_file, token_budget)
+        logger.info("Stream command completed successfully")
+    except Exception as e:
+        logger.error(f"Stream command failed: {e}")
+        raise click.ClickException(f"Failed to stream PDFs: {e}")
+
+
+@cli.command()
+@click.option('--pdfdir', required=True, help='Directory containing PDF files (recursive)')
+@click.option('--backends', default='pdfminer,pdfminer-noflow,pdfminer-tight,pypdf,pymupdf,pdftotext,ocr',
+              help='Comma-separated backends to compare; missing ones are skipped')
+@click.option('--sample', default=0, help='Number of PDFs, evenly spread over the directory (default: 0, all)')
+@click.option('--timeout', default=120, help='Seconds allowed per PDF and backend (default: 120)')
+@click.option('--output', default='out/bench_results.json', help='Results file (default: out/bench_results.json)')
+@click.pass_context
+def bench(ctx: click.Context, pdfdir: str, backends: str, sample: int, timeout: int, output: str) -> None:
+    """Compare extraction backends on speed, memory and output quality."""
+    from .bench import run_benchmark
+    
+    logger = ctx.obj['logger']
+    logger.info(f"Starting bench command: pdfdir={pdfdir}, backends={backends}, sample={sample}")
+    
+    try:
+        run_benchmark(pdfdir, [b.strip() for b in backends.split(',') if b.strip()], sample, timeout, output, logger)
+        logger.info("Bench command completed successfully")
+    except Exception as e:
+        logger.error(f"Bench command failed: {e}")
+        raise click.ClickException(f"Failed to run benchmark: {e}")
+
+
+@cli.command('bench-chunker')
+@click.option('--sizes', default='100000,200000,400000,800000,1600000',
+              help='Comma-separated text sizes in characters')
+@click.option('--max-chars', default=4000, help='Maximum characters per chunk (default: 4000)')
+@click.option('--repeat', default=5, help='Runs per size; the fastest counts (default: 5)')
+@click.option('--output', default='out/chunk_bench_results.json',
+              help='Results file (default: out/chunk_bench_results.json)')
+@click.pass_context
+def bench_chunker(ctx: click.Context, sizes: str, max_chars: int, repeat: int, output: str) -> None:
+    """Time the text chunker on synthetic regulations of increasing size."""
+    from .bench import run_chunk_benchmark
+    
+    logger = ctx.obj['logger']
+    logger.info(f"Starting bench-chunker command: sizes={sizes}, max_chars={max_chars}")
+    
+    try:
+        run_chunk_benchmark([int(size) for size in sizes.split(',') if size.strip()], max_chars, repeat, output,
+                            logger)
+        logger.info("Bench-chunker command completed successfully")
+    except Exception as e:
+        logger.error(f"Bench-chunker command failed: {e}")
+        raise click.ClickException(f"Failed to run chunker benchmark: {e}")
+
+
 @cli.command()
 @click.option('--chunks-file', default='out/chunks.jsonl', help='Input chunks file')
 @click.option('--output-dir', default='out', help='Output directory')
 @click.option('--concurrency', default=4, help='Number of concurrent requests (default: 4)')
+@click.option('--max-concurrency', default=0,
+              help='Let the concurrency adapt up to this many requests in flight, backing off on 429/5xx '
+                   'and latency spikes; 0 keeps it fixed (default: 0)')
+@click.option('--rpm', default=0, envvar='DEEPSEEK_RPM', show_envvar=True,
+              help='Requests per minute allowed by the API account; '
+                   '0 for no limit (default: 0)')
+@click.option('--tpm', default=0, envvar='DEEPSEEK_TPM', show_envvar=True,
+              help='Tokens (input and output) per minute allowed by the API account; '
+                   '0 for no limit (default: 0)')
+@click.option('--batch-tokens', default=0,
+              help='Pack consecutive chunks of up to this many tokens in total into one request; '
+                   '0 sends each on its own (default: 0)')
 @click.option('--force', is_flag=True, help='Overwrite existing results')
 @click.pass_context
-def run(ctx: click.Context, chunks_file: str, output_dir: str, concurrency: int, force: bool) -> None:
+def run(ctx: click.Context, chunks_file: str, output_dir: str, concurrency: int, max_concurrency: int,
+        rpm: int, tpm: int, batch_tokens: int, force: bool) -> None:
     """Process chunks with DeepSeek API."""
     from .run import process_chunks_with_deepseek
     
@@ -73,7 +193,8 @@ def run(ctx: click.Context, chunks_file: str, output_dir: str, concurrency: int,
         )
     
     try:
-        process_chunks_with_deepseek(chunks_file, output_dir, concurrency, force, logger)
+        process_chunks_with_deepseek(chunks_file, output_dir, concurrency, force, logger, max_concurrency, rpm, tpm,
+                                     batch_tokens)
         logger.info("Run command completed successfully")
     except Exception as e:
         logger.error(f"Run command failed: {e}")
@@ -83,9 +204,11 @@ def run(ctx: click.Context, chunks_file: str, output_dir: str, concurrency: int,
 @cli.command()
 @click.option('--input-dir', default='out/chunk_results', help='Directory with chunk results')
 @click.option('--output-dir', default='out/docs', help='Output directory for merged documents')
+@click.option('--aliases-file', default='out/doc_aliases.json',
+              help='Duplicate-document map written by pack (default: out/doc_aliases.json)')
 @click.option('--force', is_flag=True, help='Overwrite existing results')
 @click.pass_context
-def merge(ctx: click.Context, input_dir: str, output_dir: str, force: bool) -> None:
+def merge(ctx: click.Context, input_dir: str, output_dir: str, aliases_file: str, force: bool) -> None:
     """Merge chunk results into document-level results."""
     from .merge import merge_chunk_results
     
@@ -93,7 +216,7 @@ def merge(ctx: click.Context, input_dir: str, output_dir: str, force: bool) -> N
     logger.info(f"Starting merge command: input_dir={input_dir}, output_dir={output_dir}")
     
     try:
-        merge_chunk_results(input_dir, output_dir, force, logger)
+        merge_chunk_results(input_dir, output_dir, force, logger, aliases_file)
         logger.info("Merge command completed successfully")
     except Exception as e:
         logger.error(f"Merge command failed: {e}")
@@ -129,11 +252,30 @@ def propose(ctx: click.Context, docs_dir: str, output_dir: str, min_doc_count: i
               default='auto',
               help='LLM provider mode: chat (fast), reasoner (thorough), auto (adaptive)')
 @click.option('--concurrency', default=4, help='Number of concurrent API requests (default: 4)')
+@click.option('--max-concurrency', default=0,
+              help='Let the concurrency adapt up to this many requests in flight, backing off on 429/5xx '
+                   'and latency spikes; 0 keeps it fixed (default: 0)')
+@click.option('--rpm', default=0, envvar='DEEPSEEK_RPM', show_envvar=True,
+              help='Requests per minute allowed by the API account; '
+                   '0 for no limit (default: 0)')
+@click.option('--tpm', default=0, envvar='DEEPSEEK_TPM', show_envvar=True,
+              help='Tokens (input and output) per minute allowed by the API account; '
+                   '0 for no limit (default: 0)')
+@click.option('--batch-tokens', default=0,
+              help='Pack consecutive paragraphs of a document of up to this many tokens in total into '
+                   'one request; 0 sends each on its own (default: 0)')
 @click.option('--min-doc-count', default=5, help='Minimum document count for new candidates (default: 5)')
 @click.option('--force', is_flag=True, help='Overwrite existing outputs')
+@click.option('--targeted', is_flag=True,
+              help='Only extract the pages spanning the rule sections (§ 3/§ 4), found by a quick PyMuPDF '
+                   'pre-scan; without PyMuPDF all pages are extracted')
+@click.option('--timeout', default=120.0, help='Seconds allowed to extract one PDF; 0 for no limit (default: 120)')
+@click.option('--max-rss-mb', default=2048, help='Memory allowed for extracting one PDF; 0 for no limit (default: 2048)')
+@click.option('--workers', default=1, help='Number of extraction processes (default: 1)')
 @click.pass_context
 def enumdiff(ctx: click.Context, pdfdir: str, out: str, provider_mode: str, 
-             concurrency: int, min_doc_count: int, force: bool) -> None:
+             concurrency: int, max_concurrency: int, rpm: int, tpm: int, batch_tokens: int, min_doc_count: int,
+             force: bool, targeted: bool, timeout: float, max_rss_mb: int, workers: int) -> None:
     """Extract enum-diff proposals from NSG PDFs (minimal, fast workflow)."""
     from .enumdiff import run_enumdiff
     
@@ -153,7 +295,8 @@ def enumdiff(ctx: click.Context, pdfdir: str, out: str, provider_mode: str,
         )
     
     try:
-        run_enumdiff(pdfdir, out, provider_mode, concurrency, min_doc_count, force, logger)
+        run_enumdiff(pdfdir, out, provider_mode, concurrency, min_doc_count, force, logger, targeted, timeout,
+                     max_rss_mb, max_concurrency, rpm, tpm, batch_tokens, max(1, workers))
         logger.info("Enumdiff command completed successfully")
     except Exception as e:
         logger.error(f"Enumdiff command failed: {e}")
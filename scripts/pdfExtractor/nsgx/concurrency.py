@@ -0,0 +1,99 @@
+"""Adaptive (AIMD) limit on the API requests in flight."""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+# Factor the limit is multiplied by on a 429/5xx, a timeout or a latency spike
+DECREASE_FACTOR = 0.5
+# A response slower than this many times the smoothed latency counts as a spike
+LATENCY_SPIKE_FACTOR = 3.0
+# Weight of each new latency in the smoothed latency
+LATENCY_SMOOTHING = 0.1
+# Responses needed before latency spikes are acted on
+MIN_LATENCY_SAMPLES = 10
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on the requests in flight, additive increase, multiplicative decrease.
+    
+    While all slots are busy and responses are healthy the limit grows by
+    one per `limit` successful responses. A 429/5xx, a timeout or a latency
+    spike cuts it by DECREASE_FACTOR, at most once per round trip: responses
+    to requests sent before the last cut do not cut again. The limit stays
+    between 1 and `maximum`. With maximum equal to initial it is fixed and
+    this is a plain semaphore.
+    """
+    
+    def __init__(self, initial: int, maximum: int, logger: logging.Logger):
+        self.initial = max(1, initial)
+        self.maximum = max(self.initial, maximum)
+        self.adaptive = self.maximum > self.initial
+        self.limit = float(self.initial)
+        self.in_flight = 0
+        self.logger = logger
+        self._condition: Optional[asyncio.Condition] = None
+        self._started = time.monotonic()
+        self._last_decrease = self._started
+        self._latency: Optional[float] = None
+        self._samples = 0
+        self.history: List[Tuple[float, int]] = [(0.0, self.initial)]
+    
+    @property
+    def level(self) -> int:
+        return int(self.limit)
+    
+    async def acquire(self) -> float:
+        """Wait for a free slot; returns the time the request starts."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.level)
+            self.in_flight += 1
+        return time.monotonic()
+    
+    async def release(self, started: float, overloaded: bool = False, healthy: bool = True) -> None:
+        """
+        Free the slot of a request started at `started` and adapt the limit.
+        
+        overloaded marks a 429/5xx or timeout; healthy is False for outcomes
+        that say nothing about capacity (connection errors, 4xx).
+        """
+        now = time.monotonic()
+        saturated = self.in_flight >= self.level
+        self.in_flight -= 1
+        
+        if self.adaptive:
+            latency = now - started
+            spike = (not overloaded and healthy and self._samples >= MIN_LATENCY_SAMPLES
+                     and latency > LATENCY_SPIKE_FACTOR * self._latency)
+            if overloaded or spike:
+                if started >= self._last_decrease:
+                    self._last_decrease = now
+                    reason = "overload" if overloaded else f"latency {latency:.1f}s"
+                    self._set_limit(max(1.0, self.limit * DECREASE_FACTOR), reason)
+            elif healthy and saturated:
+                self._set_limit(min(float(self.maximum), self.limit + 1 / self.limit), None)
+            if healthy and not overloaded:
+                # Spikes still feed the average, so a lasting slowdown becomes the new normal
+                self._samples += 1
+                if self._latency is None:
+                    self._latency = latency
+                else:
+                    self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+        
+        async with self._condition:
+            self._condition.notify_all()
+    
+    def _set_limit(self, limit: float, reason: Optional[str]) -> None:
+        previous = self.level
+        self.limit = limit
+        if self.level == previous:
+            return
+        self.history.append((round(time.monotonic() - self._started, 1), self.level))
+        if reason:
+            self.logger.info(f"Concurrency {previous} -> {self.level} ({reason})")
+        else:
+            self.logger.debug(f"Concurrency {previous} -> {self.level}")
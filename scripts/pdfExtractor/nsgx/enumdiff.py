@@ -1,5 +1,6 @@
 """Minimal enum-diff tool for identifying missing enum values from NSG PDFs."""
 
+import asyncio
 import csv
 import hashlib
 import json
@@ -8,18 +9,25 @@ import os
 import re
 import sqlite3
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-import requests
 from rapidfuzz import fuzz
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
-from .pack import extract_text_from_pdf, find_pdf_files
+from .batching import BATCH_MAX_OUTPUT_TOKENS, format_batch, plan_batches, split_batch_response
+from .llm import DeepSeekEngine, TruncatedResponse
+from .pack import (
+    DEFAULT_PDF_TIMEOUT, FORM_FEED_BACKENDS, find_pdf_documents, iter_pdf_pages, pymupdf, scan_page_texts
+)
 from .utils import extract_doc_id_from_filename, normalize_string_for_comparison, save_json_file, load_json_file
+from .workers import (
+    DEFAULT_MAX_RSS_MB, DEFAULT_MAX_TASKS_PER_CHILD, OK, QUARANTINE_FILENAME, QUARANTINE_STATUSES, Quarantine,
+    SupervisedPool
+)
+
+# max_tokens of a single-paragraph request; also bounds how many paragraphs a batch holds
+PARAGRAPH_MAX_OUTPUT_TOKENS = 1500
 
 
 @dataclass
@@ -109,7 +117,8 @@ class CandidateAggregate:
 class DeepSeekEnumClient:
     """DeepSeek client specialized for enum-diff tasks."""
     
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, concurrency: int = 4, max_concurrency: int = 0,
+                 rpm: int = 0, tpm: int = 0):
         self.logger = logger
         
         # Load configuration
@@ -128,23 +137,8 @@ class DeepSeekEnumClient:
         # Validate configuration
         self._validate_configuration()
         
-        # Setup session with retry strategy
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            status_forcelist=[429, 500, 502, 503, 504],
-            backoff_factor=1,
-            allowed_methods=["POST"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-        
-        # Default headers
-        self.session.headers.update({
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        })
+        # Requests in flight are capped by the engine's semaphore
+        self.engine = DeepSeekEngine(self.endpoint, self.api_key, concurrency, logger, max_concurrency, rpm, tpm)
         
         self.logger.info(f"DeepSeek client initialized with chat model: {self.chat_model}")
         self.logger.info(f"Reasoner model: {self.reasoner_model}")
@@ -160,16 +154,13 @@ class DeepSeekEnumClient:
         if not self.api_key.startswith('sk-'):
             self.logger.warning("DEEPSEEK_API_KEY does not start with 'sk-', this may be incorrect")
     
-    def process_paragraph(self, doc_id: str, para_id: str, paragraph: str, 
-                         system_prompt: str, use_reasoner: bool = False, retry_count: int = 0) -> Optional[ParagraphResult]:
+    async def process_paragraph(self, doc_id: str, para_id: str, paragraph: str,
+                                system_prompt: str, use_reasoner: bool = False) -> Optional[ParagraphResult]:
         """Process a single paragraph to extract enum proposals."""
         model = self.reasoner_model if use_reasoner else self.chat_model
         mode_text = "reasoner" if use_reasoner else "chat"
         self.logger.debug(f"Processing {doc_id}:{para_id} with {mode_text} model: {model}")
         
-        if retry_count > 0:
-            self.logger.debug(f"Retry attempt {retry_count} for {doc_id}:{para_id}")
-        
         # Prepare request payload
         # Ensure JSON keyword requirement is met
         user_content = paragraph
@@ -184,105 +175,101 @@ class DeepSeekEnumClient:
                 {"role": "user", "content": user_content}
             ],
             "temperature": 0.1 if use_reasoner else 0.2,
-            "max_tokens": 1500,
+            "max_tokens": PARAGRAPH_MAX_OUTPUT_TOKENS,
             "response_format": {"type": "json_object"}
         }
         
         try:
-            # Make API request
-            response = self.session.post(
-                self.endpoint,
-                json=payload,
-                timeout=90 if use_reasoner else 60
-            )
-            
-            if response.status_code == 429:
-                # Rate limited, wait and retry
-                retry_after = int(response.headers.get('Retry-After', 60))
-                self.logger.warning(f"Rate limited, waiting {retry_after} seconds")
-                time.sleep(retry_after)
-                return self.process_paragraph(doc_id, para_id, paragraph, system_prompt, use_reasoner)
-            
-            if response.status_code != 200:
-                self.logger.error(f"API request failed with status {response.status_code} for {doc_id}:{para_id}")
-                self.logger.error(f"Response text: {response.text}")
+            # Empty bodies are not retried here, only empty content
+            data = await self.engine.complete_json(payload, 90 if use_reasoner else 60, f"{doc_id}:{para_id}",
+                                                   empty_body_retries=0)
+            if data is None:
                 return None
             
-            if not response.text:
-                self.logger.error(f"Empty response for {doc_id}:{para_id}")
-                return None
-            
-            # Parse response
-            try:
-                result = response.json()
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Failed to parse API response JSON for {doc_id}:{para_id}: {e}")
-                return None
-            
-            # Extract content
-            choices = result.get('choices', [])
-            if not choices:
-                self.logger.error(f"No choices in API response for {doc_id}:{para_id}")
-                return None
-            
-            message = choices[0].get('message', {})
-            content = message.get('content', '')
-            
-            if not content:
-                # Handle empty content with retry logic (known DeepSeek issue)
-                if retry_count < 2:  # Allow up to 2 retries
-                    self.logger.warning(f"Empty content received for {doc_id}:{para_id}, retrying ({retry_count + 1}/2)")
-                    self.logger.warning("This is a known DeepSeek JSON mode issue - retrying with slight delay")
-                    time.sleep(1)  # Small delay before retry
-                    return self.process_paragraph(doc_id, para_id, paragraph, system_prompt, use_reasoner, retry_count + 1)
-                else:
-                    self.logger.error(f"Empty content in API response for {doc_id}:{para_id} after {retry_count + 1} attempts")
-                    self.logger.error("Known DeepSeek issue: JSON mode may occasionally return empty content")
-                    return None
-            
-            # Parse nested JSON content
-            try:
-                data = json.loads(content)
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Failed to parse nested JSON content for {doc_id}:{para_id}: {e}")
-                return None
-            
-            # Convert to ParagraphResult
-            proposals = []
-            for prop_data in data.get('proposals', []):
-                try:
-                    proposal = EnumProposal(
-                        type=prop_data.get('type', ''),
-                        candidate=prop_data.get('candidate', ''),
-                        decision=prop_data.get('decision', ''),
-                        target_or_key=prop_data.get('target_or_key', ''),
-                        reason=prop_data.get('reason', ''),
-                        citation=prop_data.get('citation', ''),
-                        confidence=prop_data.get('confidence', 0.0)
-                    )
-                    proposals.append(proposal)
-                except Exception as e:
-                    self.logger.warning(f"Failed to parse proposal in {doc_id}:{para_id}: {e}")
-                    continue
-            
-            result = ParagraphResult(
-                doc_id=doc_id,
-                para_id=para_id,
-                proposals=proposals
-            )
-            
-            self.logger.debug(f"Successfully processed {doc_id}:{para_id}: {len(proposals)} proposals")
+            result = self._parse_proposals(doc_id, para_id, data)
+            self.logger.debug(f"Successfully processed {doc_id}:{para_id}: {len(result.proposals)} proposals")
             return result
             
-        except requests.exceptions.Timeout as e:
-            self.logger.error(f"Request timeout for {doc_id}:{para_id}: {e}")
-            return None
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Request error for {doc_id}:{para_id}: {e}")
-            return None
         except Exception as e:
             self.logger.error(f"Unexpected error processing {doc_id}:{para_id}: {e}")
             return None
+    
+    async def process_paragraphs(self, doc_id: str, paragraphs: List[Tuple[str, str]], system_prompt: str,
+                                 use_reasoner: bool = False) -> Dict[str, ParagraphResult]:
+        """
+        Process several paragraphs of a document in one request (see batching).
+        
+        Returns the results keyed by para_id; paragraphs the answer leaves
+        out, or all of them if the request fails, are missing. A batch whose
+        answer is cut off at max_tokens is split in half and each half of
+        more than one paragraph is sent again.
+        """
+        model = self.reasoner_model if use_reasoner else self.chat_model
+        label = f"{doc_id}:{paragraphs[0][0]}-{paragraphs[-1][0]}"
+        self.logger.debug(f"Processing {len(paragraphs)} paragraphs {label} with model: {model}")
+        
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": format_batch(paragraphs)}
+            ],
+            "temperature": 0.1 if use_reasoner else 0.2,
+            "max_tokens": BATCH_MAX_OUTPUT_TOKENS,
+            "response_format": {"type": "json_object"}
+        }
+        
+        try:
+            # The longer answer of a batch gets three times the single-paragraph timeout
+            try:
+                data = await self.engine.complete_json(payload, 270 if use_reasoner else 180, label,
+                                                       empty_body_retries=0, raise_on_truncation=True)
+            except TruncatedResponse as e:
+                self.logger.warning(f"{e}; splitting the batch in half")
+                middle = len(paragraphs) // 2
+                results: Dict[str, ParagraphResult] = {}
+                for answers in await asyncio.gather(*(
+                    self.process_paragraphs(doc_id, half, system_prompt, use_reasoner)
+                    for half in (paragraphs[:middle], paragraphs[middle:]) if len(half) > 1
+                )):
+                    results.update(answers)
+                return results
+            if data is None:
+                return {}
+            
+            answers = split_batch_response(data, [para_id for para_id, _ in paragraphs])
+            if len(answers) < len(paragraphs):
+                self.logger.warning(f"No answer for {len(paragraphs) - len(answers)} of the paragraphs {label}")
+            return {para_id: self._parse_proposals(doc_id, para_id, answer) for para_id, answer in answers.items()}
+            
+        except Exception as e:
+            self.logger.error(f"Unexpected error processing {label}: {e}")
+            return {}
+    
+    def _parse_proposals(self, doc_id: str, para_id: str, data: Dict[str, Any]) -> ParagraphResult:
+        """Convert the API's answer for a paragraph to a ParagraphResult."""
+        proposals = []
+        for prop_data in data.get('proposals', []):
+            try:
+                proposal = EnumProposal(
+                    type=prop_data.get('type', ''),
+                    candidate=prop_data.get('candidate', ''),
+                    decision=prop_data.get('decision', ''),
+                    target_or_key=prop_data.get('target_or_key', ''),
+                    reason=prop_data.get('reason', ''),
+                    citation=prop_data.get('citation', ''),
+                    confidence=prop_data.get('confidence', 0.0)
+                )
+                proposals.append(proposal)
+            except Exception as e:
+                self.logger.warning(f"Failed to parse proposal in {doc_id}:{para_id}: {e}")
+                continue
+        
+        return ParagraphResult(
+            doc_id=doc_id,
+            para_id=para_id,
+            proposals=proposals
+        )
 
 
 class EnumDiffCache:
@@ -365,15 +352,128 @@ def load_system_prompt() -> str:
     return system_prompt
 
 
-def extract_paragraphs_from_pdf(pdf_path: str) -> List[Tuple[str, str]]:
-    """Extract rule-bearing paragraphs from PDF."""
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
-        return []
-    
-    # Split into paragraphs by blank lines
-    paragraphs = re.split(r'\n\s*\n', text)
-    
+# Paragraphs are separated by blank lines
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+# Start of the rule sections: a "§ 3"/"§ 4" heading line (no digits after it, unlike
+# "§ 4 Abs. 1" references or table-of-contents lines), a prohibition, or the first
+# article of an amending regulation
+RULE_SECTION_START = re.compile(
+    r'^[ \t]*§[ \t]*[34]\b\.?(?:[ \t]+[^\d\n]*)?[ \t]*$'
+    r'|verboten|untersagt'
+    r'|wie folgt geändert'
+    r'|^[ \t]*Artikel[ \t]+(?:1|I)[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+# End of a regulation: the "<Ort>, den <Datum>" line above the signature, or an annex heading
+# line (often letter-spaced, "A n h a n g")
+REGULATION_END = re.compile(
+    r'^[ \t]*[A-ZÄÖÜ][^\n§]{1,80},\s*den[ \t]+\d'
+    r'|^[ \t]*A[ \t]?n[ \t]?(?:h[ \t]?a[ \t]?n[ \t]?g|l[ \t]?a[ \t]?g[ \t]?e)(?:[ \t]+\d+)?[ \t]*$',
+    re.MULTILINE
+)
+# Any mention of § 3/§ 4, e.g. in the articles of an amendment bound in after the signature
+RULE_SECTION_MENTION = re.compile(r'§\s*[34]\b')
+
+
+def extract_paragraphs_from_pdf(pdf_path: str, targeted: bool = False,
+                                content_hash: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Extract rule-bearing paragraphs from PDF, page by page.
+    
+    With targeted, a cheap pre-scan (see find_rule_pages) picks the pages that
+    hold the rule sections and only those get the full layout extraction.
+    Paragraph IDs then count from the first extracted page, so they differ
+    from those of a full extraction. content_hash, if known, saves hashing
+    the file for the text cache.
+    """
+    page_numbers = None
+    # The pre-scan only pays off with PyMuPDF; a pypdf scan costs more than the pages it saves
+    if targeted and pymupdf is not None:
+        scanned = scan_page_texts(pdf_path, content_hash)
+        page_numbers = find_rule_pages(scanned) if scanned else None
+        if page_numbers is not None:
+            logging.getLogger("nsgx").debug(
+                f"Targeted extraction of {pdf_path}: {len(page_numbers)} of {len(scanned)} pages"
+            )
+    pages = iter_pdf_pages(pdf_path, page_numbers=page_numbers, content_hash=content_hash)
+    return select_rule_paragraphs(iter_page_paragraphs(pages))
+
+
+def find_rule_pages(pages: List[Dict[str, Any]]) -> Optional[Set[int]]:
+    """
+    Page numbers spanning the rule sections of the regulations in a document.
+    
+    A span starts at the first page with a RULE_SECTION_START and runs up to
+    and including the page where the regulation ends (REGULATION_END). A
+    later page that still mentions § 3/§ 4 (RULE_SECTION_MENTION), such as
+    an amendment article after the signature, extends the span to it.
+    Preamble, area description and annexes are otherwise left out; a later
+    regulation in the same PDF opens a new span. Returns None if no rule
+    section is found, so the caller falls back to all pages.
+    """
+    selected: Set[int] = set()
+    in_rules = False
+    last_selected = None
+    for page in pages:
+        page_num = page["page_num"]
+        text = page["text"]
+        if in_rules:
+            selected.add(page_num)
+        elif last_selected is not None and RULE_SECTION_MENTION.search(text):
+            selected.update(range(last_selected + 1, page_num + 1))
+        # Walk the starts and ends on the page in order; one regulation may end where the next begins
+        position = 0
+        while True:
+            match = (REGULATION_END if in_rules else RULE_SECTION_START).search(text, position)
+            if match is None:
+                break
+            in_rules = not in_rules
+            if in_rules:
+                selected.add(page_num)
+            position = match.end()
+        if page_num in selected:
+            last_selected = page_num
+    return selected or None
+
+
+def iter_page_paragraphs(pages: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Split pages from iter_pdf_pages into paragraphs as they arrive.
+    
+    Gives the same paragraphs as splitting the document's stripped full text
+    with PARAGRAPH_BREAK, but only holds the paragraph still open at the end
+    of the current page. A paragraph is only emitted once non-blank text
+    follows its break, since trailing whitespace could still join the next
+    page's leading whitespace into one wider break. A page that does not
+    follow on from the previous one (targeted extraction) closes the open
+    paragraph.
+    """
+    pending = ""
+    previous_page = None
+    for page in pages:
+        if previous_page is not None and page["page_num"] != previous_page + 1 and pending.strip():
+            yield pending
+            pending = ""
+        previous_page = page["page_num"]
+        separator = '\f' if page["backend"] in FORM_FEED_BACKENDS else '\n'
+        pending = (pending + separator + page["text"]) if pending else page["text"].lstrip()
+        
+        content_end = len(pending.rstrip())
+        *complete, last = PARAGRAPH_BREAK.split(pending[:content_end])
+        yield from complete
+        pending = last + pending[content_end:]
+    
+    if pending.strip():
+        yield pending
+
+
+def filter_rule_paragraphs(text: str) -> List[Tuple[str, str]]:
+    """Split extracted text into paragraphs and keep the rule-bearing ones."""
+    return select_rule_paragraphs(PARAGRAPH_BREAK.split(text))
+
+
+def select_rule_paragraphs(paragraphs: Iterable[str]) -> List[Tuple[str, str]]:
+    """Keep the rule-bearing paragraphs, numbered by their position in the document."""
     # Filter to rule-bearing paragraphs
     rule_patterns = [
         r'verboten|untersagt|zulässig',
@@ -408,22 +508,17 @@ def extract_paragraphs_from_pdf(pdf_path: str) -> List[Tuple[str, str]]:
     return filtered_paragraphs
 
 
-def process_single_pdf(pdf_path: Path, client: DeepSeekEnumClient, cache: EnumDiffCache,
-                      system_prompt: str, provider_mode: str, logger: logging.Logger) -> List[ParagraphResult]:
-    """Process a single PDF file."""
-    doc_id = extract_doc_id_from_filename(pdf_path.name)
-    logger.debug(f"Processing PDF: {pdf_path} -> {doc_id}")
+async def process_single_paragraph(doc_id: str, para_id: str, paragraph: str, client: DeepSeekEnumClient,
+                                   cache: EnumDiffCache, system_prompt: str, provider_mode: str,
+                                   logger: logging.Logger,
+                                   result: Optional[ParagraphResult] = None) -> Optional[ParagraphResult]:
+    """
+    Process one paragraph, from the cache when possible, escalating to the reasoner in auto mode.
     
-    # Extract paragraphs
-    paragraphs = extract_paragraphs_from_pdf(str(pdf_path))
-    if not paragraphs:
-        logger.warning(f"No rule-bearing paragraphs found in {pdf_path}")
-        return []
-    
-    logger.info(f"Extracted {len(paragraphs)} paragraphs from {doc_id}")
-    
-    results = []
-    for para_id, paragraph in paragraphs:
+    result is the answer of a batched request for the paragraph, if it had one.
+    """
+    use_reasoner = provider_mode == "reasoner"
+    if result is None:
         # Check cache first
         if provider_mode == "auto":
             # Try chat model first
@@ -431,54 +526,103 @@ def process_single_pdf(pdf_path: Path, client: DeepSeekEnumClient, cache: EnumDi
             if cached_response:
                 try:
                     result = ParagraphResult.from_dict(cached_response)
-                    results.append(result)
                     logger.debug(f"Used cached response for {doc_id}:{para_id}")
-                    continue
+                    return result
                 except Exception as e:
                     logger.warning(f"Failed to parse cached response for {doc_id}:{para_id}: {e}")
         
         # Process with API
-        use_reasoner = provider_mode == "reasoner"
-        result = client.process_paragraph(doc_id, para_id, paragraph, system_prompt, use_reasoner)
-        
-        if result:
-            # Check if we need to escalate to reasoner (auto mode only)
-            if provider_mode == "auto" and not use_reasoner:
-                needs_reasoner = False
-                for proposal in result.proposals:
-                    if proposal.decision == "UNSURE" or proposal.confidence < 0.65:
-                        needs_reasoner = True
-                        break
+        result = await client.process_paragraph(doc_id, para_id, paragraph, system_prompt, use_reasoner)
+    
+    if not result:
+        logger.error(f"Failed to process {doc_id}:{para_id}")
+        return None
+    
+    # Check if we need to escalate to reasoner (auto mode only)
+    if provider_mode == "auto" and not use_reasoner:
+        needs_reasoner = False
+        for proposal in result.proposals:
+            if proposal.decision == "UNSURE" or proposal.confidence < 0.65:
+                needs_reasoner = True
+                break
+        
+        if needs_reasoner:
+            logger.info(f"Escalating {doc_id}:{para_id} to reasoner model")
+            
+            # Check reasoner cache
+            cached_response = cache.get_cached_response(doc_id, paragraph, client.reasoner_model)
+            if cached_response:
+                try:
+                    result = ParagraphResult.from_dict(cached_response)
+                    logger.debug(f"Used cached reasoner response for {doc_id}:{para_id}")
+                except Exception as e:
+                    logger.warning(f"Failed to parse cached reasoner response: {e}")
+                    # Re-process with reasoner
+                    result = await client.process_paragraph(doc_id, para_id, paragraph, system_prompt, True)
+            else:
+                # Process with reasoner
+                result = await client.process_paragraph(doc_id, para_id, paragraph, system_prompt, True)
                 
-                if needs_reasoner:
-                    logger.info(f"Escalating {doc_id}:{para_id} to reasoner model")
-                    
-                    # Check reasoner cache
-                    cached_response = cache.get_cached_response(doc_id, paragraph, client.reasoner_model)
-                    if cached_response:
-                        try:
-                            result = ParagraphResult.from_dict(cached_response)
-                            logger.debug(f"Used cached reasoner response for {doc_id}:{para_id}")
-                        except Exception as e:
-                            logger.warning(f"Failed to parse cached reasoner response: {e}")
-                            # Re-process with reasoner
-                            result = client.process_paragraph(doc_id, para_id, paragraph, system_prompt, True)
-                    else:
-                        # Process with reasoner
-                        result = client.process_paragraph(doc_id, para_id, paragraph, system_prompt, True)
-                        
-                        # Cache reasoner result
-                        if result:
-                            cache.cache_response(doc_id, paragraph, client.reasoner_model, result.to_dict())
+                # Cache reasoner result
+                if result:
+                    cache.cache_response(doc_id, paragraph, client.reasoner_model, result.to_dict())
             
-            # Cache the result
-            model_used = client.reasoner_model if use_reasoner else client.chat_model
-            cache.cache_response(doc_id, paragraph, model_used, result.to_dict())
-            results.append(result)
-        else:
-            logger.error(f"Failed to process {doc_id}:{para_id}")
+            if not result:
+                logger.error(f"Failed to process {doc_id}:{para_id}")
+                return None
+    
+    # Cache the result
+    model_used = client.reasoner_model if use_reasoner else client.chat_model
+    cache.cache_response(doc_id, paragraph, model_used, result.to_dict())
+    return result
+
+
+async def process_single_pdf(pdf_path: Path, client: DeepSeekEnumClient, cache: EnumDiffCache,
+                             system_prompt: str, provider_mode: str, logger: logging.Logger,
+                             doc_id: Optional[str] = None, targeted: bool = False,
+                             paragraphs: Optional[List[Tuple[str, str]]] = None,
+                             batch_tokens: int = 0) -> List[ParagraphResult]:
+    """
+    Process a single PDF file (its paragraphs are extracted here unless already given).
+    
+    With batch_tokens, uncached paragraphs of up to that many tokens in
+    total share one request; paragraphs the batch leaves unanswered, and
+    escalations to the reasoner, are sent on their own.
+    """
+    if doc_id is None:
+        doc_id = extract_doc_id_from_filename(pdf_path.name)
+    logger.debug(f"Processing PDF: {pdf_path} -> {doc_id}")
+    
+    # Extract paragraphs
+    if paragraphs is None:
+        paragraphs = extract_paragraphs_from_pdf(str(pdf_path), targeted)
+    if not paragraphs:
+        logger.warning(f"No rule-bearing paragraphs found in {pdf_path}")
+        return []
+    
+    logger.info(f"Extracted {len(paragraphs)} paragraphs from {doc_id}")
     
-    return results
+    batch_results: Dict[str, ParagraphResult] = {}
+    if batch_tokens:
+        uncached = [
+            (para_id, paragraph) for para_id, paragraph in paragraphs
+            if provider_mode != "auto" or not cache.get_cached_response(doc_id, paragraph, client.chat_model)
+        ]
+        batches = [
+            batch for batch in plan_batches(uncached, batch_tokens, PARAGRAPH_MAX_OUTPUT_TOKENS) if len(batch) > 1
+        ]
+        for answers in await asyncio.gather(*(
+            client.process_paragraphs(doc_id, batch, system_prompt, provider_mode == "reasoner") for batch in batches
+        )):
+            batch_results.update(answers)
+    
+    # All paragraphs are sent at once; the engine limits how many are on the wire
+    results = await asyncio.gather(*(
+        process_single_paragraph(doc_id, para_id, paragraph, client, cache, system_prompt, provider_mode, logger,
+                                 batch_results.get(para_id))
+        for para_id, paragraph in paragraphs
+    ))
+    return [result for result in results if result]
 
 
 def aggregate_candidates(all_results: List[ParagraphResult], 
@@ -650,6 +794,52 @@ def write_changelog(aggregates: List[CandidateAggregate], output_file: str) -> N
                 f.write(f"  - Confidence: {agg.confidence_avg:.2f}\n\n")
 
 
+async def _process_documents(
+    extracted: Iterator[Tuple[int, str, Any]],
+    documents: List[Tuple[Path, str, List[str]]],
+    client: DeepSeekEnumClient,
+    cache: EnumDiffCache,
+    system_prompt: str,
+    provider_mode: str,
+    targeted: bool,
+    quarantine: Quarantine,
+    logger: logging.Logger,
+    batch_tokens: int = 0
+) -> Tuple[List[Tuple[Tuple[Path, List[str]], Any]], int]:
+    """
+    Send each document's paragraphs to the API as soon as they are extracted.
+    
+    extracted is SupervisedPool.imap_unordered over the documents; it blocks,
+    so it is advanced in a thread while the requests run. Returns each
+    processed document with its results (or the exception it raised) and
+    the number of PDFs whose extraction failed.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = []
+    failed_count = 0
+    
+    async with client.engine:
+        while True:
+            outcome = await loop.run_in_executor(None, next, extracted, None)
+            if outcome is None:
+                break
+            index, status, value = outcome
+            pdf_file, content_hash, doc_ids = documents[index]
+            if status != OK:
+                logger.error(f"Failed to extract {pdf_file.name}: {value}")
+                failed_count += len(doc_ids)
+                if status in QUARANTINE_STATUSES:
+                    quarantine.add(pdf_file, status, value, content_hash)
+                continue
+            task = asyncio.ensure_future(process_single_pdf(pdf_file, client, cache, system_prompt, provider_mode,
+                                                            logger, doc_ids[0], targeted, value, batch_tokens))
+            tasks.append(((pdf_file, doc_ids), task))
+        
+        results = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+    
+    return [(document, result) for (document, _), result in zip(tasks, results)], failed_count
+
+
 def run_enumdiff(
     pdfdir: str,
     output_dir: str,
@@ -657,10 +847,29 @@ def run_enumdiff(
     concurrency: int,
     min_doc_count: int,
     force: bool,
-    logger: logging.Logger
+    logger: logging.Logger,
+    targeted: bool = False,
+    timeout: float = DEFAULT_PDF_TIMEOUT,
+    max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+    max_concurrency: int = 0,
+    rpm: int = 0,
+    tpm: int = 0,
+    batch_tokens: int = 0,
+    workers: int = 1
 ) -> None:
-    """Run the enum-diff extraction process."""
-    logger.info(f"Starting enum-diff with pdfdir={pdfdir}, concurrency={concurrency}")
+    """
+    Run the enum-diff extraction process.
+    
+    Paragraphs are extracted in workers supervised worker processes (see
+    workers.SupervisedPool) and each document's paragraphs are sent to the
+    API as soon as they are ready, at most concurrency requests at a time
+    (adapting up to max_concurrency, see concurrency.AdaptiveConcurrency).
+    PDFs that exceed timeout seconds or max_rss_mb, or crash the worker,
+    are listed in quarantine.json in the output directory and skipped by
+    later runs.
+    """
+    logger.info(f"Starting enum-diff with pdfdir={pdfdir}, workers={workers}, concurrency={concurrency}, "
+                f"targeted={targeted}")
     
     # Setup output directories
     output_path = Path(output_dir)
@@ -677,20 +886,21 @@ def run_enumdiff(
             proposals_file.unlink()
         logger.info("Cleared existing outputs (--force)")
     
-    # Find PDF files
-    pdf_files = list(find_pdf_files(pdfdir))
-    if not pdf_files:
+    # Find PDF files; byte-identical duplicates are analysed once
+    documents = find_pdf_documents(pdfdir)
+    if not documents:
         logger.error(f"No PDF files found in {pdfdir}")
         return
     
-    logger.info(f"Found {len(pdf_files)} PDF files")
+    total_pdfs = sum(len(doc_ids) for _, _, doc_ids in documents)
+    logger.info(f"Found {total_pdfs} PDF files ({len(documents)} distinct)")
     
     # Load system prompt
     system_prompt = load_system_prompt()
     logger.debug(f"Loaded system prompt: {len(system_prompt)} characters")
     
     # Initialize components
-    client = DeepSeekEnumClient(logger)
+    client = DeepSeekEnumClient(logger, concurrency, max_concurrency, rpm, tpm)
     cache = EnumDiffCache(str(cache_file))
     
     # Process PDFs
@@ -698,28 +908,41 @@ def run_enumdiff(
     successful_count = 0
     failed_count = 0
     
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        # Submit all tasks
-        future_to_pdf = {
-            executor.submit(process_single_pdf, pdf_file, client, cache, system_prompt, provider_mode, logger): pdf_file
-            for pdf_file in pdf_files
-        }
-        
-        # Process results as they complete
-        for future in as_completed(future_to_pdf):
-            pdf_file = future_to_pdf[future]
-            try:
-                results = future.result()
-                if results:
-                    all_results.extend(results)
-                    successful_count += 1
-                    logger.info(f"Processed {pdf_file.name}: {len(results)} paragraphs")
-                else:
-                    failed_count += 1
-                    logger.warning(f"No results from {pdf_file.name}")
-            except Exception as e:
-                logger.error(f"Failed to process {pdf_file.name}: {e}")
-                failed_count += 1
+    quarantine = Quarantine(str(output_path / QUARANTINE_FILENAME))
+    extraction_tasks = []
+    for index, (pdf_file, content_hash, doc_ids) in enumerate(documents):
+        reason = quarantine.reason_for(pdf_file, content_hash)
+        if reason:
+            logger.warning(f"Skipping quarantined {pdf_file} ({reason})")
+            failed_count += len(doc_ids)
+            continue
+        extraction_tasks.append((index, (str(pdf_file), targeted, content_hash)))
+    
+    # Workers are started from the executor thread while the event loop and API connections are
+    # live; forkserver keeps them from inheriting either
+    with SupervisedPool(extract_paragraphs_from_pdf, workers, timeout, max_rss_mb,
+                        DEFAULT_MAX_TASKS_PER_CHILD, start_method="forkserver") as extractors:
+        results, extraction_failures = asyncio.run(_process_documents(
+            extractors.imap_unordered(extraction_tasks), documents, client, cache, system_prompt,
+            provider_mode, targeted, quarantine, logger, batch_tokens
+        ))
+    failed_count += extraction_failures
+    
+    for (pdf_file, doc_ids), document_results in results:
+        if isinstance(document_results, BaseException):
+            logger.error(f"Failed to process {pdf_file.name}: {document_results}")
+            failed_count += len(doc_ids)
+        elif document_results:
+            logger.info(f"Processed {doc_ids[0]}: {len(document_results)} paragraphs")
+            # Identical PDFs still count as separate documents for the aggregation
+            all_results.extend(document_results)
+            all_results.extend(
+                replace(result, doc_id=alias) for alias in doc_ids[1:] for result in document_results
+            )
+            successful_count += len(doc_ids)
+        else:
+            failed_count += len(doc_ids)
+            logger.warning(f"No results from {pdf_file.name}")
     
     logger.info(f"Processing completed: {successful_count} successful, {failed_count} failed")
     
@@ -758,7 +981,8 @@ def run_enumdiff(
     
     # Summary
     summary = {
-        "total_pdfs": len(pdf_files),
+        "total_pdfs": total_pdfs,
+        "distinct_pdfs": len(documents),
         "successful_pdfs": successful_count,
         "failed_pdfs": failed_count,
         "total_paragraphs": len(all_results),
@@ -766,7 +990,15 @@ def run_enumdiff(
         "aggregated_candidates": len(aggregates),
         "provider_mode": provider_mode,
         "concurrency": concurrency,
-        "min_doc_count": min_doc_count
+        "max_concurrency": client.engine.limiter.maximum,
+        "concurrency_levels": client.engine.limiter.history,
+        "min_doc_count": min_doc_count,
+        "targeted": targeted,
+        "workers": workers,
+        "transport": client.engine.transport.stats.to_dict(),
+        "rate_limit": client.engine.rate_limiter.to_dict(),
+        "batch_tokens": batch_tokens,
+        "api_requests": client.engine.requests_sent
     }
     
     summary_file = output_path / "enumdiff_summary.json"
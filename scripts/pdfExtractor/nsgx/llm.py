@@ -0,0 +1,257 @@
+"""Async DeepSeek chat-completions engine shared by run and enumdiff."""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+from .concurrency import AdaptiveConcurrency
+from .ratelimit import RateLimiter
+from .tokens import estimate_request_tokens
+from .transport import HTTPTransport
+
+# Retries of one request on connection errors, timeouts and RETRY_STATUSES
+MAX_RETRIES = 3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Seconds before retry n: 0, then BACKOFF_FACTOR * 2**(n-1); Retry-After wins for 429 and 503
+BACKOFF_FACTOR = 1
+# Retries when DeepSeek's JSON mode answers with an empty body or empty content
+EMPTY_RETRIES = 2
+EMPTY_RETRY_DELAY = 1
+# Seconds to wait on a 429 without a usable Retry-After header
+DEFAULT_RETRY_AFTER = 60
+
+
+class TruncatedResponse(Exception):
+    """The answer hit max_tokens before it was complete (finish_reason "length")."""
+
+
+def _retry_delay(retry: int, status: Optional[int], retry_after: Optional[str]) -> float:
+    """Seconds to wait before the given retry (1-based)."""
+    if status in (429, 503) and retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return DEFAULT_RETRY_AFTER
+    if retry <= 1:
+        return 0.0
+    return BACKOFF_FACTOR * 2 ** (retry - 1)
+
+
+class DeepSeekEngine:
+    """
+    Async HTTP engine for the DeepSeek chat-completions API.
+    
+    The requests in flight are capped at `concurrency`; callers just start
+    one coroutine per item, so hundreds of requests can be open at once from
+    one thread. With max_concurrency above concurrency the cap adapts
+    between 1 and max_concurrency (see concurrency.AdaptiveConcurrency).
+    Requests are retried on connection errors, timeouts and 429/5xx
+    responses, and only hold a slot while they are on the wire, not while
+    they back off. Connections come from an HTTPTransport whose pool holds
+    as many connections as requests can be in flight. With rpm or tpm set,
+    requests are also paced to those per-minute budgets (see
+    ratelimit.RateLimiter) before they take a slot.
+    """
+    
+    def __init__(self, endpoint: str, api_key: str, concurrency: int, logger: logging.Logger,
+                 max_concurrency: int = 0, rpm: int = 0, tpm: int = 0):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.logger = logger
+        self.limiter = AdaptiveConcurrency(concurrency, max_concurrency, logger)
+        self.rate_limiter = RateLimiter(rpm, tpm, logger)
+        self.transport = HTTPTransport(self.limiter.maximum, {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests_sent = 0
+    
+    async def __aenter__(self) -> "DeepSeekEngine":
+        await self.open()
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+    
+    async def open(self) -> None:
+        """Create the HTTP session; must run inside the event loop that makes the requests."""
+        self._session = await self.transport.open()
+    
+    async def close(self) -> None:
+        if self._session is not None:
+            await self.transport.close()
+            self._session = None
+            stats = self.transport.stats
+            self.logger.info(
+                f"Connections: {stats.connections_opened} opened, {stats.connections_reused} reused, "
+                f"{stats.handshake_seconds:.2f}s spent opening them"
+            )
+            if self.limiter.adaptive:
+                self.logger.info(
+                    f"Concurrency ended at {self.limiter.level} "
+                    f"(range 1-{self.limiter.maximum}, {len(self.limiter.history) - 1} changes)"
+                )
+            if self.rate_limiter.enabled:
+                self.logger.info(
+                    f"Rate limit: waited {self.rate_limiter.wait_seconds:.1f}s, "
+                    f"{self.rate_limiter.tokens_used} tokens used"
+                )
+    
+    async def post(self, payload: Dict[str, Any], timeout: float, label: str) -> Optional[Tuple[int, str, str]]:
+        """
+        POST payload to the endpoint, retrying transient failures.
+        
+        Returns (status, content type, body text) of the final response, or
+        None if no response arrived; the error is logged.
+        """
+        if self._session is None:
+            raise RuntimeError("DeepSeekEngine is not open")
+        
+        input_tokens = estimate_request_tokens(payload.get('messages', [])) if self.rate_limiter.enabled else 0
+        for retry in range(MAX_RETRIES + 1):
+            charged = await self.rate_limiter.acquire(input_tokens, payload.get('max_tokens', 0))
+            status = None
+            retry_after = None
+            overloaded = False
+            healthy = False
+            timed_out = False
+            started = await self.limiter.acquire()
+            self.requests_sent += 1
+            try:
+                async with self._session.post(self.endpoint, json=payload,
+                                              timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    text = await response.text()
+                    status = response.status
+                    retry_after = response.headers.get('Retry-After')
+                    content_type = response.headers.get('Content-Type', '')
+            except asyncio.TimeoutError:
+                overloaded = timed_out = True
+                error = f"Request timeout for {label} after {timeout}s"
+            except aiohttp.ClientError as e:
+                error = f"Request error for {label}: {e}"
+            else:
+                overloaded = status in RETRY_STATUSES
+                healthy = status == 200
+            finally:
+                await self.limiter.release(started, overloaded, healthy)
+            
+            if status == 200:
+                self._settle(charged, text)
+            elif not timed_out:
+                # An error status or a failed connection used no tokens; a timed-out request may still be billed
+                self.rate_limiter.refund(charged)
+            if status is not None:
+                if status not in RETRY_STATUSES or retry == MAX_RETRIES:
+                    return status, content_type, text
+                error = f"Status {status} for {label}"
+            
+            if retry == MAX_RETRIES:
+                self.logger.error(f"{error}; giving up after {MAX_RETRIES} retries")
+                return None
+            delay = _retry_delay(retry + 1, status, retry_after)
+            if status == 429:
+                self.logger.warning(f"Rate limited, waiting {delay:.0f} seconds")
+            else:
+                self.logger.warning(f"{error}; retrying in {delay:.0f}s ({retry + 1}/{MAX_RETRIES})")
+            await asyncio.sleep(delay)
+        return None
+    
+    def _settle(self, charged: int, text: str) -> None:
+        """Correct a request's rate-limit charge from the usage in its response body."""
+        if not charged:
+            return
+        try:
+            usage = json.loads(text).get('usage')
+        except (ValueError, AttributeError):
+            return
+        self.rate_limiter.settle(charged, usage if isinstance(usage, dict) else None)
+    
+    async def complete_json(self, payload: Dict[str, Any], timeout: float, label: str,
+                            empty_body_retries: int = EMPTY_RETRIES,
+                            raise_on_truncation: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Send a JSON-mode chat completion and return the JSON object in its message content.
+        
+        Empty message content, a known DeepSeek JSON mode issue, is retried
+        EMPTY_RETRIES times, an empty body empty_body_retries times. An
+        answer cut off at max_tokens raises TruncatedResponse with
+        raise_on_truncation, so batched callers can split the batch. Any
+        other failure is logged and gives None.
+        """
+        attempt = 0
+        while True:
+            response = await self.post(payload, timeout, label)
+            if response is None:
+                return None
+            status, content_type, text = response
+            
+            if status != 200:
+                self.logger.error(f"API request failed with status {status} for {label}")
+                self.logger.error(f"Response text: {text}")
+                return None
+            
+            if not text:
+                if attempt < empty_body_retries:
+                    attempt += 1
+                    self.logger.warning(f"Empty response received for {label}, retrying ({attempt}/{empty_body_retries})")
+                    await asyncio.sleep(EMPTY_RETRY_DELAY)
+                    continue
+                self.logger.error(f"Empty response received for {label} after {attempt + 1} attempts")
+                self.logger.error("This suggests API configuration or authentication issues")
+                return None
+            
+            if 'application/json' not in content_type.lower():
+                self.logger.warning(f"Unexpected content-type: {content_type} for {label}")
+                self.logger.debug(f"Response text: {text}")
+            
+            try:
+                result = json.loads(text)
+            except json.JSONDecodeError as e:
+                self.logger.error(f"Failed to parse API response JSON for {label}: {e}")
+                self.logger.error(f"Raw response text: {repr(text)}")
+                return None
+            
+            if not isinstance(result, dict):
+                self.logger.error(f"API response is not a dictionary for {label}: {type(result)}")
+                return None
+            
+            choices = result.get('choices', [])
+            if not choices:
+                self.logger.error(f"No choices in API response for {label}")
+                self.logger.debug(f"Response structure: {result}")
+                return None
+            
+            if choices[0].get('finish_reason') == 'length':
+                if raise_on_truncation:
+                    raise TruncatedResponse(f"Answer for {label} cut off at {payload.get('max_tokens')} tokens")
+                self.logger.error(f"Answer for {label} cut off at {payload.get('max_tokens')} tokens")
+                return None
+            
+            message = choices[0].get('message', {})
+            content = message.get('content', '')
+            if not content:
+                if attempt < EMPTY_RETRIES:
+                    attempt += 1
+                    self.logger.warning(f"Empty content received for {label}, retrying ({attempt}/{EMPTY_RETRIES})")
+                    self.logger.warning("This is a known DeepSeek JSON mode issue - retrying with slight delay")
+                    await asyncio.sleep(EMPTY_RETRY_DELAY)
+                    continue
+                self.logger.error(f"Empty content in API response for {label} after {attempt + 1} attempts")
+                self.logger.error("Known DeepSeek issue: JSON mode may occasionally return empty content")
+                self.logger.debug(f"Message structure: {message}")
+                return None
+            
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError as e:
+                self.logger.error(f"Failed to parse nested JSON content for {label}: {e}")
+                self.logger.error(f"Raw content: {repr(content)}")
+                return None
+            if not isinstance(data, dict):
+                self.logger.error(f"Nested JSON content is not an object for {label}: {type(data)}")
+                return None
+            return data
@@ -4,10 +4,10 @@ import json
 import logging
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from .models import ChunkResult, DocumentResult, Rule, Candidate
-from .utils import save_json_file, merge_conditions
+from .utils import load_json_file, save_json_file, merge_conditions
 
 
 def load_chunk_results(input_dir: str, logger: logging.Logger) -> Dict[str, List[ChunkResult]]:
@@ -193,7 +193,8 @@ def merge_chunk_results(
     input_dir: str,
     output_dir: str,
     force: bool,
-    logger: logging.Logger
+    logger: logging.Logger,
+    aliases_file: Optional[str] = None
 ) -> None:
     """Merge all chunk results into document-level results."""
     logger.info(f"Starting merge process: {input_dir} -> {output_dir}")
@@ -201,6 +202,12 @@ def merge_chunk_results(
     # Load chunk results
     results_by_doc = load_chunk_results(input_dir, logger)
     
+    # Documents whose PDF was byte-identical to a packed one share its result
+    doc_aliases: Dict[str, List[str]] = {}
+    if aliases_file and Path(aliases_file).exists():
+        doc_aliases = load_json_file(aliases_file)
+        logger.info(f"Loaded aliases for {len(doc_aliases)} deduplicated documents")
+    
     if not results_by_doc:
         logger.warning("No chunk results found to merge")
         return
@@ -231,13 +238,20 @@ def merge_chunk_results(
             
             logger.info(f"Merged document {doc_id}: {len(doc_result.rules_merged)} rules")
             
+            for alias in doc_aliases.get(doc_id, []):
+                save_json_file({**doc_result.to_dict(), "doc_id": alias}, str(output_path / f"{alias}.json"))
+                successful_docs += 1
+                logger.info(f"Copied result of {doc_id} to identical document {alias}")
+            
         except Exception as e:
             logger.error(f"Failed to merge document {doc_id}: {e}")
             failed_docs += 1
     
     # Save merge summary
     summary = {
-        "total_documents": len(results_by_doc),
+        "total_documents": len(results_by_doc) + sum(
+            len(doc_aliases.get(doc_id, [])) for doc_id in results_by_doc
+        ),
         "successful_documents": successful_docs,
         "failed_documents": failed_docs,
         "output_directory": str(output_path)
@@ -204,18 +204,27 @@ class TextChunk:
     doc_id: str
     chunk_id: str
     text: str
+    # Character offsets of the chunk in the document's extracted text
+    start: Optional[int] = None
+    end: Optional[int] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        data = {
             "doc_id": self.doc_id,
             "chunk_id": self.chunk_id,
             "text": self.text
         }
+        if self.start is not None:
+            data["start"] = self.start
+            data["end"] = self.end
+        return data
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "TextChunk":
         return cls(
             doc_id=data["doc_id"],
             chunk_id=data["chunk_id"],
-            text=data["text"]
+            text=data["text"],
+            start=data.get("start"),
+            end=data.get("end")
         )
\ No newline at end of file
@@ -2,20 +2,55 @@
 
 import json
 import logging
+import os
 import subprocess
+import time
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterator, List, Optional
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Tuple
 
+import pdfminer
 import pypdf
 from pdfminer.high_level import extract_text as pdfminer_extract
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
-from pdfminer.converter import TextConverter
-from pdfminer.layout import LAParams
+from pdfminer.converter import PDFPageAggregator, TextConverter
+from pdfminer.layout import LAParams, LTContainer, LTText, LTTextBox, LTTextContainer
 from io import StringIO
 
+try:
+    import pymupdf  # optional fast backend for --extract-mode routed
+except ImportError:
+    pymupdf = None
+
 from .models import TextChunk
-from .utils import extract_doc_id_from_filename, chunk_text_smart, save_json_file
+from .textcache import get_text_cache, pages_from_form_feeds
+from .tokens import REQUEST_OVERHEAD_TOKENS, count_tokens, tokenizer_name
+from .utils import (
+    extract_doc_id_from_filename, chunk_spans, load_json_file, save_json_file, sha256_file
+)
+from .workers import (
+    DEFAULT_MAX_RSS_MB, DEFAULT_MAX_TASKS_PER_CHILD, OK, QUARANTINE_FILENAME, QUARANTINE_STATUSES, Quarantine,
+    SupervisedPool
+)
+
+# Written by linkDownloadScript/download_pdfs.py --layout cas
+STORE_INDEX_FILENAME = "index.json"
+# Maps each packed doc ID to the IDs of byte-identical PDFs it stands in for
+DOC_ALIASES_FILENAME = "doc_aliases.json"
+# Seconds a pack worker may spend on one PDF
+DEFAULT_PDF_TIMEOUT = 120
+# "fallback": pdfminer first; "routed": fastest backend first, pdfminer only when its score is low
+EXTRACT_MODES = ("fallback", "routed")
+# Routed extractions scoring below this (0-100, see score_extracted_text) escalate to pdfminer
+MIN_ROUTED_QUALITY = 60.0
+# Per-document backend choice and scores written by pack
+EXTRACTION_REPORT_FILENAME = "extraction_report.json"
+# Backends whose full text ends every page with a form feed; the others join pages with a newline
+FORM_FEED_BACKENDS = ("pdfminer", "pdftotext")
+# Journal of the documents a pack has written to chunks.jsonl; lets an interrupted pack resume
+PACK_PROGRESS_FILENAME = "pack_progress.jsonl"
 
 
 def extract_text_pdfminer(pdf_path: str) -> Optional[str]:
@@ -29,19 +64,25 @@ def extract_text_pdfminer(pdf_path: str) -> Optional[str]:
 
 def extract_text_pypdf(pdf_path: str) -> Optional[str]:
     """Extract text using pypdf."""
+    pages = extract_pages_pypdf(pdf_path)
+    return '\n'.join(page["text"] for page in pages) if pages else None
+
+
+def extract_pages_pypdf(pdf_path: str) -> Optional[List[Dict[str, Any]]]:
+    """Extract per-page text using pypdf, skipping pages that fail."""
     try:
         with open(pdf_path, 'rb') as file:
             reader = pypdf.PdfReader(file)
-            text_parts = []
+            pages = []
             
-            for page in reader.pages:
+            for page_num, page in enumerate(reader.pages, 1):
                 try:
-                    text_parts.append(page.extract_text())
+                    pages.append({"page_num": page_num, "text": page.extract_text()})
                 except Exception as e:
                     logging.getLogger("nsgx").debug(f"pypdf page extraction failed: {e}")
                     continue
             
-            return '\n'.join(text_parts) if text_parts else None
+            return pages
     except Exception as e:
         logging.getLogger("nsgx").debug(f"pypdf extraction failed for {pdf_path}: {e}")
         return None
@@ -67,30 +108,363 @@ def extract_text_pdftotext(pdf_path: str) -> Optional[str]:
         return None
 
 
-def extract_text_from_pdf(pdf_path: str) -> Optional[str]:
-    """Extract text from PDF using fallback chain."""
+def _pymupdf_page(page: Any) -> Dict[str, Any]:
+    # Same page shape as xmlFiller's PDFExtractor, which shares the cached PyMuPDF entries
+    return {"page_num": page.number + 1, "text": page.get_text(),
+            "width": page.rect.width, "height": page.rect.height}
+
+
+def _pymupdf_metadata(doc: Any) -> Dict[str, Any]:
+    """Document metadata in the shape xmlFiller's PDFExtractor stores with its PyMuPDF text."""
+    info = doc.metadata or {}
+    metadata: Dict[str, Any] = {"page_count": len(doc)}
+    for key in ("title", "author", "subject", "keywords", "creator", "producer"):
+        metadata[key] = info.get(key, '')
+    return metadata
+
+
+def extract_pages_pymupdf(pdf_path: str) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Extract per-page text and document metadata using PyMuPDF, if it is installed."""
+    if pymupdf is None:
+        return None
+    try:
+        with pymupdf.open(pdf_path) as doc:
+            return [_pymupdf_page(page) for page in doc], _pymupdf_metadata(doc)
+    except Exception as e:
+        logging.getLogger("nsgx").debug(f"PyMuPDF extraction failed for {pdf_path}: {e}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def pdftotext_version() -> Optional[str]:
+    """Version line of the installed pdftotext, or None if it is missing."""
+    try:
+        result = subprocess.run(['pdftotext', '-v'], capture_output=True, text=True, timeout=10)
+    except (subprocess.TimeoutExpired, FileNotFoundError, subprocess.SubprocessError):
+        return None
+    output = (result.stderr or result.stdout).strip()
+    return output.splitlines()[0] if output else None
+
+
+def _pages_pdfminer(pdf_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    text = extract_text_pdfminer(pdf_path)
+    return (text, pages_from_form_feeds(text)) if text is not None else None
+
+
+def _pages_pypdf(pdf_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    pages = extract_pages_pypdf(pdf_path)
+    return ('\n'.join(page["text"] for page in pages), pages) if pages is not None else None
+
+
+def _pages_pdftotext(pdf_path: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    text = extract_text_pdftotext(pdf_path)
+    return (text, pages_from_form_feeds(text)) if text is not None else None
+
+
+def _pages_pymupdf(pdf_path: str) -> Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+    extracted = extract_pages_pymupdf(pdf_path)
+    if extracted is None:
+        return None
+    pages, metadata = extracted
+    return '\n'.join(page["text"] for page in pages), pages, metadata
+
+
+def _render_layout_text(item: Any, out: List[str]) -> None:
+    """Append the text of a pdfminer layout item to out, the way pdfminer's extract_text writes it."""
+    if isinstance(item, LTTextContainer):
+        # Same as recursing down to the characters, in one string per line or box
+        out.append(item.get_text())
+    elif isinstance(item, LTContainer):
+        for child in item:
+            _render_layout_text(child, out)
+    elif isinstance(item, LTText):
+        out.append(item.get_text())
+    if isinstance(item, LTTextBox):
+        out.append('\n')
+
+
+def _iter_pages_pdfminer(pdf_path: str, page_numbers: Optional[Collection[int]] = None,
+                         laparams: Optional[LAParams] = None) -> Iterator[Dict[str, Any]]:
+    with open(pdf_path, 'rb') as file:
+        rsrcmgr = PDFResourceManager()
+        device = PDFPageAggregator(rsrcmgr, laparams=laparams or LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page_num, page in enumerate(PDFPage.get_pages(file), 1):
+            if page_numbers is not None and page_num not in page_numbers:
+                # Skipped pages are never interpreted, so cost no layout analysis
+                continue
+            interpreter.process_page(page)
+            out: List[str] = []
+            _render_layout_text(device.get_result(), out)
+            # Unlike pdfminer's extract_pages, drop the layout before parsing the next page
+            device.result = None
+            yield {"page_num": page_num, "text": ''.join(out)}
+
+
+def _iter_pages_pypdf(pdf_path: str, page_numbers: Optional[Collection[int]] = None) -> Iterator[Dict[str, Any]]:
+    with open(pdf_path, 'rb') as file:
+        for page_num, page in enumerate(pypdf.PdfReader(file).pages, 1):
+            if page_numbers is None or page_num in page_numbers:
+                yield {"page_num": page_num, "text": page.extract_text()}
+
+
+def _iter_pages_pymupdf(pdf_path: str, page_numbers: Optional[Collection[int]] = None,
+                        metadata: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    if pymupdf is None:
+        raise RuntimeError("PyMuPDF is not installed")
+    with pymupdf.open(pdf_path) as doc:
+        if metadata is not None:
+            metadata.update(_pymupdf_metadata(doc))
+        for page in doc:
+            if page_numbers is None or page.number + 1 in page_numbers:
+                yield _pymupdf_page(page)
+
+
+def _iter_pages_pdftotext(pdf_path: str, page_numbers: Optional[Collection[int]] = None) -> Iterator[Dict[str, Any]]:
+    # pdftotext prints the whole document at once; only the splitting is lazy
+    text = extract_text_pdftotext(pdf_path)
+    if text is None:
+        raise RuntimeError("pdftotext failed")
+    for page in pages_from_form_feeds(text):
+        if page_numbers is None or page["page_num"] in page_numbers:
+            yield page
+
+
+PAGE_ITERATORS: Dict[str, Callable[..., Iterator[Dict[str, Any]]]] = {
+    "pdfminer": _iter_pages_pdfminer,
+    "pypdf": _iter_pages_pypdf,
+    "pymupdf": _iter_pages_pymupdf,
+    "pdftotext": _iter_pages_pdftotext,
+}
+
+
+def join_pages(backend: str, pages: List[Dict[str, Any]]) -> str:
+    """Rebuild the full text a backend produces from its pages."""
+    if backend in FORM_FEED_BACKENDS:
+        return ''.join(page["text"] + '\f' for page in pages)
+    return '\n'.join(page["text"] for page in pages)
+
+
+def extract_with_text_cache(
+    pdf_path: str,
+    backend: str,
+    backend_version: Optional[str],
+    extract: Callable[[str], Optional[Tuple[Any, ...]]],
+    content_hash: Optional[str] = None
+) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Run one extraction backend through the persistent text cache; returns (text, pages).
+    
+    extract returns (text, pages), or (text, pages, metadata) for backends
+    whose entries xmlFiller also reads (PyMuPDF), or None on failure.
+    """
+    cache = get_text_cache() if backend_version else None
+    if cache is None:
+        return extract(pdf_path)
+    
+    content_hash = content_hash or sha256_file(pdf_path)
+    cached = cache.get(content_hash, backend, backend_version)
+    if cached is not None:
+        logging.getLogger("nsgx").debug(f"Text cache hit for {pdf_path} ({backend})")
+        return cached[0], cached[1]
+    
+    extracted = extract(pdf_path)
+    if extracted is None:
+        # Backend errors may be transient; only real output (even empty) is cached
+        return None
+    text, pages, *metadata = extracted
+    cache.put(content_hash, backend, backend_version, text, pages, metadata[0] if metadata else None)
+    return text, pages
+
+
+def score_extracted_text(text: str, pages: List[Dict[str, Any]]) -> float:
+    """
+    Score extracted text from 0 to 100, along the lines of xmlFiller's check_extraction_quality.
+    
+    Penalizes little text per page (scans), empty pages, undecodable glyphs
+    (U+FFFD, pdfminer's "(cid:N)"), letter-spaced words ("v e r b o t e n")
+    and words run together by a backend that dropped the spaces.
+    """
+    total_chars = len(text.strip())
+    words = text.split()
+    if not total_chars or not words:
+        return 0.0
+    
+    page_count = max(1, len(pages))
+    score = 100.0 * min(1.0, total_chars / page_count / 500)
+    
+    empty_pages = sum(1 for page in pages if len(page["text"].strip()) < 10)
+    score -= 40 * empty_pages / page_count
+    
+    garbage = text.count('\ufffd') + text.count('(cid:')
+    score -= min(60.0, 2000 * garbage / total_chars)
+    
+    single_letters = sum(1 for word in words if len(word) == 1 and word.isalpha()) / len(words)
+    score -= min(60.0, max(0.0, single_letters - 0.05) * 400)
+    
+    run_together = sum(1 for word in words if len(word) > 25) / len(words)
+    score -= min(60.0, max(0.0, run_together - 0.03) * 400)
+    
+    return round(max(0.0, score), 1)
+
+
+def _fallback_backends() -> List[Tuple[str, Optional[str], Callable]]:
+    """The original chain: pdfminer, then pypdf, then pdftotext."""
+    return [
+        ("pdfminer", pdfminer.__version__, _pages_pdfminer),
+        ("pypdf", pypdf.__version__, _pages_pypdf),
+        ("pdftotext", pdftotext_version(), _pages_pdftotext),
+    ]
+
+
+def _routed_backends() -> List[Tuple[str, Optional[str], Callable]]:
+    """Fastest available backend, then pdfminer, then the remaining fast backends."""
+    fast = []
+    if pymupdf is not None:
+        fast.append(("pymupdf", pymupdf.VersionBind, _pages_pymupdf))
+    if pdftotext_version():
+        fast.append(("pdftotext", pdftotext_version(), _pages_pdftotext))
+    fast.append(("pypdf", pypdf.__version__, _pages_pypdf))
+    return fast[:1] + [("pdfminer", pdfminer.__version__, _pages_pdfminer)] + fast[1:]
+
+
+def extract_document_text(pdf_path: str, extract_mode: str = "fallback",
+                          content_hash: Optional[str] = None) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Extract text from a PDF and report which backend produced it.
+    
+    In "fallback" mode the first backend with any text wins. In "routed" mode
+    backends are tried fastest first and the next one only runs while the best
+    score so far is below MIN_ROUTED_QUALITY, so pdfminer is reserved for
+    documents the fast backends handle badly. Returns the stripped text (None
+    if every backend failed) and a record with the chosen backend, its score
+    and every attempt made. content_hash, if known, saves hashing the file
+    for the text cache.
+    """
     logger = logging.getLogger("nsgx")
+    if extract_mode not in EXTRACT_MODES:
+        raise ValueError(f"Unknown extract mode: {extract_mode}")
     
-    # Try pdfminer first
-    text = extract_text_pdfminer(pdf_path)
-    if text and text.strip():
-        logger.debug(f"Successfully extracted text using pdfminer for {pdf_path}")
-        return text.strip()
+    if get_text_cache() and not content_hash:
+        content_hash = sha256_file(pdf_path)
+    backends = _routed_backends() if extract_mode == "routed" else _fallback_backends()
+    record: Dict[str, Any] = {"mode": extract_mode, "backend": None, "score": None, "attempts": []}
+    best_text = None
     
-    # Try pypdf
-    text = extract_text_pypdf(pdf_path)
-    if text and text.strip():
-        logger.debug(f"Successfully extracted text using pypdf for {pdf_path}")
-        return text.strip()
+    for backend, backend_version, extract in backends:
+        started = time.perf_counter()
+        extracted = extract_with_text_cache(pdf_path, backend, backend_version, extract, content_hash)
+        score = score_extracted_text(*extracted) if extracted else None
+        record["attempts"].append({
+            "backend": backend,
+            "score": score,
+            "seconds": round(time.perf_counter() - started, 3)
+        })
+        
+        text = extracted[0].strip() if extracted else ""
+        if text and (best_text is None or (extract_mode == "routed" and score > record["score"])):
+            best_text = text
+            record["backend"] = backend
+            record["score"] = score
+        
+        if best_text is not None and (extract_mode == "fallback" or record["score"] >= MIN_ROUTED_QUALITY):
+            break
+        if best_text is not None:
+            logger.debug(f"Best score for {pdf_path} is {record['score']} ({record['backend']}); escalating")
     
-    # Try pdftotext as fallback
-    text = extract_text_pdftotext(pdf_path)
-    if text and text.strip():
-        logger.debug(f"Successfully extracted text using pdftotext for {pdf_path}")
-        return text.strip()
+    if best_text is None:
+        logger.warning(f"Failed to extract text from {pdf_path} using all methods")
+    else:
+        logger.debug(f"Successfully extracted text using {record['backend']} for {pdf_path} (score {record['score']})")
+    return best_text, record
+
+
+def extract_text_from_pdf(pdf_path: str, extract_mode: str = "fallback") -> Optional[str]:
+    """Extract text from PDF using fallback chain (or quality-scored routing, see extract_document_text)."""
+    return extract_document_text(pdf_path, extract_mode)[0]
+
+
+def scan_page_texts(pdf_path: str, content_hash: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """Cheap per-page text (PyMuPDF, else pypdf) for locating content before a full extraction."""
+    scanners = [("pypdf", pypdf.__version__, _pages_pypdf)]
+    if pymupdf is not None:
+        scanners.insert(0, ("pymupdf", pymupdf.VersionBind, _pages_pymupdf))
+    for backend, backend_version, extract in scanners:
+        extracted = extract_with_text_cache(pdf_path, backend, backend_version, extract, content_hash)
+        if extracted is not None:
+            return extracted[1]
+    return None
+
+
+def iter_pdf_pages(pdf_path: str, extract_mode: str = "fallback", page_numbers: Optional[Collection[int]] = None,
+                   content_hash: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield {"page_num", "text", "backend"} for each page as soon as it is extracted.
+    
+    Backends are tried in the order extract_document_text uses for the mode,
+    but without quality scoring, which needs the whole document: the first
+    backend that yields any text is used. Blank pages are held back until a
+    page with text follows, so a backend that finds nothing is skipped
+    cleanly; if a backend fails mid-document, the next one continues at the
+    page where it stopped. Only the current page's layout is held in memory;
+    with the text cache enabled a miss also keeps the page texts so they can
+    be stored once the last page is parsed. With page_numbers (1-based) only
+    those pages are extracted; such partial runs are served from the cache
+    but never stored in it. content_hash, if known, saves hashing the file.
+    """
+    logger = logging.getLogger("nsgx")
+    cache = get_text_cache()
+    if cache and not content_hash:
+        content_hash = sha256_file(pdf_path)
+    backends = _routed_backends() if extract_mode == "routed" else _fallback_backends()
+    next_page = 1
+    
+    for backend, backend_version, _ in backends:
+        use_cache = cache is not None and backend_version is not None
+        cached = cache.get(content_hash, backend, backend_version) if use_cache else None
+        metadata: Dict[str, Any] = {}
+        if cached is not None:
+            pages = (page for page in cached[1] if page_numbers is None or page["page_num"] in page_numbers)
+        elif backend == "pymupdf":
+            # Its cache entries are shared with xmlFiller, which also reads the metadata
+            pages = _iter_pages_pymupdf(pdf_path, page_numbers, metadata)
+        else:
+            pages = PAGE_ITERATORS[backend](pdf_path, page_numbers)
+        # Only a complete, uninterrupted run is worth caching
+        complete_run = cached is None and next_page == 1 and page_numbers is None
+        collected: Optional[List[Dict[str, Any]]] = [] if use_cache and complete_run else None
+        blank: List[Dict[str, Any]] = []
+        
+        try:
+            for page in pages:
+                if collected is not None:
+                    collected.append(dict(page))
+                if page["page_num"] < next_page:
+                    continue
+                page = {"page_num": page["page_num"], "text": page["text"], "backend": backend}
+                if not page["text"].strip():
+                    blank.append(page)
+                    continue
+                yield from blank
+                blank = []
+                yield page
+                next_page = page["page_num"] + 1
+        except Exception as e:
+            if next_page > 1:
+                logger.warning(f"{backend} failed after page {next_page - 1} of {pdf_path}: {e}")
+            else:
+                logger.debug(f"{backend} page extraction failed for {pdf_path}: {e}")
+            continue
+        
+        if collected is not None:
+            cache.put(content_hash, backend, backend_version, join_pages(backend, collected), collected,
+                      metadata)
+        if next_page > 1:
+            # Trailing blank pages, e.g. scanned maps after the signature
+            yield from blank
+            return
     
     logger.warning(f"Failed to extract text from {pdf_path} using all methods")
-    return None
 
 
 def find_pdf_files(directory: str) -> Iterator[Path]:
@@ -108,53 +482,237 @@ def find_pdf_files(directory: str) -> Iterator[Path]:
             yield pdf_file
 
 
-def process_pdf_to_chunks(pdf_path: Path, max_chars: int, logger: logging.Logger) -> List[TextChunk]:
-    """Process a single PDF file into text chunks."""
+def find_pdf_documents(directory: str) -> List[Tuple[Path, str, List[str]]]:
+    """
+    Find PDFs and group the document IDs that share byte-identical content.
+    
+    A content-addressed download store (index.json plus blobs/) is read through
+    its index; any other directory is searched recursively and hashed. Returns
+    one (pdf_path, sha256, doc_ids) triple per distinct PDF, ordered by first
+    doc ID; callers pass the hash on instead of reading the file again.
+    """
+    index_file = Path(directory) / STORE_INDEX_FILENAME
+    doc_ids_by_hash: Dict[str, List[str]] = defaultdict(list)
+    path_by_hash: Dict[str, Path] = {}
+    
+    if index_file.is_file():
+        for entry in load_json_file(str(index_file)).get("documents", {}).values():
+            doc_ids_by_hash[entry["sha256"]].append(entry["doc_id"])
+            path_by_hash[entry["sha256"]] = Path(directory) / entry["blob"]
+    else:
+        for pdf_file in sorted(find_pdf_files(directory)):
+            content_hash = sha256_file(str(pdf_file))
+            doc_ids_by_hash[content_hash].append(extract_doc_id_from_filename(pdf_file.name))
+            path_by_hash.setdefault(content_hash, pdf_file)
+    
+    documents = [
+        (path_by_hash[content_hash], content_hash, sorted(set(doc_ids)))
+        for content_hash, doc_ids in doc_ids_by_hash.items()
+    ]
+    documents.sort(key=lambda item: item[2][0])
+    return documents
+
+
+def chunk_token_budget(token_budget: int) -> int:
+    """Tokens left for chunk text in a run request of token_budget input tokens."""
+    from .run import load_system_prompt
+    
+    max_tokens = token_budget - count_tokens(load_system_prompt()) - REQUEST_OVERHEAD_TOKENS
+    if max_tokens <= 0:
+        raise ValueError(f"Token budget {token_budget} does not cover the system prompt")
+    return max_tokens
+
+
+def process_pdf_to_chunks(pdf_path: Path, max_chars: int, logger: logging.Logger,
+                          doc_id: Optional[str] = None, extract_mode: str = "fallback",
+                          extraction: Optional[Dict[str, Any]] = None, max_tokens: int = 0,
+                          content_hash: Optional[str] = None) -> List[TextChunk]:
+    """Process a single PDF file into text chunks, filling extraction with the backend record if given."""
     logger.info(f"Processing PDF: {pdf_path}")
     
     # Extract document ID from filename
-    doc_id = extract_doc_id_from_filename(pdf_path.name)
+    if doc_id is None:
+        doc_id = extract_doc_id_from_filename(pdf_path.name)
     
     # Extract text
-    text = extract_text_from_pdf(str(pdf_path))
+    text, record = extract_document_text(str(pdf_path), extract_mode, content_hash)
+    if extraction is not None:
+        extraction.update(record)
     if not text:
         logger.error(f"Failed to extract text from {pdf_path}")
         return []
     
     logger.debug(f"Extracted {len(text)} characters from {pdf_path}")
     
-    # Chunk the text
-    text_chunks = chunk_text_smart(text, max_chars)
-    logger.debug(f"Created {len(text_chunks)} chunks for {pdf_path}")
+    chunks = chunk_document_text(text, doc_id, max_chars, max_tokens)
+    logger.debug(f"Created {len(chunks)} chunks for {pdf_path}")
     
-    # Create TextChunk objects
+    return chunks
+
+
+def chunk_document_text(text: str, doc_id: str, max_chars: int, max_tokens: int = 0) -> List[TextChunk]:
+    """Split a document's extracted text into numbered TextChunk objects, by characters or by tokens."""
     chunks = []
-    for i, chunk_text in enumerate(text_chunks):
+    for i, (start, end) in enumerate(chunk_spans(text, max_chars, max_tokens)):
         chunk_id = f"chunk_{i:03d}"
         chunk = TextChunk(
             doc_id=doc_id,
             chunk_id=chunk_id,
-            text=chunk_text
+            text=text[start:end],
+            start=start,
+            end=end
         )
         chunks.append(chunk)
     
     return chunks
 
 
+def _pack_worker(pdf_path: str, max_chars: int, doc_id: str, extract_mode: str,
+                 max_tokens: int, content_hash: str) -> Tuple[List[TextChunk], Dict[str, Any]]:
+    """Extract and chunk one PDF in a supervised worker process."""
+    extraction: Dict[str, Any] = {}
+    chunks = process_pdf_to_chunks(Path(pdf_path), max_chars, logging.getLogger("nsgx"), doc_id=doc_id,
+                                   extract_mode=extract_mode, extraction=extraction, max_tokens=max_tokens,
+                                   content_hash=content_hash)
+    return chunks, extraction
+
+
+def pack_documents_parallel(
+    documents: List[Tuple[Path, str, List[str]]],
+    max_chars: int,
+    workers: int,
+    timeout: float,
+    logger: logging.Logger,
+    extract_mode: str = "fallback",
+    max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+    max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    quarantine: Optional[Quarantine] = None,
+    max_tokens: int = 0,
+    skip: Collection[int] = ()
+) -> Iterator[Tuple[int, Optional[Tuple[List[TextChunk], Dict[str, Any]]]]]:
+    """
+    Chunk documents in supervised worker processes (see workers.SupervisedPool).
+    
+    A PDF that exceeds timeout seconds or max_rss_mb, or crashes its worker,
+    has its worker killed and replaced; only that PDF fails, and it is added
+    to the quarantine. PDFs already in the quarantine are skipped, as are the
+    indices in skip. Yields (index into documents, (chunks, extraction
+    record)) in document order as soon as each document and all before it
+    are done, with None for PDFs that failed or were quarantined; only
+    results that finished ahead of a slower document are held back.
+    """
+    pending: Dict[int, Optional[Tuple[List[TextChunk], Dict[str, Any]]]] = {}
+    order = [index for index in range(len(documents)) if index not in skip]
+    
+    def tasks() -> Iterator[Tuple[int, Tuple]]:
+        for index in order:
+            pdf_file, content_hash, doc_ids = documents[index]
+            reason = quarantine.reason_for(pdf_file, content_hash) if quarantine is not None else None
+            if reason:
+                logger.warning(f"Skipping quarantined {pdf_file} ({reason})")
+                pending[index] = None
+                continue
+            yield index, (str(pdf_file), max_chars, doc_ids[0], extract_mode, max_tokens, content_hash)
+    
+    next_position = 0
+    with SupervisedPool(_pack_worker, workers, timeout, max_rss_mb, max_tasks_per_child) as pool:
+        for index, status, value in pool.imap_unordered(tasks()):
+            pdf_file, content_hash, _ = documents[index]
+            if status == OK:
+                pending[index] = value
+            else:
+                logger.error(f"Failed to process {pdf_file}: {value}")
+                pending[index] = None
+                if status in QUARANTINE_STATUSES and quarantine is not None:
+                    quarantine.add(pdf_file, status, value, content_hash)
+            while next_position < len(order) and order[next_position] in pending:
+                yield order[next_position], pending.pop(order[next_position])
+                next_position += 1
+    
+    # Quarantined documents after the last extracted one
+    while next_position < len(order):
+        yield order[next_position], pending.pop(order[next_position], None)
+        next_position += 1
+
+
+def _fsync(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def load_pack_progress(progress_file: Path, settings: Dict[str, Any],
+                       logger: logging.Logger) -> Optional[List[Dict[str, Any]]]:
+    """
+    Records of the documents an interrupted pack finished, from its progress journal.
+    
+    Returns None when there is no journal or it was written with other
+    settings, so the pack has to start over. A record cut short by a crash
+    ends the list.
+    """
+    if not progress_file.is_file():
+        return None
+    records = []
+    with open(progress_file, 'r', encoding='utf-8') as f:
+        header = f.readline()
+        try:
+            if json.loads(header).get("settings") != settings:
+                logger.warning(f"{progress_file} was written with other settings; starting over")
+                return None
+        except json.JSONDecodeError:
+            return None
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
 def pack_pdfs_to_chunks(
     pdf_directory: str,
     max_chars: int,
     output_dir: str,
-    logger: logging.Logger
+    logger: logging.Logger,
+    workers: int = 1,
+    timeout: float = DEFAULT_PDF_TIMEOUT,
+    extract_mode: str = "fallback",
+    max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+    max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    quarantine_file: Optional[str] = None,
+    token_budget: int = 0,
+    resume: bool = True
 ) -> None:
-    """Pack all PDFs in directory to chunks JSONL file."""
+    """
+    Pack all PDFs in directory to chunks JSONL file.
+    
+    With token_budget, chunks are sized by tokens so that a run request,
+    system prompt included, stays within token_budget input tokens;
+    max_chars is then ignored.
+    
+    The PDFs are extracted in supervised worker processes (see
+    pack_documents_parallel); chunks.jsonl is written in document order
+    regardless of which PDF finishes first. PDFs that hang, exhaust memory or
+    crash are listed in quarantine_file (default: quarantine.json in
+    output_dir) and skipped by later runs. The backend and quality score
+    behind each document go to extraction_report.json.
+    
+    Each document's chunks are appended to chunks.jsonl as soon as it and
+    the documents before it are done, so memory does not grow with the
+    corpus. After every document, chunks.jsonl is fsynced and a record of
+    the document and the file's length is appended to pack_progress.jsonl
+    and fsynced too. If the pack is interrupted, the next run with the same
+    settings (and resume) truncates chunks.jsonl to the last recorded length
+    and continues with the remaining documents. The journal is removed once
+    the pack completes.
+    """
     logger.info(f"Starting PDF packing from {pdf_directory}")
     
-    # Find all PDF files
-    pdf_files = list(find_pdf_files(pdf_directory))
-    logger.info(f"Found {len(pdf_files)} PDF files")
+    # Find all PDF files, collapsing byte-identical duplicates
+    documents = find_pdf_documents(pdf_directory)
+    duplicate_count = sum(len(doc_ids) - 1 for _, _, doc_ids in documents)
+    logger.info(f"Found {len(documents)} distinct PDF files ({duplicate_count} duplicates)")
     
-    if not pdf_files:
+    if not documents:
         logger.warning(f"No PDF files found in {pdf_directory}")
         return
     
@@ -162,54 +720,130 @@ def pack_pdfs_to_chunks(
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # Process each PDF
-    all_chunks = []
+    max_tokens = chunk_token_budget(token_budget) if token_budget else 0
+    if max_tokens:
+        logger.info(f"Chunking to {max_tokens} tokens ({tokenizer_name()} counts), "
+                    f"{token_budget} per request with the system prompt")
+    
+    chunks_file = output_path / "chunks.jsonl"
+    progress_file = output_path / PACK_PROGRESS_FILENAME
+    settings = {
+        "pdf_directory": str(Path(pdf_directory).resolve()),
+        "max_chars": max_chars,
+        "max_tokens": max_tokens,
+        "extract_mode": extract_mode,
+    }
+    done = load_pack_progress(progress_file, settings, logger) if resume else None
+    if done and (not chunks_file.is_file() or chunks_file.stat().st_size < done[-1]["chunks_bytes"]):
+        logger.warning(f"{chunks_file} is missing or shorter than {progress_file} records; starting over")
+        done = None
+    
+    doc_aliases = {}
+    extraction_report = {}
     successful_files = 0
     failed_files = 0
+    total_chunks = 0
+    chunks_bytes = 0
+    done_doc_ids = set()
+    for record in done or []:
+        done_doc_ids.add(record["doc_id"])
+        extraction_report[record["doc_id"]] = record["extraction"]
+        if record["chunks"]:
+            successful_files += 1
+            total_chunks += record["chunks"]
+        else:
+            failed_files += 1
+        chunks_bytes = record["chunks_bytes"]
     
-    for pdf_file in pdf_files:
-        try:
-            chunks = process_pdf_to_chunks(pdf_file, max_chars, logger)
+    skip = {index for index, (_, _, doc_ids) in enumerate(documents) if doc_ids[0] in done_doc_ids}
+    if done is not None:
+        logger.info(f"Resuming interrupted pack: {len(skip)} of {len(documents)} documents already done")
+    
+    quarantine = Quarantine(quarantine_file or str(output_path / QUARANTINE_FILENAME))
+    quarantined_before = len(quarantine)
+    logger.info(
+        f"Extracting with {workers} worker processes (timeout {timeout}s, {max_rss_mb} MB per PDF, "
+        f"{len(quarantine)} PDFs quarantined)"
+    )
+    
+    with open(chunks_file, 'r+b' if done is not None and chunks_file.is_file() else 'wb') as chunks_out, \
+            open(progress_file, 'a' if done is not None else 'w', encoding='utf-8') as progress:
+        # Drop chunks written after the last recorded document
+        chunks_out.truncate(chunks_bytes)
+        chunks_out.seek(chunks_bytes)
+        if done is None:
+            progress.write(json.dumps({"settings": settings}) + '\n')
+            _fsync(progress)
+        
+        for index, result in pack_documents_parallel(documents, max_chars, workers, timeout, logger, extract_mode,
+                                                     max_rss_mb, max_tasks_per_child, quarantine, max_tokens,
+                                                     skip):
+            pdf_file, _, (doc_id, *_) = documents[index]
+            chunks, extraction = result or ([], {})
+            extraction_report[doc_id] = extraction or {"mode": extract_mode, "backend": None, "score": None}
             if chunks:
-                all_chunks.extend(chunks)
+                for chunk in chunks:
+                    chunks_out.write((json.dumps(chunk.to_dict(), ensure_ascii=False) + '\n').encode('utf-8'))
                 successful_files += 1
+                total_chunks += len(chunks)
                 logger.debug(f"Successfully processed {pdf_file}: {len(chunks)} chunks")
             else:
                 failed_files += 1
                 logger.warning(f"No chunks created for {pdf_file}")
-        except Exception as e:
-            failed_files += 1
-            logger.error(f"Failed to process {pdf_file}: {e}")
+            
+            # The chunks must be on disk before the record that covers them
+            _fsync(chunks_out)
+            progress.write(json.dumps({
+                "doc_id": doc_id,
+                "chunks": len(chunks),
+                "chunks_bytes": chunks_out.tell(),
+                "extraction": extraction_report[doc_id],
+            }, ensure_ascii=False) + '\n')
+            _fsync(progress)
     
-    # Write chunks to JSONL file
-    chunks_file = output_path / "chunks.jsonl"
-    logger.info(f"Writing {len(all_chunks)} chunks to {chunks_file}")
+    for _, _, doc_ids in documents:
+        doc_id, *aliases = doc_ids
+        if aliases:
+            # Only the first ID is chunked and sent to the LLM; merge copies its result
+            doc_aliases[doc_id] = aliases
+            logger.info(f"{doc_id} has identical content to {', '.join(aliases)}")
     
-    try:
-        with open(chunks_file, 'w', encoding='utf-8') as f:
-            for chunk in all_chunks:
-                json.dump(chunk.to_dict(), f, ensure_ascii=False)
-                f.write('\n')
-        
-        logger.info(
-            f"Pack completed successfully: {successful_files} files processed, "
-            f"{failed_files} files failed, {len(all_chunks)} total chunks"
-        )
-        
-        # Write summary
-        summary = {
-            "total_files": len(pdf_files),
-            "successful_files": successful_files,
-            "failed_files": failed_files,
-            "total_chunks": len(all_chunks),
-            "max_chars_per_chunk": max_chars,
-            "output_file": str(chunks_file)
-        }
-        
-        summary_file = output_path / "pack_summary.json"
-        save_json_file(summary, str(summary_file))
-        logger.info(f"Pack summary saved to {summary_file}")
-        
-    except Exception as e:
-        logger.error(f"Failed to write chunks file: {e}")
-        raise
\ No newline at end of file
+    logger.info(
+        f"Pack completed successfully: {successful_files} files processed, "
+        f"{failed_files} files failed, {total_chunks} total chunks"
+    )
+    
+    aliases_file = output_path / DOC_ALIASES_FILENAME
+    save_json_file(doc_aliases, str(aliases_file))
+    
+    report_file = output_path / EXTRACTION_REPORT_FILENAME
+    save_json_file(extraction_report, str(report_file))
+    backend_counts: Dict[str, int] = defaultdict(int)
+    for extraction in extraction_report.values():
+        backend_counts[extraction.get("backend") or "failed"] += 1
+    
+    # Write summary
+    summary = {
+        "total_files": len(documents),
+        "duplicate_files": duplicate_count,
+        "successful_files": successful_files,
+        "failed_files": failed_files,
+        "total_chunks": total_chunks,
+        "max_chars_per_chunk": None if max_tokens else max_chars,
+        "token_budget": token_budget or None,
+        "max_tokens_per_chunk": max_tokens or None,
+        "tokenizer": tokenizer_name() if max_tokens else None,
+        "workers": workers,
+        "extract_mode": extract_mode,
+        "backends": dict(sorted(backend_counts.items())),
+        "newly_quarantined": len(quarantine) - quarantined_before,
+        "quarantined_total": len(quarantine),
+        "resumed_files": len(skip),
+        "output_file": str(chunks_file)
+    }
+    
+    summary_file = output_path / "pack_summary.json"
+    save_json_file(summary, str(summary_file))
+    logger.info(f"Pack summary saved to {summary_file}")
+    
+    progress_file.unlink()
@@ -0,0 +1,127 @@
+"""Requests-per-minute and tokens-per-minute pacing of API requests."""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+# Share of the configured budgets actually used, to stay under the provider's count
+BUDGET_HEADROOM = 0.95
+# Seconds of budget that may be spent at once; with a full minute any 60s window could see twice the budget
+BURST_SECONDS = 2
+# Weight of each new response in the average output tokens charged up front
+OUTPUT_SMOOTHING = 0.1
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at per_minute / 60 per second, holding BURST_SECONDS of it.
+    
+    The level may go negative: a charge larger than the bucket, or a
+    correction after the fact, is paid off before the next one.
+    """
+    
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * BURST_SECONDS
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available; more than the capacity only waits for a full bucket."""
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+
+class RateLimiter:
+    """
+    Paces requests to stay under requests-per-minute and tokens-per-minute budgets.
+    
+    Each request is charged its estimated input tokens plus the average
+    output tokens seen so far (max_tokens until the first response). The
+    charge is corrected from the response's usage, so underestimates are
+    paid back by later requests; a request the API rejects gets its tokens
+    back, so a retry is not charged twice. Waiting requests are let through one at a
+    time in arrival order, so they are spread out instead of released
+    together. A budget of 0 is not limited.
+    """
+    
+    def __init__(self, rpm: int, tpm: int, logger: logging.Logger):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.logger = logger
+        self.requests = TokenBucket(rpm * BUDGET_HEADROOM) if rpm else None
+        self.tokens = TokenBucket(tpm * BUDGET_HEADROOM) if tpm else None
+        self.wait_seconds = 0.0
+        self.tokens_charged = 0
+        self.tokens_used = 0
+        self._output_tokens: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+    
+    async def acquire(self, input_tokens: int, max_output_tokens: int) -> int:
+        """Wait until the budgets allow another request; returns the tokens charged for it."""
+        if not self.enabled:
+            return 0
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        output_tokens = max_output_tokens if self._output_tokens is None else self._output_tokens
+        charge = int(input_tokens + output_tokens)
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                if self.requests is not None:
+                    self.requests.refill(now)
+                    wait = self.requests.wait_time(1)
+                if self.tokens is not None:
+                    self.tokens.refill(now)
+                    wait = max(wait, self.tokens.wait_time(charge))
+                if wait <= 0:
+                    break
+                self.wait_seconds += wait
+                await asyncio.sleep(wait)
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= charge
+        self.tokens_charged += charge
+        return charge
+    
+    def settle(self, charged: int, usage: Optional[Dict[str, Any]]) -> None:
+        """Correct a request's charge with the token usage the API reported for it."""
+        if not self.enabled or not usage:
+            return
+        completion_tokens = usage.get('completion_tokens', 0)
+        total_tokens = usage.get('total_tokens') or usage.get('prompt_tokens', 0) + completion_tokens
+        self.tokens_used += total_tokens
+        if self.tokens is not None:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + charged - total_tokens)
+        if self._output_tokens is None:
+            self._output_tokens = completion_tokens
+        else:
+            self._output_tokens += OUTPUT_SMOOTHING * (completion_tokens - self._output_tokens)
+    
+    def refund(self, charged: int) -> None:
+        """Return the token charge of a request the API answered without using tokens (429, 5xx)."""
+        if not charged:
+            return
+        self.tokens_charged -= charged
+        if self.tokens is not None:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + charged)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "wait_seconds": round(self.wait_seconds, 1),
+            "tokens_charged": self.tokens_charged,
+            "tokens_used": self.tokens_used
+        }
@@ -1,25 +1,26 @@
 """DeepSeek API integration for chunk processing."""
 
+import asyncio
 import json
 import logging
 import os
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional
-
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from typing import Dict, List, Optional, Tuple
 
+from .batching import BATCH_MAX_OUTPUT_TOKENS, format_batch, plan_batches, split_batch_response
+from .llm import DeepSeekEngine, TruncatedResponse
 from .models import TextChunk, ChunkResult
 from .utils import load_json_file, save_json_file
 
+# max_tokens of a single-chunk request; also bounds how many chunks a batch holds
+CHUNK_MAX_OUTPUT_TOKENS = 2000
+
 
 class DeepSeekClient:
-    """Client for DeepSeek API with retry logic."""
+    """Client for DeepSeek API with retry logic, running on the async engine in nsgx.llm."""
     
-    def __init__(self, endpoint: str, model: str, api_key: str, logger: logging.Logger):
+    def __init__(self, endpoint: str, model: str, api_key: str, logger: logging.Logger, concurrency: int = 4,
+                 max_concurrency: int = 0, rpm: int = 0, tpm: int = 0):
         self.logger = logger
         
         # Validate configuration
@@ -29,23 +30,8 @@ class DeepSeekClient:
         self.model = model
         self.api_key = api_key
         
-        # Setup session with retry strategy
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            status_forcelist=[429, 500, 502, 503, 504],
-            backoff_factor=1,
-            allowed_methods=["POST"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-        
-        # Default headers
-        self.session.headers.update({
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        })
+        # Requests in flight are capped by the engine's semaphore
+        self.engine = DeepSeekEngine(endpoint, api_key, concurrency, logger, max_concurrency, rpm, tpm)
         
         self.logger.info(f"DeepSeek client initialized with endpoint: {self.endpoint}")
         self.logger.info(f"Using model: {self.model}")
@@ -69,7 +55,7 @@ class DeepSeekClient:
         
         self.logger.debug("API configuration validation passed")
     
-    def test_connectivity(self) -> bool:
+    async def test_connectivity(self) -> bool:
         """Test API connectivity with a minimal request."""
         test_payload = {
             "model": self.model,
@@ -82,66 +68,56 @@ class DeepSeekClient:
             "response_format": {"type": "json_object"}
         }
         
-        try:
-            self.logger.info("Testing API connectivity...")
-            response = self.session.post(
-                self.endpoint,
-                json=test_payload,
-                timeout=30
-            )
-            
-            self.logger.debug(f"Connectivity test status: {response.status_code}")
-            
-            if response.status_code == 401:
-                self.logger.error("API authentication failed - check your API key")
-                return False
-            elif response.status_code == 403:
-                self.logger.error("API access forbidden - check your API permissions")
-                return False
-            elif response.status_code == 404:
-                self.logger.error("API endpoint not found - check your endpoint URL")
-                return False
-            elif response.status_code != 200:
-                self.logger.error(f"API test failed with status {response.status_code}")
-                if response.text:
-                    self.logger.error(f"Response: {response.text}")
-                return False
-            
-            # Test JSON parsing
-            if not response.text:
-                self.logger.error("Empty response from API test")
-                return False
-            
-            try:
-                result = response.json()
-                self.logger.info("API connectivity test successful")
-                self.logger.debug(f"Test response structure: {list(result.keys()) if isinstance(result, dict) else type(result)}")
-                return True
-            except json.JSONDecodeError:
-                self.logger.error("API returned non-JSON response in connectivity test")
-                self.logger.debug(f"Raw response: {response.text[:500]}")
-                return False
-                
-        except requests.exceptions.Timeout:
-            self.logger.error("API connectivity test timed out")
+        self.logger.info("Testing API connectivity...")
+        response = await self.engine.post(test_payload, 30, "connectivity test")
+        if response is None:
+            self.logger.error("Cannot connect to API")
             return False
-        except requests.exceptions.ConnectionError as e:
-            self.logger.error(f"Cannot connect to API: {e}")
+        status, _, text = response
+        
+        self.logger.debug(f"Connectivity test status: {status}")
+        
+        if status == 401:
+            self.logger.error("API authentication failed - check your API key")
             return False
-        except Exception as e:
-            self.logger.error(f"Connectivity test failed: {e}")
+        elif status == 403:
+            self.logger.error("API access forbidden - check your API permissions")
+            return False
+        elif status == 404:
+            self.logger.error("API endpoint not found - check your endpoint URL")
+            return False
+        elif status != 200:
+            self.logger.error(f"API test failed with status {status}")
+            if text:
+                self.logger.error(f"Response: {text}")
+            return False
+        
+        # Test JSON parsing
+        if not text:
+            self.logger.error("Empty response from API test")
+            return False
+        
+        try:
+            result = json.loads(text)
+            self.logger.info("API connectivity test successful")
+            self.logger.debug(f"Test response structure: {list(result.keys()) if isinstance(result, dict) else type(result)}")
+            return True
+        except json.JSONDecodeError:
+            self.logger.error("API returned non-JSON response in connectivity test")
+            self.logger.debug(f"Raw response: {text[:500]}")
             return False
     
-    def extract_from_chunk(self, chunk: TextChunk, system_prompt: str, retry_count: int = 0) -> Optional[ChunkResult]:
+    async def extract_from_chunk(self, chunk: TextChunk, system_prompt: str) -> Optional[ChunkResult]:
         """Extract rules from a text chunk using DeepSeek API."""
-        self.logger.debug(f"Processing chunk {chunk.doc_id}__{chunk.chunk_id}")
+        label = f"{chunk.doc_id}__{chunk.chunk_id}"
+        self.logger.debug(f"Processing chunk {label}")
         
         # Prepare request payload
         # Ensure JSON keyword requirement is met for DeepSeek API
         user_content = chunk.text
         if "json" not in system_prompt.lower() and "json" not in chunk.text.lower():
             user_content = f"Extract information from the following text and return valid JSON: {chunk.text}"
-            self.logger.debug(f"Added JSON keyword to user message for {chunk.doc_id}__{chunk.chunk_id}")
+            self.logger.debug(f"Added JSON keyword to user message for {label}")
         
         payload = {
             "model": self.model,
@@ -150,144 +126,87 @@ class DeepSeekClient:
                 {"role": "user", "content": user_content}
             ],
             "temperature": 0.1,
-            "max_tokens": 2000,
+            "max_tokens": CHUNK_MAX_OUTPUT_TOKENS,
             "response_format": {"type": "json_object"}
         }
         
         try:
-            # Log request details for debugging (mask sensitive data)
-            self.logger.debug(f"Making API request for {chunk.doc_id}__{chunk.chunk_id}")
-            self.logger.debug(f"Request URL: {self.endpoint}")
-            self.logger.debug(f"Request payload size: {len(json.dumps(payload))} chars")
-            self.logger.debug(f"Chunk text length: {len(chunk.text)} chars")
-            
-            # Make API request with timeout
-            response = self.session.post(
-                self.endpoint,
-                json=payload,
-                timeout=60
-            )
-            
-            # Enhanced response logging
-            self.logger.debug(f"Response status: {response.status_code}")
-            self.logger.debug(f"Response headers: {dict(response.headers)}")
-            self.logger.debug(f"Response content length: {len(response.text)} chars")
-            
-            if response.status_code == 429:
-                # Rate limited, wait and retry
-                retry_after = int(response.headers.get('Retry-After', 60))
-                self.logger.warning(f"Rate limited, waiting {retry_after} seconds")
-                time.sleep(retry_after)
-                return self.extract_from_chunk(chunk, system_prompt)
-            
-            # Check for successful status code
-            if response.status_code != 200:
-                self.logger.error(f"API request failed with status {response.status_code} for {chunk.doc_id}__{chunk.chunk_id}")
-                self.logger.error(f"Response text: {response.text}")
-                response.raise_for_status()
-            
-            # Validate response content
-            if not response.text:
-                # Handle empty response with retry logic
-                if retry_count < 2:  # Allow up to 2 retries
-                    self.logger.warning(f"Empty response received for {chunk.doc_id}__{chunk.chunk_id}, retrying ({retry_count + 1}/2)")
-                    time.sleep(1)  # Small delay before retry
-                    return self.extract_from_chunk(chunk, system_prompt, retry_count + 1)
-                else:
-                    self.logger.error(f"Empty response received for {chunk.doc_id}__{chunk.chunk_id} after {retry_count + 1} attempts")
-                    self.logger.error("This suggests API configuration or authentication issues")
-                    return None
-            
-            # Check content type
-            content_type = response.headers.get('content-type', '')
-            if 'application/json' not in content_type.lower():
-                self.logger.warning(f"Unexpected content-type: {content_type} for {chunk.doc_id}__{chunk.chunk_id}")
-                self.logger.debug(f"Response text: {response.text}")
-            
-            # Parse response JSON
-            try:
-                result = response.json()
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Failed to parse API response JSON for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-                self.logger.error(f"Raw response text: {repr(response.text)}")
-                self.logger.error(f"Response length: {len(response.text)} chars")
-                return None
-            
-            # Validate response structure
-            if not isinstance(result, dict):
-                self.logger.error(f"API response is not a dictionary for {chunk.doc_id}__{chunk.chunk_id}: {type(result)}")
-                self.logger.debug(f"Response content: {result}")
-                return None
-            
-            # Extract content from response
-            choices = result.get('choices', [])
-            if not choices:
-                self.logger.error(f"No choices in API response for {chunk.doc_id}__{chunk.chunk_id}")
-                self.logger.debug(f"Response structure: {result}")
-                return None
-            
-            message = choices[0].get('message', {})
-            content = message.get('content', '')
-            
-            if not content:
-                # Handle known DeepSeek JSON mode issue with empty responses
-                if retry_count < 2:  # Allow up to 2 retries
-                    self.logger.warning(f"Empty content received for {chunk.doc_id}__{chunk.chunk_id}, retrying ({retry_count + 1}/2)")
-                    self.logger.warning("This is a known DeepSeek JSON mode issue - retrying with slight delay")
-                    time.sleep(1)  # Small delay before retry
-                    return self.extract_from_chunk(chunk, system_prompt, retry_count + 1)
-                else:
-                    self.logger.error(f"Empty content in API response for {chunk.doc_id}__{chunk.chunk_id} after {retry_count + 1} attempts")
-                    self.logger.error("Known DeepSeek issue: JSON mode may occasionally return empty content")
-                    self.logger.debug(f"Message structure: {message}")
-                    return None
-            
-            # Parse the nested JSON content
-            try:
-                extracted_data = json.loads(content)
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Failed to parse nested JSON content for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-                self.logger.error(f"Raw content: {repr(content)}")
-                self.logger.error(f"Content length: {len(content)} chars")
+            self.logger.debug(f"Making API request for {label} ({len(chunk.text)} chars)")
+            extracted_data = await self.engine.complete_json(payload, 60, label)
+            if extracted_data is None:
                 return None
             
             # Convert to ChunkResult
             chunk_result = self._parse_extraction_result(chunk, extracted_data)
             
             self.logger.debug(
-                f"Successfully processed {chunk.doc_id}__{chunk.chunk_id}: "
+                f"Successfully processed {label}: "
                 f"{len(chunk_result.rules)} rules, "
                 f"{sum(len(candidates) for candidates in chunk_result.new_candidates.values())} candidates"
             )
             
             return chunk_result
             
-        except requests.exceptions.Timeout as e:
-            self.logger.error(f"Request timeout for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-            self.logger.error("Consider reducing chunk size or increasing timeout")
-            return None
-        except requests.exceptions.ConnectionError as e:
-            self.logger.error(f"Connection error for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-            self.logger.error("Check internet connection and API endpoint URL")
-            return None
-        except requests.exceptions.HTTPError as e:
-            self.logger.error(f"HTTP error for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-            if hasattr(e.response, 'text'):
-                self.logger.error(f"Error response: {e.response.text}")
-            return None
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Request error for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-            return None
-        except ValueError as e:
-            self.logger.error(f"Configuration error for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-            self.logger.error("Check your API credentials and configuration")
-            return None
         except Exception as e:
-            self.logger.error(f"Unexpected error processing {chunk.doc_id}__{chunk.chunk_id}: {e}")
+            self.logger.error(f"Unexpected error processing {label}: {e}")
             import traceback
             self.logger.debug(f"Full traceback: {traceback.format_exc()}")
             return None
     
+    async def extract_from_chunks(self, chunks: List[TextChunk], system_prompt: str) -> Dict[str, ChunkResult]:
+        """
+        Extract rules from several chunks in one request (see batching).
+        
+        Returns the results keyed by "<doc_id>__<chunk_id>"; chunks the
+        answer leaves out, or all of them if the request fails, are missing.
+        A batch whose answer is cut off at max_tokens is split in half and
+        each half of more than one chunk is sent again.
+        """
+        items = [(f"{chunk.doc_id}__{chunk.chunk_id}", chunk.text) for chunk in chunks]
+        label = f"batch of {len(items)} from {items[0][0]}"
+        self.logger.debug(f"Processing {label}")
+        
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": format_batch(items)}
+            ],
+            "temperature": 0.1,
+            "max_tokens": BATCH_MAX_OUTPUT_TOKENS,
+            "response_format": {"type": "json_object"}
+        }
+        
+        try:
+            # The longer answer of a batch gets three times the single-chunk timeout
+            try:
+                extracted_data = await self.engine.complete_json(payload, 180, label, raise_on_truncation=True)
+            except TruncatedResponse as e:
+                self.logger.warning(f"{e}; splitting the batch in half")
+                middle = len(chunks) // 2
+                results: Dict[str, ChunkResult] = {}
+                for answers in await asyncio.gather(*(
+                    self.extract_from_chunks(half, system_prompt)
+                    for half in (chunks[:middle], chunks[middle:]) if len(half) > 1
+                )):
+                    results.update(answers)
+                return results
+            if extracted_data is None:
+                return {}
+            
+            answers = split_batch_response(extracted_data, [item_id for item_id, _ in items])
+            results = {
+                item_id: self._parse_extraction_result(chunk, answers[item_id])
+                for (item_id, _), chunk in zip(items, chunks) if item_id in answers
+            }
+            if len(results) < len(items):
+                self.logger.warning(f"No answer for {len(items) - len(results)} of the chunks in {label}")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Unexpected error processing {label}: {e}")
+            return {}
+    
     def _parse_extraction_result(self, chunk: TextChunk, data: Dict) -> ChunkResult:
         """Parse API response into ChunkResult."""
         from .models import Rule, Candidate, Condition, Zone
@@ -403,8 +322,9 @@ def load_chunks_from_jsonl(chunks_file: str) -> List[TextChunk]:
     return chunks
 
 
-def process_chunk_worker(client: DeepSeekClient, chunk: TextChunk, system_prompt: str, output_dir: str) -> Optional[str]:
-    """Process a single chunk (worker function for threading)."""
+async def process_chunk_worker(client: DeepSeekClient, chunk: TextChunk, system_prompt: str,
+                               output_dir: str) -> Optional[str]:
+    """Process a single chunk (one coroutine per chunk)."""
     logger = logging.getLogger("nsgx")
     
     try:
@@ -416,7 +336,7 @@ def process_chunk_worker(client: DeepSeekClient, chunk: TextChunk, system_prompt
             return str(result_file)
         
         # Process chunk
-        result = client.extract_from_chunk(chunk, system_prompt)
+        result = await client.extract_from_chunk(chunk, system_prompt)
         
         if result:
             # Save result
@@ -433,14 +353,107 @@ def process_chunk_worker(client: DeepSeekClient, chunk: TextChunk, system_prompt
         return None
 
 
+async def process_chunk_batch(client: DeepSeekClient, chunks: List[TextChunk], system_prompt: str,
+                              output_dir: str) -> List[Optional[str]]:
+    """Process chunks in one request; chunks left without an answer are sent on their own."""
+    logger = logging.getLogger("nsgx")
+    
+    # Check which results already exist
+    saved: List[Optional[str]] = []
+    pending = []
+    for chunk in chunks:
+        result_file = Path(output_dir) / "chunk_results" / f"{chunk.doc_id}__{chunk.chunk_id}.json"
+        if result_file.exists():
+            logger.debug(f"Result already exists for {chunk.doc_id}__{chunk.chunk_id}")
+            saved.append(str(result_file))
+        else:
+            pending.append(chunk)
+    if len(pending) <= 1:
+        return saved + [await process_chunk_worker(client, chunk, system_prompt, output_dir) for chunk in pending]
+    
+    results = await client.extract_from_chunks(pending, system_prompt)
+    
+    retries = []
+    for chunk in pending:
+        result = results.get(f"{chunk.doc_id}__{chunk.chunk_id}")
+        if result is None:
+            retries.append(chunk)
+            continue
+        try:
+            result_file = Path(output_dir) / "chunk_results" / f"{chunk.doc_id}__{chunk.chunk_id}.json"
+            result_file.parent.mkdir(parents=True, exist_ok=True)
+            save_json_file(result.to_dict(), str(result_file))
+            logger.info(f"Saved result for {chunk.doc_id}__{chunk.chunk_id}")
+            saved.append(str(result_file))
+        except Exception as e:
+            logger.error(f"Worker error for {chunk.doc_id}__{chunk.chunk_id}: {e}")
+            saved.append(None)
+    
+    saved.extend(await asyncio.gather(*(
+        process_chunk_worker(client, chunk, system_prompt, output_dir) for chunk in retries
+    )))
+    return saved
+
+
+async def _process_chunks(client: DeepSeekClient, chunks: List[TextChunk], system_prompt: str,
+                          output_dir: str, logger: logging.Logger, batch_tokens: int = 0) -> Tuple[int, int]:
+    """Run all chunks through the API concurrently; returns (successful, failed) counts."""
+    successful_count = 0
+    failed_count = 0
+    
+    async with client.engine:
+        # Test API connectivity before processing
+        if not await client.test_connectivity():
+            logger.error("API connectivity test failed. Please check your configuration and try again.")
+            logger.error("Common issues:")
+            logger.error("1. Check your API key in .env file")
+            logger.error("2. Verify the endpoint URL is correct")
+            logger.error("3. Ensure you have internet connectivity")
+            logger.error("4. Check if the API service is available")
+            raise RuntimeError("Cannot establish connection to DeepSeek API")
+        
+        # One coroutine per request; the engine limits how many are on the wire
+        if batch_tokens:
+            chunk_by_id = {f"{chunk.doc_id}__{chunk.chunk_id}": chunk for chunk in chunks}
+            batches = [
+                [chunk_by_id[item_id] for item_id, _ in batch]
+                for batch in plan_batches([(item_id, chunk.text) for item_id, chunk in chunk_by_id.items()],
+                                          batch_tokens, CHUNK_MAX_OUTPUT_TOKENS)
+            ]
+            logger.info(f"Sending {len(chunks)} chunks in {len(batches)} requests")
+        else:
+            batches = [[chunk] for chunk in chunks]
+        tasks = [
+            asyncio.ensure_future(process_chunk_batch(client, batch, system_prompt, output_dir))
+            for batch in batches
+        ]
+        for task in asyncio.as_completed(tasks):
+            for saved in await task:
+                if saved:
+                    successful_count += 1
+                else:
+                    failed_count += 1
+    
+    return successful_count, failed_count
+
+
 def process_chunks_with_deepseek(
     chunks_file: str,
     output_dir: str,
     concurrency: int,
     force: bool,
-    logger: logging.Logger
+    logger: logging.Logger,
+    max_concurrency: int = 0,
+    rpm: int = 0,
+    tpm: int = 0,
+    batch_tokens: int = 0
 ) -> None:
-    """Process all chunks with DeepSeek API."""
+    """
+    Process all chunks with DeepSeek API.
+    
+    With batch_tokens, consecutive chunks of up to that many tokens in
+    total share one request and one copy of the system prompt.
+    """
     logger.info(f"Starting chunk processing with concurrency={concurrency}")
     
     # Load chunks
@@ -460,19 +473,13 @@ def process_chunks_with_deepseek(
         endpoint=os.getenv('DEEPSEEK_ENDPOINT'),
         model=os.getenv('DEEPSEEK_MODEL'),
         api_key=os.getenv('DEEPSEEK_API_KEY'),
-        logger=logger
+        logger=logger,
+        concurrency=concurrency,
+        max_concurrency=max_concurrency,
+        rpm=rpm,
+        tpm=tpm
     )
     
-    # Test API connectivity before processing
-    if not client.test_connectivity():
-        logger.error("API connectivity test failed. Please check your configuration and try again.")
-        logger.error("Common issues:")
-        logger.error("1. Check your API key in .env file")
-        logger.error("2. Verify the endpoint URL is correct")
-        logger.error("3. Ensure you have internet connectivity")
-        logger.error("4. Check if the API service is available")
-        raise RuntimeError("Cannot establish connection to DeepSeek API")
-    
     # Filter chunks if not forcing
     if not force:
         chunks_to_process = []
@@ -488,29 +495,9 @@ def process_chunks_with_deepseek(
         logger.info("All chunks already processed")
         return
     
-    # Process chunks with thread pool
-    successful_count = 0
-    failed_count = 0
-    
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        # Submit all tasks
-        future_to_chunk = {
-            executor.submit(process_chunk_worker, client, chunk, system_prompt, output_dir): chunk
-            for chunk in chunks
-        }
-        
-        # Process results as they complete
-        for future in as_completed(future_to_chunk):
-            chunk = future_to_chunk[future]
-            try:
-                result_file = future.result()
-                if result_file:
-                    successful_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                logger.error(f"Future exception for {chunk.doc_id}__{chunk.chunk_id}: {e}")
-                failed_count += 1
+    successful_count, failed_count = asyncio.run(
+        _process_chunks(client, chunks, system_prompt, output_dir, logger, batch_tokens)
+    )
     
     # Save processing summary
     summary = {
@@ -518,7 +505,13 @@ def process_chunks_with_deepseek(
         "successful_chunks": successful_count,
         "failed_chunks": failed_count,
         "concurrency": concurrency,
-        "system_prompt_length": len(system_prompt)
+        "max_concurrency": client.engine.limiter.maximum,
+        "concurrency_levels": client.engine.limiter.history,
+        "system_prompt_length": len(system_prompt),
+        "transport": client.engine.transport.stats.to_dict(),
+        "rate_limit": client.engine.rate_limiter.to_dict(),
+        "batch_tokens": batch_tokens,
+        "api_requests": client.engine.requests_sent
     }
     
     summary_file = Path(output_dir) / "run_summary.json"
@@ -527,4 +520,4 @@ def process_chunks_with_deepseek(
     logger.info(
         f"Processing completed: {successful_count} successful, {failed_count} failed, "
         f"summary saved to {summary_file}"
-    )
\ No newline at end of file
+    )
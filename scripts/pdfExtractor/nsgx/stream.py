@@ -0,0 +1,240 @@
+"""Streaming download-to-extraction pipeline."""
+
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .enumdiff import filter_rule_paragraphs
+from .pack import (
+    DEFAULT_PDF_TIMEOUT, DOC_ALIASES_FILENAME, chunk_document_text, chunk_token_budget, extract_document_text
+)
+from .tokens import tokenizer_name
+from .utils import extract_doc_id_from_filename, save_json_file, sha256_file
+from .workers import (
+    DEFAULT_MAX_RSS_MB, DEFAULT_MAX_TASKS_PER_CHILD, OK, QUARANTINE_FILENAME, QUARANTINE_STATUSES, Quarantine,
+    SupervisedPool
+)
+
+# Seconds the task source waits for the next announced PDF before letting the pool check its workers
+READY_POLL_SECONDS = 0.2
+
+
+def read_ready_pdfs(source: TextIO) -> Iterator[Tuple[Path, str, str]]:
+    """
+    Yield (pdf_path, doc_id, sha256) for each PDF announced on source.
+    
+    Lines are either JSON records from download_pdfs.py --emit-jsonl or plain
+    PDF paths. Lines are consumed as they arrive, so this blocks until the
+    producer writes the next one.
+    """
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            record = json.loads(line)
+            pdf_path = Path(record["path"])
+            name = record.get("filename") or pdf_path.name
+            content_hash = record.get("sha256") or sha256_file(str(pdf_path))
+        else:
+            pdf_path = Path(line)
+            name = pdf_path.name
+            content_hash = sha256_file(str(pdf_path))
+        yield pdf_path, extract_doc_id_from_filename(name), content_hash
+
+
+def extract_ready_pdf(
+    pdf_path: str,
+    doc_id: str,
+    max_chars: int,
+    extract_mode: str = "fallback",
+    content_hash: Optional[str] = None,
+    max_tokens: int = 0
+) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]], Dict[str, Any]]:
+    """Extract a PDF once and derive its chunks, its rule-bearing paragraphs and the extraction record."""
+    text, extraction = extract_document_text(pdf_path, extract_mode, content_hash)
+    if not text:
+        return [], [], extraction
+    
+    chunks = [chunk.to_dict() for chunk in chunk_document_text(text, doc_id, max_chars, max_tokens)]
+    return chunks, filter_rule_paragraphs(text), extraction
+
+
+def stream_pdfs(
+    source: TextIO,
+    max_chars: int,
+    output_dir: str,
+    workers: int,
+    logger: logging.Logger,
+    extract_mode: str = "fallback",
+    timeout: float = DEFAULT_PDF_TIMEOUT,
+    max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+    max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    quarantine_file: Optional[str] = None,
+    token_budget: int = 0
+) -> None:
+    """
+    Extract PDFs while they are still being downloaded.
+    
+    Every PDF read from source is handed to a supervised worker process (see
+    workers.SupervisedPool) as soon as one is free; chunks and filtered
+    paragraphs are appended to chunks.jsonl and paragraphs.jsonl as soon as
+    each document finishes. As with pack, PDFs that exceed timeout seconds
+    or max_rss_mb, or crash their worker, are listed in quarantine_file
+    (default: quarantine.json in output_dir) and skipped by later runs, and
+    byte-identical PDFs are extracted once and recorded in doc_aliases.json.
+    With token_budget, chunks are sized by tokens so that each run request,
+    system prompt included, stays within that many input tokens; max_chars
+    is then ignored.
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    chunks_file = output_path / "chunks.jsonl"
+    paragraphs_file = output_path / "paragraphs.jsonl"
+    
+    max_tokens = chunk_token_budget(token_budget) if token_budget else 0
+    if max_tokens:
+        logger.info(f"Chunking to {max_tokens} tokens ({tokenizer_name()} counts), "
+                    f"{token_budget} per request with the system prompt")
+    
+    quarantine = Quarantine(quarantine_file or str(output_path / QUARANTINE_FILENAME))
+    quarantined_before = len(quarantine)
+    logger.info(
+        f"Waiting for PDFs (workers={workers}, timeout {timeout}s, {max_rss_mb} MB per PDF, "
+        f"{len(quarantine)} PDFs quarantined, output={output_path})"
+    )
+    started = time.monotonic()
+    
+    # PDFs announced on source, read by a thread so that waiting for the downloader never stalls the pool
+    ready: queue.Queue = queue.Queue()
+    doc_aliases: Dict[str, List[str]] = {}
+    read_error: List[Exception] = []
+    
+    def read_all() -> None:
+        try:
+            for entry in read_ready_pdfs(source):
+                ready.put(entry)
+        except Exception as e:
+            read_error.append(e)
+        finally:
+            ready.put(None)
+    
+    failed_files = 0
+    
+    def tasks() -> Iterator[Optional[Tuple[Tuple[str, Path, str], Tuple]]]:
+        nonlocal failed_files
+        primary_by_hash: Dict[str, str] = {}
+        while True:
+            try:
+                entry = ready.get(timeout=READY_POLL_SECONDS)
+            except queue.Empty:
+                yield None
+                continue
+            if entry is None:
+                return
+            pdf_path, doc_id, content_hash = entry
+            primary = primary_by_hash.get(content_hash)
+            if primary is not None:
+                if primary != doc_id and doc_id not in doc_aliases.setdefault(primary, []):
+                    doc_aliases[primary].append(doc_id)
+                    logger.info(f"{primary} has identical content to {doc_id}")
+                continue
+            primary_by_hash[content_hash] = doc_id
+            
+            reason = quarantine.reason_for(pdf_path, content_hash)
+            if reason:
+                logger.warning(f"Skipping quarantined {pdf_path} ({reason})")
+                failed_files += 1
+                continue
+            logger.debug(f"Queued {pdf_path} as {doc_id}")
+            args = (str(pdf_path), doc_id, max_chars, extract_mode, content_hash, max_tokens)
+            yield (doc_id, pdf_path, content_hash), args
+    
+    successful_files = 0
+    total_chunks = 0
+    total_paragraphs = 0
+    first_result_seconds = None
+    backend_counts: Dict[str, int] = defaultdict(int)
+    
+    # The reader thread is live while workers start; forkserver keeps them from forking it
+    with SupervisedPool(extract_ready_pdf, workers, timeout, max_rss_mb, max_tasks_per_child,
+                        start_method="forkserver") as pool, \
+            open(chunks_file, 'w', encoding='utf-8') as chunks_out, \
+            open(paragraphs_file, 'w', encoding='utf-8') as paragraphs_out:
+        reader = threading.Thread(target=read_all, daemon=True)
+        reader.start()
+        
+        for (doc_id, pdf_path, content_hash), status, value in pool.imap_unordered(tasks()):
+            if status != OK:
+                failed_files += 1
+                logger.error(f"Failed to process {pdf_path}: {value}")
+                if status in QUARANTINE_STATUSES:
+                    quarantine.add(pdf_path, status, value, content_hash)
+                continue
+            
+            chunks, paragraphs, extraction = value
+            backend_counts[extraction["backend"] or "failed"] += 1
+            if not chunks:
+                failed_files += 1
+                logger.warning(f"No text extracted from {pdf_path}")
+                continue
+            
+            for chunk in chunks:
+                chunks_out.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+            for para_id, paragraph in paragraphs:
+                record = {"doc_id": doc_id, "para_id": para_id, "text": paragraph}
+                paragraphs_out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            chunks_out.flush()
+            paragraphs_out.flush()
+            
+            successful_files += 1
+            total_chunks += len(chunks)
+            total_paragraphs += len(paragraphs)
+            if first_result_seconds is None:
+                first_result_seconds = time.monotonic() - started
+                logger.info(f"First document ready after {first_result_seconds:.1f}s")
+            logger.info(f"Processed {doc_id}: {len(chunks)} chunks, {len(paragraphs)} rule paragraphs")
+        
+        reader.join()
+    
+    if read_error:
+        raise read_error[0]
+    
+    save_json_file(doc_aliases, str(output_path / DOC_ALIASES_FILENAME))
+    
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Stream completed: {successful_files} files processed, {failed_files} files failed, "
+        f"{total_chunks} chunks, {total_paragraphs} rule paragraphs in {elapsed:.1f}s"
+    )
+    
+    summary = {
+        "successful_files": successful_files,
+        "failed_files": failed_files,
+        "duplicate_files": sum(len(aliases) for aliases in doc_aliases.values()),
+        "total_chunks": total_chunks,
+        "total_paragraphs": total_paragraphs,
+        "max_chars_per_chunk": None if max_tokens else max_chars,
+        "token_budget": token_budget or None,
+        "max_tokens_per_chunk": max_tokens or None,
+        "tokenizer": tokenizer_name() if max_tokens else None,
+        "workers": workers,
+        "extract_mode": extract_mode,
+        "newly_quarantined": len(quarantine) - quarantined_before,
+        "quarantined_total": len(quarantine),
+        "backends": dict(sorted(backend_counts.items())),
+        "first_result_seconds": round(first_result_seconds, 3) if first_result_seconds is not None else None,
+        "elapsed_seconds": round(elapsed, 3),
+        "chunks_file": str(chunks_file),
+        "paragraphs_file": str(paragraphs_file)
+    }
+    
+    summary_file = output_path / "stream_summary.json"
+    save_json_file(summary, str(summary_file))
+    logger.info(f"Stream summary saved to {summary_file}")
+
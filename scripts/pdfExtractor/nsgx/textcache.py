@@ -0,0 +1,97 @@
+"""Persistent cache of extracted PDF text, shared with xmlFiller."""
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Same default location and schema as xmlFiller/text_cache.py
+DEFAULT_TEXT_CACHE = Path.home() / ".cache" / "nsg" / "text_cache.sqlite"
+TEXT_CACHE_ENV = "NSG_TEXT_CACHE"
+DISABLED_VALUES = ("", "0", "off", "none", "false")
+
+
+class TextCache:
+    """SQLite cache of full and per-page text, keyed by PDF content hash and extractor backend/version."""
+    
+    def __init__(self, cache_file: str):
+        self.cache_file = cache_file
+        self._init_db()
+    
+    def _init_db(self) -> None:
+        """Initialize the cache database."""
+        Path(self.cache_file).parent.mkdir(parents=True, exist_ok=True)
+        
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            # WAL lets parallel pack workers and xmlFiller read while one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS extracted_text (
+                    content_hash TEXT,
+                    backend TEXT,
+                    backend_version TEXT,
+                    text TEXT,
+                    pages_json TEXT,
+                    metadata_json TEXT,
+                    timestamp INTEGER,
+                    PRIMARY KEY (content_hash, backend, backend_version)
+                )
+            ''')
+            conn.commit()
+    
+    def get(self, content_hash: str, backend: str,
+            backend_version: str) -> Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+        """Return cached (text, pages, metadata) or None."""
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            row = conn.execute(
+                'SELECT text, pages_json, metadata_json FROM extracted_text '
+                'WHERE content_hash = ? AND backend = ? AND backend_version = ?',
+                (content_hash, backend, backend_version)
+            ).fetchone()
+        
+        if not row:
+            return None
+        try:
+            return row[0], json.loads(row[1]), json.loads(row[2] or '{}')
+        except json.JSONDecodeError:
+            return None
+    
+    def put(self, content_hash: str, backend: str, backend_version: str, text: str,
+            pages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Store the text, pages ({"page_num", "text", ...}) and metadata one backend extracted."""
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO extracted_text
+                   (content_hash, backend, backend_version, text, pages_json, metadata_json, timestamp)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (content_hash, backend, backend_version, text, json.dumps(pages, ensure_ascii=False),
+                 json.dumps(metadata or {}, ensure_ascii=False), int(time.time()))
+            )
+            conn.commit()
+
+
+_text_cache: Optional[TextCache] = None
+_text_cache_path: Optional[str] = None
+
+
+def get_text_cache() -> Optional[TextCache]:
+    """Return the process-wide cache configured by NSG_TEXT_CACHE, or None if disabled."""
+    global _text_cache, _text_cache_path
+    
+    path = os.getenv(TEXT_CACHE_ENV, str(DEFAULT_TEXT_CACHE))
+    if path.strip().lower() in DISABLED_VALUES:
+        return None
+    if _text_cache is None or _text_cache_path != path:
+        _text_cache = TextCache(os.path.expanduser(path))
+        _text_cache_path = path
+    return _text_cache
+
+
+def pages_from_form_feeds(text: str) -> List[Dict[str, Any]]:
+    """Split pdfminer/pdftotext output, which ends every page with a form feed, into pages."""
+    parts = text.split('\f')
+    if parts and not parts[-1].strip():
+        parts.pop()
+    return [{"page_num": i, "text": part} for i, part in enumerate(parts, 1)]
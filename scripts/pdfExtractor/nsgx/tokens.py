@@ -0,0 +1,98 @@
+"""Token counts for chunking, approximating the DeepSeek tokenizer."""
+
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from tokenizers import Tokenizer  # optional: exact counts with DeepSeek's tokenizer.json
+except ImportError:
+    Tokenizer = None
+
+# Path to DeepSeek's tokenizer.json; used instead of the approximation when set and tokenizers is installed
+TOKENIZER_ENV = "DEEPSEEK_TOKENIZER"
+# Letters per token of a word; German legal text runs to long compounds the BPE vocabulary splits up
+LETTERS_PER_TOKEN = 4
+# Extra tokens per umlaut or other non-ASCII letter, which byte-level BPE merges less often
+NON_ASCII_LETTER_TOKENS = 0.5
+# DeepSeek splits digit runs into groups of at most three
+DIGITS_PER_TOKEN = 3
+# Pieces costed by the approximation: words, digit runs, line breaks and single symbols.
+# Spaces and tabs are free, as they merge into the following token.
+TOKEN_PIECE = re.compile(r"[^\W\d_]+|\d+|\n+|[^\w \t]|_")
+# Tokens of a request besides its message texts: chat template and instruction prefix
+REQUEST_OVERHEAD_TOKENS = 32
+
+
+@lru_cache(maxsize=1)
+def _load_tokenizer(path: str) -> Optional["Tokenizer"]:
+    """The tokenizer at path, or None when tokenizers is not installed."""
+    if Tokenizer is None:
+        return None
+    return Tokenizer.from_file(path)
+
+
+def get_tokenizer() -> Optional["Tokenizer"]:
+    """The exact DeepSeek tokenizer configured by DEEPSEEK_TOKENIZER, or None to approximate."""
+    path = os.getenv(TOKENIZER_ENV)
+    return _load_tokenizer(path) if path else None
+
+
+def tokenizer_name() -> str:
+    """What token counts are based on, for summaries."""
+    return os.getenv(TOKENIZER_ENV) if get_tokenizer() is not None else "approximate"
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece[0].isdigit():
+        return math.ceil(len(piece) / DIGITS_PER_TOKEN)
+    if piece[0].isalpha():
+        tokens = len(piece) / LETTERS_PER_TOKEN
+        if not piece.isascii():
+            tokens += NON_ASCII_LETTER_TOKENS * sum(1 for char in piece if ord(char) > 127)
+        return math.ceil(tokens)
+    return 1
+
+
+def token_boundaries(text: str) -> Tuple[List[int], List[int]]:
+    """
+    End offsets of the tokens of text and the running token count at each.
+    
+    A chunk text[start:end] that begins and ends on these boundaries holds
+    counts[j] - counts[i] tokens, where ends[i] = start and ends[j] = end.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+        return [end for _, end in offsets], list(range(1, len(offsets) + 1))
+    
+    ends: List[int] = []
+    counts: List[int] = []
+    total = 0
+    for match in TOKEN_PIECE.finditer(text):
+        total += _piece_tokens(match.group())
+        ends.append(match.end())
+        counts.append(total)
+    return ends, counts
+
+
+def count_tokens(text: str) -> int:
+    """Number of DeepSeek tokens in text, exact or approximated."""
+    _, counts = token_boundaries(text)
+    return counts[-1] if counts else 0
+
+
+@lru_cache(maxsize=4)
+def _system_prompt_tokens(text: str) -> int:
+    return count_tokens(text)
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Input tokens of a chat request; the system prompt, the same for every request, is counted once."""
+    total = REQUEST_OVERHEAD_TOKENS
+    for message in messages:
+        content = message.get("content") or ""
+        total += _system_prompt_tokens(content) if message.get("role") == "system" else count_tokens(content)
+    return total
@@ -1,11 +1,15 @@
 """Utility functions for NSG extraction."""
 
+import hashlib
 import json
 import logging
 import os
 import re
+from bisect import bisect_right
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .tokens import token_boundaries
 
 
 def setup_logging(log_dir: str = "logs") -> logging.Logger:
@@ -57,6 +61,15 @@ def extract_doc_id_from_filename(filename: str) -> str:
     return Path(filename).stem
 
 
+def sha256_file(filepath: str, chunk_size: int = 65536) -> str:
+    """Return the hex SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def normalize_string_for_comparison(text: str) -> str:
     """Normalize string for comparison and clustering."""
     # Convert to lowercase
@@ -122,84 +135,74 @@ def save_json_file(data: Any, filepath: str, ensure_dir: bool = True) -> None:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
 
-def chunk_text_smart(text: str, max_chars: int = 4000) -> List[str]:
-    """Smart text chunking with preference for section breaks."""
-    if len(text) <= max_chars:
-        return [text]
-    
-    chunks = []
-    
-    # First try to split by sections (§)
-    section_pattern = r'(\n\s*§\s*\d+)'
-    sections = re.split(section_pattern, text)
-    
-    current_chunk = ""
-    
-    for i, section in enumerate(sections):
-        # If this is a section marker, combine it with the next part
-        if re.match(r'\n\s*§\s*\d+', section) and i + 1 < len(sections):
-            if current_chunk and len(current_chunk + section + sections[i + 1]) > max_chars:
-                # Save current chunk and start new one
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = section + sections[i + 1]
-                sections[i + 1] = ""  # Mark as processed
-            else:
-                current_chunk += section + (sections[i + 1] if i + 1 < len(sections) else "")
-                if i + 1 < len(sections):
-                    sections[i + 1] = ""  # Mark as processed
-        elif section and not re.match(r'\n\s*§\s*\d+', section):
-            if len(current_chunk + section) > max_chars and current_chunk.strip():
-                # Save current chunk
-                chunks.append(current_chunk.strip())
-                current_chunk = section
+# Chunk boundaries in order of preference: section heading, blank line, sentence end, whitespace
+CHUNK_BREAK_PATTERNS = [
+    re.compile(r'\n\s*§\s*\d+'),
+    re.compile(r'\n[ \t\r\f\v]*\n'),
+    re.compile(r'(?<=[.!?])\s'),
+    re.compile(r'\s'),
+]
+
+
+def chunk_spans(text: str, max_chars: int = 4000, max_tokens: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (start, end) offsets of chunks of at most max_chars characters.
+    
+    With max_tokens, chunks are limited to max_tokens DeepSeek tokens (see
+    nsgx.tokens) instead, and max_chars is ignored. Each chunk ends at the
+    last section heading (§) that fits, else the last blank line, sentence
+    end or whitespace, and is cut hard only when none fits. Break positions are found in one regex pass per kind, the first
+    time a chunk needs that kind, and looked up by bisection, so the whole
+    text is processed in linear time. Spans exclude surrounding whitespace,
+    so text[start:end] is a stripped chunk.
+    """
+    max_chars = max(1, max_chars)
+    if max_tokens:
+        token_ends, token_counts = token_boundaries(text)
+    breaks: List[Optional[List[int]]] = [None] * len(CHUNK_BREAK_PATTERNS)
+    n = len(text)
+    pos = 0
+    while True:
+        while pos < n and text[pos].isspace():
+            pos += 1
+        if pos >= n:
+            return
+        
+        if max_tokens:
+            first = bisect_right(token_ends, pos)
+            budget = (token_counts[first - 1] if first else 0) + max_tokens
+            last = bisect_right(token_counts, budget) - 1
+            if last >= len(token_ends) - 1:
+                # The remainder fits, trailing whitespace included
+                cut = n
             else:
-                current_chunk += section
-    
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    # If chunks are still too large, split by paragraphs
-    final_chunks = []
-    for chunk in chunks:
-        if len(chunk) <= max_chars:
-            final_chunks.append(chunk)
+                # A single token over budget still makes a chunk of its own
+                cut = token_ends[max(first, last)]
         else:
-            # Split by paragraphs
-            paragraphs = chunk.split('\n\n')
-            current_para_chunk = ""
-            
-            for para in paragraphs:
-                if len(current_para_chunk + para + '\n\n') > max_chars and current_para_chunk.strip():
-                    final_chunks.append(current_para_chunk.strip())
-                    current_para_chunk = para + '\n\n'
-                else:
-                    current_para_chunk += para + '\n\n'
-            
-            if current_para_chunk.strip():
-                final_chunks.append(current_para_chunk.strip())
-    
-    # Final fallback: hard split by sentences
-    result_chunks = []
-    for chunk in final_chunks:
-        if len(chunk) <= max_chars:
-            result_chunks.append(chunk)
+            cut = pos + max_chars
+        if cut < n:
+            for kind, pattern in enumerate(CHUNK_BREAK_PATTERNS):
+                if breaks[kind] is None:
+                    breaks[kind] = [match.start() for match in pattern.finditer(text)]
+                positions = breaks[kind]
+                # Last break in (pos, cut]; a break at cut itself still leaves text[pos:cut]
+                i = bisect_right(positions, cut) - 1
+                if i >= 0 and positions[i] > pos:
+                    cut = positions[i]
+                    break
         else:
-            # Split by sentences
-            sentences = re.split(r'(?<=[.!?])\s+', chunk)
-            current_sent_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_sent_chunk + sentence + ' ') > max_chars and current_sent_chunk.strip():
-                    result_chunks.append(current_sent_chunk.strip())
-                    current_sent_chunk = sentence + ' '
-                else:
-                    current_sent_chunk += sentence + ' '
-            
-            if current_sent_chunk.strip():
-                result_chunks.append(current_sent_chunk.strip())
-    
-    return [chunk for chunk in result_chunks if chunk.strip()]
+            cut = n
+        
+        end = cut
+        while text[end - 1].isspace():
+            end -= 1
+        yield pos, end
+        pos = cut
+
+
+def chunk_text_smart(text: str, max_chars: int = 4000, max_tokens: int = 0) -> List[str]:
+    """Smart text chunking with preference for section breaks."""
+    return [text[start:end] for start, end in chunk_spans(text, max_chars, max_tokens)]
 
 
 def merge_conditions(conditions_list: List[List]) -> List[Dict[str, Any]]:
@@ -0,0 +1,243 @@
+"""Supervised worker processes for PDF extraction."""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from multiprocessing import forkserver
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .utils import load_json_file, save_json_file, sha256_file
+
+# Resident memory a worker may use before it is killed (0 = no limit)
+DEFAULT_MAX_RSS_MB = 2048
+# Tasks a worker runs before it is replaced by a fresh process (0 = never)
+DEFAULT_MAX_TASKS_PER_CHILD = 50
+# PDFs that hung, ran out of memory or crashed a worker; skipped by later runs
+QUARANTINE_FILENAME = "quarantine.json"
+
+# Task outcomes reported by SupervisedPool.imap_unordered
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+MEMORY = "memory"
+CRASHED = "crashed"
+# Outcomes that cost a worker process; their PDFs are quarantined
+QUARANTINE_STATUSES = (TIMEOUT, MEMORY, CRASHED)
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _worker_main(conn: Connection, func: Callable[..., Any], max_tasks: int) -> None:
+    """Run tasks from conn until told to stop or max_tasks is reached."""
+    # Ctrl-C is handled by the supervisor, which kills the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    done = 0
+    while not max_tasks or done < max_tasks:
+        try:
+            args = conn.recv()
+        except EOFError:
+            break
+        if args is None:
+            break
+        try:
+            result = (True, func(*args))
+        except Exception as e:
+            result = (False, str(e) or type(e).__name__)
+        conn.send(result)
+        done += 1
+    conn.close()
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    conn: Connection
+    key: Any = None
+    started: float = 0.0
+    tasks_done: int = 0
+
+
+class SupervisedPool:
+    """
+    Worker processes that run one task at a time under a wall-clock timeout and an RSS cap.
+    
+    Unlike a timer inside the worker, the supervisor kills a worker that
+    exceeds its limits even when it is stuck in native code, and since each
+    worker holds one task the culprit of a hang, memory blow-up or crash is
+    always known. Workers are replaced after max_tasks_per_child tasks to
+    return leaked memory. With the default fork start method func is
+    inherited by the workers, so it need not be picklable; its arguments and
+    results are. Callers that start workers while other threads or open
+    sockets are live (an asyncio loop driving API requests) should use
+    "forkserver": workers then fork from a clean server process, and func
+    must be a picklable module-level function.
+    """
+    
+    def __init__(self, func: Callable[..., Any], workers: int = 1, timeout: float = 0,
+                 max_rss_mb: float = 0, max_tasks_per_child: int = 0, poll_interval: float = 0.2,
+                 start_method: str = "fork"):
+        self.func = func
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Start the server now, from the caller's thread, with func's module imported once
+            self._context.set_forkserver_preload([func.__module__])
+            forkserver.ensure_running()
+        self._idle: List[_Worker] = []
+        self._busy: List[_Worker] = []
+    
+    def __enter__(self) -> "SupervisedPool":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """Stop idle workers and kill busy ones."""
+        for worker in self._idle:
+            self._stop(worker)
+        for worker in self._busy:
+            self._kill(worker)
+        self._idle, self._busy = [], []
+    
+    def _start(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.func, self.max_tasks_per_child),
+                                        daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+    
+    def _stop(self, worker: _Worker) -> None:
+        try:
+            worker.conn.send(None)
+        except OSError:
+            pass
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+    
+    def _kill(self, worker: _Worker) -> None:
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+    
+    def _check(self, worker: _Worker, now: float) -> Optional[Tuple[str, Any]]:
+        """Outcome of a busy worker's task, or None while it is still running within its limits."""
+        if worker.conn.poll():
+            try:
+                succeeded, value = worker.conn.recv()
+                return (OK if succeeded else ERROR), value
+            except (EOFError, OSError):
+                pass
+        if not worker.process.is_alive():
+            worker.process.join()
+            return CRASHED, f"worker exited with code {worker.process.exitcode}"
+        if self.timeout and now - worker.started > self.timeout:
+            return TIMEOUT, f"timed out after {self.timeout}s"
+        if self.max_rss_mb:
+            rss_mb = process_rss_mb(worker.process.pid)
+            if rss_mb is not None and rss_mb > self.max_rss_mb:
+                return MEMORY, f"used {rss_mb:.0f} MB, limit {self.max_rss_mb} MB"
+        return None
+    
+    def imap_unordered(self, tasks: Iterable[Optional[Tuple[Any, Tuple]]]) -> Iterator[Tuple[Any, str, Any]]:
+        """
+        Run func(*args) for each (key, args) and yield (key, status, value) as tasks finish.
+        
+        status is OK (value is the result), ERROR (value is the exception
+        message) or one of QUARANTINE_STATUSES (value describes why the
+        worker was killed or died). Tasks are pulled lazily, one per worker.
+        A source that waits on input should not block for long: it may yield
+        None when no task is ready yet, and the pool checks its workers
+        before asking again.
+        """
+        tasks = iter(tasks)
+        exhausted = False
+        while True:
+            while not exhausted and len(self._busy) < self.workers:
+                try:
+                    task = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if task is None:
+                    break
+                key, args = task
+                worker = self._idle.pop() if self._idle else self._start()
+                worker.conn.send(args)
+                worker.key, worker.started = key, time.monotonic()
+                self._busy.append(worker)
+            if not self._busy:
+                if exhausted:
+                    return
+                continue
+            
+            wait([worker.conn for worker in self._busy] + [worker.process.sentinel for worker in self._busy],
+                 timeout=self.poll_interval)
+            now = time.monotonic()
+            for worker in list(self._busy):
+                outcome = self._check(worker, now)
+                if outcome is None:
+                    continue
+                self._busy.remove(worker)
+                if outcome[0] in (OK, ERROR):
+                    worker.tasks_done += 1
+                    if self.max_tasks_per_child and worker.tasks_done >= self.max_tasks_per_child:
+                        self._stop(worker)
+                    else:
+                        self._idle.append(worker)
+                else:
+                    self._kill(worker)
+                yield worker.key, outcome[0], outcome[1]
+
+
+class Quarantine:
+    """PDFs that hung, exhausted memory or crashed a worker, keyed by content hash and kept in a JSON file."""
+    
+    def __init__(self, quarantine_file: str):
+        self.quarantine_file = quarantine_file
+        self.entries: Dict[str, Dict[str, Any]] = (
+            load_json_file(quarantine_file) if Path(quarantine_file).is_file() else {}
+        )
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def reason_for(self, pdf_path: Path, content_hash: Optional[str] = None) -> Optional[str]:
+        """Why pdf_path is quarantined, or None if it is not; content_hash saves hashing the file."""
+        if not self.entries:
+            return None
+        entry = self.entries.get(content_hash or sha256_file(str(pdf_path)))
+        return entry["reason"] if entry else None
+    
+    def add(self, pdf_path: Path, reason: str, detail: str, content_hash: Optional[str] = None) -> None:
+        """Quarantine a PDF and save the list right away, so it survives an aborted run."""
+        self.entries[content_hash or sha256_file(str(pdf_path))] = {
+            "path": str(pdf_path),
+            "reason": reason,
+            "detail": detail,
+            "timestamp": int(time.time()),
+        }
+        save_json_file(self.entries, self.quarantine_file)
+        logging.getLogger("nsgx").warning(f"Quarantined {pdf_path} ({detail}); delete it from "
+                                          f"{self.quarantine_file} to retry")
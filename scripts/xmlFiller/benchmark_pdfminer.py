@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pdfminer fallback path of PDFExtractor.
+
+Times PDFExtractor._extract_with_pdfminer, which does a single layout pass,
+against the previous two-pass approach (pdfminer's extract_text for the full
+text plus extract_pages for the per-page layout) on the same PDFs, and checks
+that both produce the same text and pages. pdfminer is not deterministic on
+every PDF; when the outputs differ, the reference is run again, and a file
+whose two reference runs disagree is reported as unstable rather than as a
+mismatch. The text cache is bypassed.
+
+Usage:
+    python benchmark_pdfminer.py --pdf-dir ../pdfExtractor/data --limit 40
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List
+
+from pdfminer.high_level import extract_text as pdfminer_extract
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LAParams, LTTextContainer
+
+from pdf_extractor import PDFExtractor, PDFMINER_VERSION
+
+DEFAULT_PDF_DIR = Path(__file__).resolve().parent.parent / 'pdfExtractor' / 'data'
+
+
+def extract_two_pass(pdf_path: Path) -> Dict[str, Any]:
+    """
+    Reference implementation that parses the PDF twice.
+    
+    Args:
+        pdf_path: Path to PDF file
+    
+    Returns:
+        Dict with 'text' and 'pages', shaped like _extract_with_pdfminer's result
+    """
+    full_text = pdfminer_extract(str(pdf_path))
+    
+    pages = []
+    laparams = LAParams(
+        line_overlap=0.5,
+        char_margin=2.0,
+        word_margin=0.1,
+        boxes_flow=0.5,
+        detect_vertical=False
+    )
+    for page_num, page_layout in enumerate(extract_pages(str(pdf_path), laparams=laparams), 1):
+        pages.append({
+            'page_num': page_num,
+            'text': ''.join(element.get_text() for element in page_layout
+                            if isinstance(element, LTTextContainer)),
+            'width': page_layout.width,
+            'height': page_layout.height
+        })
+    
+    return {'text': full_text, 'pages': pages}
+
+
+def time_call(func, pdf_path: Path, repeat: int) -> tuple:
+    """
+    Run func(pdf_path) repeat times.
+    
+    Returns:
+        Tuple of (best wall time in seconds, last result)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(pdf_path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description='Compare single-pass and two-pass pdfminer extraction'
+    )
+    parser.add_argument(
+        '--pdf-dir',
+        default=str(DEFAULT_PDF_DIR),
+        help=f'Directory containing PDF files (default: {DEFAULT_PDF_DIR})'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=20,
+        help='Number of PDFs to time, evenly spread over the directory (default: 20)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='Runs per PDF and method; the fastest counts (default: 1)'
+    )
+    parser.add_argument(
+        '--results',
+        help='Append the results as one JSON line to this file'
+    )
+    args = parser.parse_args()
+    
+    pdfs = sorted(Path(args.pdf_dir).glob('*.pdf'))
+    if not pdfs:
+        print(f"Error: no PDFs found in {args.pdf_dir}")
+        sys.exit(1)
+    if args.limit and args.limit < len(pdfs):
+        step = len(pdfs) / args.limit
+        pdfs = [pdfs[int(i * step)] for i in range(args.limit)]
+    
+    extractor = PDFExtractor()
+    repeat = max(1, args.repeat)
+    totals = {'two_pass': 0.0, 'single_pass': 0.0}
+    page_count = 0
+    mismatches: List[str] = []
+    unstable: List[str] = []
+    
+    print(f"Timing {len(pdfs)} PDFs with pdfminer.six {PDFMINER_VERSION}")
+    for pdf_path in pdfs:
+        # Time both methods on each file in turn so drift affects both equally
+        two_pass_time, reference = time_call(extract_two_pass, pdf_path, repeat)
+        single_pass_time, result = time_call(extractor._extract_with_pdfminer, pdf_path, repeat)
+        totals['two_pass'] += two_pass_time
+        totals['single_pass'] += single_pass_time
+        page_count += len(result['pages'])
+        
+        if result['text'] != reference['text'] or result['pages'] != reference['pages']:
+            if extract_two_pass(pdf_path) != reference:
+                unstable.append(pdf_path.name)
+            else:
+                mismatches.append(pdf_path.name)
+        print(f"  {pdf_path.name}: {two_pass_time:.2f}s -> {single_pass_time:.2f}s")
+    
+    speedup = totals['two_pass'] / totals['single_pass'] if totals['single_pass'] else None
+    print()
+    print(f"Two-pass:    {totals['two_pass']:.2f}s ({page_count / totals['two_pass']:.1f} pages/s)")
+    print(f"Single-pass: {totals['single_pass']:.2f}s ({page_count / totals['single_pass']:.1f} pages/s)")
+    print(f"Speedup:     {speedup:.2f}x")
+    if unstable:
+        print(f"Unstable (pdfminer output varies between runs), not compared for {len(unstable)} PDFs: "
+              f"{', '.join(unstable)}")
+    if mismatches:
+        print(f"Output differs for {len(mismatches)} PDFs: {', '.join(mismatches)}")
+    else:
+        print(f"Output identical for all {len(pdfs) - len(unstable)} stable PDFs")
+    
+    if args.results:
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'pdfminer_version': PDFMINER_VERSION,
+            'files': len(pdfs),
+            'pages': page_count,
+            'repeat': repeat,
+            'two_pass_seconds': round(totals['two_pass'], 3),
+            'single_pass_seconds': round(totals['single_pass'], 3),
+            'speedup': round(speedup, 3) if speedup else None,
+            'mismatches': mismatches,
+            'unstable': unstable
+        }
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Results appended to {args.results}")
+    
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,9 +19,12 @@ from pathlib import Path
 from typing import Optional, Dict, Any, List
 
 # Import our modules
-from utils import setup_logging
+from utils import setup_logging, group_pdfs_by_content
 from schema_loader import SchemaLoader
 from pdf_extractor import PDFExtractor
+from text_cache import TextCache, default_cache_path
+from supervisor import (SupervisedPool, Quarantine, OK, QUARANTINE_STATUSES, QUARANTINE_FILENAME,
+                        DEFAULT_TIMEOUT, DEFAULT_MAX_RSS_MB, DEFAULT_MAX_TASKS_PER_CHILD)
 from text_processor import TextProcessor
 from rule_extractor import RuleExtractor
 from serializer import Serializer
@@ -34,7 +37,8 @@ class NSGConverter:
     """Main converter class orchestrating the conversion pipeline."""
     
     def __init__(self, schema_path: str, synonyms_path: Optional[str] = None,
-                 use_ocr: bool = False, verbose: bool = False):
+                 use_ocr: bool = False, verbose: bool = False,
+                 text_cache_path: Optional[Path] = None, ocr_workers: Optional[int] = None):
         """
         Initialize NSG converter.
         
@@ -43,6 +47,8 @@ class NSGConverter:
             synonyms_path: Optional path to synonyms JSON
             use_ocr: Whether to use OCR for scanned PDFs
             verbose: Enable verbose logging
+            text_cache_path: Extracted-text cache file, or None to disable caching
+            ocr_workers: Parallel Tesseract processes (default: number of CPUs)
         """
         # Setup logging
         self.logger = setup_logging(verbose)
@@ -51,7 +57,8 @@ class NSGConverter:
         # Initialize components
         try:
             self.schema_loader = SchemaLoader(schema_path, synonyms_path)
-            self.pdf_extractor = PDFExtractor(use_ocr)
+            text_cache = TextCache(text_cache_path) if text_cache_path else None
+            self.pdf_extractor = PDFExtractor(use_ocr, text_cache, ocr_workers)
             self.text_processor = TextProcessor()
             self.rule_extractor = RuleExtractor(self.schema_loader)
             self.serializer = Serializer(self.schema_loader)
@@ -67,12 +74,13 @@ class NSGConverter:
             'total_time': 0
         }
     
-    def convert_pdf(self, pdf_path: str) -> Dict[str, Any]:
+    def convert_pdf(self, pdf_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Convert a single PDF file.
         
         Args:
             pdf_path: Path to PDF file
+            content_hash: SHA-256 of the PDF if already known, for the text cache
         
         Returns:
             Conversion result
@@ -83,16 +91,25 @@ class NSGConverter:
         self.logger.info(f"Processing {pdf_path.name}")
         
         try:
-            # Step 1: Extract text from PDF
-            self.logger.debug("Extracting text from PDF...")
-            extracted = self.pdf_extractor.extract_text(pdf_path)
-            
-            if not extracted.get('text'):
-                raise ValueError("No text extracted from PDF")
+            # Steps 1-2: Extract text page by page and process it as it arrives
+            self.logger.debug("Extracting and processing text page by page...")
+            extracted = {}
+            processed = self.text_processor.process_pages(
+                self.pdf_extractor.iter_pages(pdf_path, extracted, content_hash)
+            )
+            processed['metadata'] = extracted.get('metadata', {})
             
-            # Step 2: Process and clean text
-            self.logger.debug("Processing text...")
-            processed = self.text_processor.process_text(extracted)
+            if not extracted.get('method'):
+                # No text layer found page by page; the full chain includes OCR
+                self.logger.debug("Extracting text from PDF...")
+                # The scan verdict from iter_pages saves detecting it again
+                extracted = self.pdf_extractor.extract_text(pdf_path, content_hash, extracted.get('scanned'))
+                
+                if not extracted.get('text'):
+                    raise ValueError("No text extracted from PDF")
+                
+                self.logger.debug("Processing text...")
+                processed = self.text_processor.process_text(extracted)
             
             # Step 3: Extract rules
             self.logger.debug("Extracting rules...")
@@ -131,14 +148,26 @@ class NSGConverter:
             }
     
     def convert_directory(self, pdf_dir: str, output_dir: str, 
-                         generate_report: bool = False) -> Dict[str, Any]:
+                         generate_report: bool = False, workers: int = 1,
+                         timeout: float = DEFAULT_TIMEOUT, max_rss_mb: int = DEFAULT_MAX_RSS_MB,
+                         max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+                         quarantine_file: Optional[Path] = None) -> Dict[str, Any]:
         """
         Convert all PDFs in a directory.
         
+        Each PDF is converted in a supervised worker process. A PDF that
+        exceeds the timeout or memory cap, or crashes its worker, is marked
+        failed and quarantined, and later runs skip it.
+        
         Args:
             pdf_dir: Directory containing PDFs
             output_dir: Output directory
             generate_report: Whether to generate reports
+            workers: Number of worker processes
+            timeout: Seconds allowed per PDF (0 = no limit)
+            max_rss_mb: Memory allowed per worker in MB (0 = no limit)
+            max_tasks_per_child: PDFs a worker converts before it is replaced (0 = never)
+            quarantine_file: Quarantine list (default: output_dir/quarantine.json)
         
         Returns:
             Overall results
@@ -152,20 +181,87 @@ class NSGConverter:
         # Create output directory
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Find all PDF files
-        pdf_files = sorted(pdf_dir.glob("*.pdf"))
+        # Find all PDF files; byte-identical duplicates are converted once
+        pdf_groups = group_pdfs_by_content(pdf_dir)
+        total = sum(len(names) for _, _, names in pdf_groups)
         
-        if not pdf_files:
+        if not pdf_groups:
             self.logger.warning(f"No PDF files found in {pdf_dir}")
             return {'total': 0, 'results': []}
         
-        self.logger.info(f"Found {len(pdf_files)} PDF files to process")
+        self.logger.info(f"Found {total} PDF files to process ({len(pdf_groups)} distinct)")
         
-        results = []
+        quarantine = Quarantine(quarantine_file or output_dir / QUARANTINE_FILENAME)
+        if quarantine:
+            self.logger.info(f"{len(quarantine)} PDFs in quarantine at {quarantine.quarantine_file}")
+        converted_by_group: Dict[int, Dict[str, Any]] = {}
+        tasks = []
+        # Each PDF was hashed once for the grouping; the quarantine and text cache reuse that hash
+        for index, (pdf_file, content_hash, _) in enumerate(pdf_groups):
+            reason = quarantine.reason_for(pdf_file, content_hash)
+            if reason:
+                self.logger.warning(f"Skipping quarantined {pdf_file.name} ({reason})")
+                converted_by_group[index] = {
+                    'success': False,
+                    'pdf_file': pdf_file.name,
+                    'error': f"Quarantined ({reason})",
+                    'rules': []
+                }
+            else:
+                tasks.append((index, (pdf_file, content_hash)))
         
-        for pdf_file in pdf_files:
-            # Convert PDF
-            result = self.convert_pdf(pdf_file)
+        results_by_group = {
+            index: self._write_outputs(converted, pdf_groups[index][2], output_dir, generate_report)
+            for index, converted in converted_by_group.items()
+        }
+        
+        # The workers inherit the converter through fork; only the PDF path and hash are sent
+        with SupervisedPool(self.convert_pdf, workers, timeout, max_rss_mb, max_tasks_per_child) as pool:
+            for index, status, value in pool.imap_unordered(tasks):
+                pdf_file, content_hash, filename_bases = pdf_groups[index]
+                if status == OK:
+                    converted = value
+                else:
+                    self.logger.error(f"Error processing {pdf_file.name}: {value}")
+                    if status in QUARANTINE_STATUSES:
+                        quarantine.add(pdf_file, status, value, content_hash)
+                    converted = {
+                        'success': False,
+                        'pdf_file': pdf_file.name,
+                        'error': value,
+                        'rules': []
+                    }
+                results_by_group[index] = self._write_outputs(converted, filename_bases, output_dir, generate_report)
+        
+        results = [result for index in sorted(results_by_group) for result in results_by_group[index]]
+        
+        return {
+            'total': total,
+            'successful': self.stats['successful'],
+            'failed': self.stats['failed'],
+            'results': results
+        }
+    
+    def _write_outputs(self, converted: Dict[str, Any], filename_bases: List[str],
+                       output_dir: Path, generate_report: bool) -> List[Dict[str, Any]]:
+        """
+        Serialize one conversion result under each name of a PDF.
+        
+        Args:
+            converted: Result of convert_pdf
+            filename_bases: Names of the byte-identical PDFs
+            output_dir: Output directory
+            generate_report: Whether to generate reports
+        
+        Returns:
+            One result per name
+        """
+        if len(filename_bases) > 1:
+            self.logger.info(f"Reusing result for identical PDFs: {', '.join(filename_bases[1:])}")
+        
+        results = []
+        for filename_base in filename_bases:
+            result = dict(converted, pdf_file=f"{filename_base}.pdf")
             
             # Update statistics
             self.stats['processed'] += 1
@@ -174,7 +270,6 @@ class NSGConverter:
                 
                 # Serialize outputs
                 try:
-                    filename_base = pdf_file.stem
                     output_paths = self.serializer.serialize(
                         result['rules'],
                         output_dir,
@@ -182,24 +277,19 @@ class NSGConverter:
                         generate_report
                     )
                     result['outputs'] = output_paths
-                    self.logger.info(f"✓ {pdf_file.name} converted successfully")
+                    self.logger.info(f"✓ {result['pdf_file']} converted successfully")
                 except Exception as e:
-                    self.logger.error(f"Failed to serialize {pdf_file.name}: {str(e)}")
+                    self.logger.error(f"Failed to serialize {result['pdf_file']}: {str(e)}")
                     result['success'] = False
                     result['error'] = f"Serialization failed: {str(e)}"
                     self.stats['failed'] += 1
             else:
                 self.stats['failed'] += 1
-                self.logger.error(f"✗ {pdf_file.name} conversion failed")
+                self.logger.error(f"✗ {result['pdf_file']} conversion failed")
             
             results.append(result)
         
-        return {
-            'total': len(pdf_files),
-            'successful': self.stats['successful'],
-            'failed': self.stats['failed'],
-            'results': results
-        }
+        return results
     
     def print_summary(self):
         """Print conversion summary."""
@@ -276,6 +366,62 @@ Examples:
         help='Enable OCR for scanned PDFs (requires tesseract)'
     )
     
+    parser.add_argument(
+        '--ocr-workers',
+        type=int,
+        help='Parallel tesseract processes for OCR (default: number of CPUs)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of conversion processes (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f'Seconds allowed per PDF; 0 for no limit (default: {DEFAULT_TIMEOUT})'
+    )
+    
+    parser.add_argument(
+        '--max-rss-mb',
+        type=int,
+        default=DEFAULT_MAX_RSS_MB,
+        help=f'Memory allowed per conversion process; 0 for no limit (default: {DEFAULT_MAX_RSS_MB})'
+    )
+    
+    parser.add_argument(
+        '--max-tasks-per-child',
+        type=int,
+        default=DEFAULT_MAX_TASKS_PER_CHILD,
+        help='PDFs per conversion process before it is replaced; 0 for never '
+             f'(default: {DEFAULT_MAX_TASKS_PER_CHILD})'
+    )
+    
+    parser.add_argument(
+        '--quarantine-file',
+        type=Path,
+        help='PDFs that hung, ran out of memory or crashed, skipped on later runs '
+             f'(default: OUT/{QUARANTINE_FILENAME})'
+    )
+    
+    parser.add_argument(
+        '--text-cache',
+        default=default_cache_path(),
+        type=Path,
+        help='Extracted-text cache shared with nsgx '
+             '(default: $NSG_TEXT_CACHE or ~/.cache/nsg/text_cache.sqlite)'
+    )
+    
+    parser.add_argument(
+        '--no-text-cache',
+        action='store_true',
+        help='Always re-parse PDFs instead of using the text cache'
+    )
+    
     parser.add_argument(
         '--report',
         action='store_true',
@@ -302,14 +448,21 @@ Examples:
             schema_path=args.schema,
             synonyms_path=args.mapping,
             use_ocr=args.ocr,
-            verbose=args.verbose
+            verbose=args.verbose,
+            text_cache_path=None if args.no_text_cache else args.text_cache,
+            ocr_workers=args.ocr_workers
         )
         
         # Process PDFs
         results = converter.convert_directory(
             pdf_dir=args.pdf_dir,
             output_dir=args.out,
-            generate_report=args.report
+            generate_report=args.report,
+            workers=args.workers,
+            timeout=args.timeout,
+            max_rss_mb=args.max_rss_mb,
+            max_tasks_per_child=args.max_tasks_per_child,
+            quarantine_file=args.quarantine_file
         )
         
         # Print summary
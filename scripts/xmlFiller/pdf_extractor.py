@@ -3,10 +3,15 @@ PDF text extraction module for NSG PDF to XML/JSON converter.
 Handles extraction using PyMuPDF (primary) and pdfminer.six (fallback).
 """
 
+import hashlib
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional, Dict, List, Any
-from utils import handle_errors, normalize_whitespace
+from typing import Optional, Dict, List, Any, Callable, Iterator, Tuple
+from utils import handle_errors, normalize_whitespace, sha256_file
+from text_cache import TextCache
 
 logger = logging.getLogger('nsg_converter.pdf_extractor')
 
@@ -14,17 +19,23 @@ logger = logging.getLogger('nsg_converter.pdf_extractor')
 try:
     import fitz  # PyMuPDF
     PYMUPDF_AVAILABLE = True
+    PYMUPDF_VERSION = fitz.VersionBind
 except ImportError:
     PYMUPDF_AVAILABLE = False
+    PYMUPDF_VERSION = None
     logger.warning("PyMuPDF not available, will use pdfminer.six")
 
 try:
-    from pdfminer.high_level import extract_text as pdfminer_extract
-    from pdfminer.high_level import extract_pages
-    from pdfminer.layout import LAParams, LTTextContainer
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LAParams, LTContainer, LTText, LTTextBox, LTTextContainer
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    import pdfminer
     PDFMINER_AVAILABLE = True
+    PDFMINER_VERSION = pdfminer.__version__
 except ImportError:
     PDFMINER_AVAILABLE = False
+    PDFMINER_VERSION = None
     logger.warning("pdfminer.six not available")
 
 # Optional OCR support
@@ -37,18 +48,86 @@ except ImportError:
     OCR_AVAILABLE = False
     logger.info("OCR support not available (pytesseract not installed)")
 
+# Pages with fewer characters than this have no usable text layer
+MIN_PAGE_TEXT_CHARS = 50
+# Documents where at least this share of pages has no text layer are treated as scanned
+SCANNED_PAGE_RATIO = 0.5
+# Pages are rendered at 2x (144 dpi) for OCR
+OCR_ZOOM = 2.0
+OCR_LANG = 'deu'
+
+
+def _render_layout_text(item: Any, out: List[str]) -> None:
+    """
+    Append the text of a pdfminer layout item to out, as pdfminer's TextConverter writes it.
+    
+    Args:
+        item: Layout object (page, text box, line, character, figure, ...)
+        out: List of text fragments to append to
+    """
+    if isinstance(item, LTContainer):
+        for child in item:
+            _render_layout_text(child, out)
+    elif isinstance(item, LTText):
+        out.append(item.get_text())
+    if isinstance(item, LTTextBox):
+        out.append('\n')
+
+
+def _page_hash(doc: Any, page: Any) -> str:
+    """
+    Hash what a page looks like: its geometry, content stream and image data.
+    
+    Args:
+        doc: Open PyMuPDF document
+        page: Page of doc
+    
+    Returns:
+        Hex SHA-256 digest, equal for the same scanned page in different PDFs
+    """
+    digest = hashlib.sha256(f"{tuple(page.rect)}|{page.rotation}".encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b'')
+    return digest.hexdigest()
+
+
+def _init_ocr_worker() -> None:
+    """Keep each Tesseract run single-threaded; the pool provides the parallelism."""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _ocr_png(png: bytes, lang: str) -> str:
+    """
+    OCR one rendered page; runs in the OCR process pool.
+    
+    Args:
+        png: PNG data of the page
+        lang: Tesseract language
+    
+    Returns:
+        Recognized text
+    """
+    return pytesseract.image_to_string(Image.open(io.BytesIO(png)), lang=lang)
+
 
 class PDFExtractor:
     """Extract text from PDF files using multiple methods."""
     
-    def __init__(self, use_ocr: bool = False):
+    def __init__(self, use_ocr: bool = False, text_cache: Optional[TextCache] = None,
+                 ocr_workers: Optional[int] = None):
         """
         Initialize PDF extractor.
         
         Args:
             use_ocr: Whether to use OCR for scanned PDFs
+            text_cache: Persistent cache of extracted text, shared with nsgx
+            ocr_workers: Parallel Tesseract processes (default: number of CPUs)
         """
         self.use_ocr = use_ocr and OCR_AVAILABLE
+        self.text_cache = text_cache
+        self.ocr_workers = max(1, ocr_workers or os.cpu_count() or 1)
+        self._ocr_version = None
         
         if self.use_ocr and not OCR_AVAILABLE:
             logger.warning("OCR requested but pytesseract not available")
@@ -57,12 +136,15 @@ class PDFExtractor:
             raise RuntimeError("No PDF extraction library available. "
                              "Please install PyMuPDF or pdfminer.six")
     
-    def extract_text(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_text(self, pdf_path: str, content_hash: Optional[str] = None,
+                     scanned: Optional[bool] = None) -> Dict[str, Any]:
         """
         Extract text from PDF file.
         
         Args:
             pdf_path: Path to PDF file
+            content_hash: SHA-256 of the PDF if already known, for the text cache
+            scanned: Scan verdict if already known (see iter_pages), else detected here
         
         Returns:
             Dict with 'text', 'pages', 'method', and 'metadata'
@@ -82,9 +164,20 @@ class PDFExtractor:
             }
         }
         
+        # Identify the content so warm runs can skip parsing
+        if not self.text_cache:
+            content_hash = None
+        elif not content_hash:
+            content_hash = sha256_file(pdf_path)
+        
+        # Scanned documents go straight to OCR instead of through two text-layer parsers
+        if scanned is None:
+            scanned = self._detect_scanned(pdf_path, content_hash)
+        
         # Try PyMuPDF first (usually better results)
-        if PYMUPDF_AVAILABLE:
-            extracted = self._extract_with_pymupdf(pdf_path)
+        if PYMUPDF_AVAILABLE and not scanned:
+            extracted = self._extract_cached(pdf_path, content_hash, 'pymupdf', PYMUPDF_VERSION,
+                                             self._extract_with_pymupdf)
             if extracted and extracted['text'].strip():
                 result.update(extracted)
                 result['method'] = 'pymupdf'
@@ -92,8 +185,9 @@ class PDFExtractor:
                 return result
         
         # Fallback to pdfminer.six
-        if PDFMINER_AVAILABLE:
-            extracted = self._extract_with_pdfminer(pdf_path)
+        if PDFMINER_AVAILABLE and not scanned:
+            extracted = self._extract_cached(pdf_path, content_hash, 'pdfminer-layout', PDFMINER_VERSION,
+                                             self._extract_with_pdfminer)
             if extracted and extracted['text'].strip():
                 result.update(extracted)
                 result['method'] = 'pdfminer'
@@ -102,7 +196,8 @@ class PDFExtractor:
         
         # Try OCR if enabled and previous methods failed
         if self.use_ocr and PYMUPDF_AVAILABLE:
-            extracted = self._extract_with_ocr(pdf_path)
+            extracted = self._extract_cached(pdf_path, content_hash, 'ocr', self._get_ocr_version(),
+                                             self._extract_with_ocr)
             if extracted and extracted['text'].strip():
                 result.update(extracted)
                 result['method'] = 'ocr'
@@ -112,57 +207,318 @@ class PDFExtractor:
         logger.warning(f"Could not extract text from {pdf_path.name}")
         return result
     
+    def iter_pages(self, pdf_path: str, info: Optional[Dict[str, Any]] = None,
+                   content_hash: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Extract text page by page, yielding each page as soon as it is parsed.
+        
+        Uses PyMuPDF, or pdfminer.six if PyMuPDF is unavailable or finds no
+        text; blank pages are held back until a page with text follows, so a
+        backend that finds nothing is skipped cleanly. If a backend fails
+        mid-document, the next one continues at the page where it stopped.
+        Only the current page is held in memory, except that on a text cache
+        miss the pages are also kept to store them after the last page. OCR
+        is not attempted here; fall back to extract_text for scanned PDFs.
+        With OCR enabled, a PDF detected as scanned yields no pages at all.
+        
+        Args:
+            pdf_path: Path to PDF file
+            info: Optional dict that receives 'method' and 'metadata' once the
+                last page has been yielded, and 'scanned' with OCR enabled;
+                'method' is left unset if no text was found
+            content_hash: SHA-256 of the PDF if already known, for the text cache
+        
+        Yields:
+            Page dicts with 'page_num', 'text', 'width' and 'height'
+        """
+        pdf_path = Path(pdf_path)
+        
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        
+        info = {} if info is None else info
+        if not self.text_cache:
+            content_hash = None
+        elif not content_hash:
+            content_hash = sha256_file(pdf_path)
+        if self.use_ocr:
+            info['scanned'] = self._detect_scanned(pdf_path, content_hash)
+            if info['scanned']:
+                logger.info(f"{pdf_path.name} is scanned; leaving it to OCR")
+                return
+        
+        backends = []
+        if PYMUPDF_AVAILABLE:
+            backends.append(('pymupdf', 'pymupdf', PYMUPDF_VERSION, self._iter_pymupdf, '\n'))
+        if PDFMINER_AVAILABLE:
+            backends.append(('pdfminer', 'pdfminer-layout', PDFMINER_VERSION, self._iter_pdfminer, ''))
+        next_page = 1
+        
+        for method, backend, backend_version, iterate, separator in backends:
+            use_cache = bool(content_hash and backend_version)
+            cached = self._cache_get(content_hash, backend, backend_version) if use_cache else None
+            metadata = {}
+            if cached is not None:
+                metadata = cached[2]
+                pages = ((page, None) for page in cached[1])
+            else:
+                pages = iterate(pdf_path, metadata)
+            
+            # Only a complete, uninterrupted parse is stored in the cache
+            store = use_cache and cached is None and next_page == 1
+            stored_pages = []
+            full_text = []
+            blank = []
+            
+            try:
+                for page, page_text in pages:
+                    if store:
+                        stored_pages.append(page)
+                        full_text.append(page_text)
+                    if page['page_num'] < next_page:
+                        continue
+                    if not page['text'].strip():
+                        blank.append(page)
+                        continue
+                    yield from blank
+                    blank = []
+                    yield page
+                    next_page = page['page_num'] + 1
+            except Exception as e:
+                if next_page > 1:
+                    logger.warning(f"{method} failed after page {next_page - 1} of {pdf_path.name}: {e}")
+                else:
+                    logger.debug(f"{method} page extraction failed for {pdf_path.name}: {e}")
+                continue
+            
+            if store:
+                self.text_cache.put(content_hash, backend, backend_version, separator.join(full_text),
+                                    stored_pages, metadata)
+            if next_page > 1:
+                yield from blank
+                info['method'] = method
+                info['metadata'] = metadata
+                logger.info(f"Extracted text from {pdf_path.name} page by page using {method}")
+                return
+        
+        logger.warning(f"Could not extract text page by page from {pdf_path.name}")
+    
+    def find_textless_pages(self, pdf_path: Path) -> Tuple[int, List[int]]:
+        """
+        Find the pages without a usable text layer, using PyMuPDF.
+        
+        Only the text layer is read, which takes milliseconds per page;
+        nothing is rendered.
+        
+        Args:
+            pdf_path: Path to PDF file
+        
+        Returns:
+            Tuple of (page count, numbers of the pages without text)
+        """
+        with fitz.open(str(pdf_path)) as doc:
+            textless = [page_num for page_num, page in enumerate(doc, 1)
+                        if len(page.get_text().strip()) < MIN_PAGE_TEXT_CHARS]
+            return len(doc), textless
+    
+    def is_scanned(self, pdf_path: Path) -> bool:
+        """
+        Check whether a PDF is a scan, i.e. most of its pages have no text layer.
+        
+        Args:
+            pdf_path: Path to PDF file
+        
+        Returns:
+            True if the share of textless pages reaches SCANNED_PAGE_RATIO
+        """
+        try:
+            page_count, textless = self.find_textless_pages(pdf_path)
+        except Exception as e:
+            logger.debug(f"Scanned-page detection failed for {pdf_path.name}: {e}")
+            return False
+        return page_count > 0 and len(textless) / page_count >= SCANNED_PAGE_RATIO
+    
+    def _detect_scanned(self, pdf_path: Path, content_hash: Optional[str]) -> bool:
+        """
+        Run is_scanned through the text cache; only relevant with OCR enabled.
+        
+        Args:
+            pdf_path: Path to PDF file
+            content_hash: SHA-256 of the PDF, or None if caching is off
+        
+        Returns:
+            True if the PDF should go straight to OCR
+        """
+        if not (self.use_ocr and PYMUPDF_AVAILABLE):
+            return False
+        if not (self.text_cache and content_hash):
+            return self.is_scanned(pdf_path)
+        
+        detector_version = f"{PYMUPDF_VERSION}:{MIN_PAGE_TEXT_CHARS}:{SCANNED_PAGE_RATIO}"
+        scanned = self.text_cache.get_scanned(content_hash, detector_version)
+        if scanned is None:
+            scanned = self.is_scanned(pdf_path)
+            self.text_cache.put_scanned(content_hash, detector_version, scanned)
+        return scanned
+    
+    def _extract_cached(self, pdf_path: Path, content_hash: Optional[str], backend: str,
+                        backend_version: Optional[str],
+                        extract: Callable[[Path], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run one extraction backend through the persistent text cache.
+        
+        Args:
+            pdf_path: Path to PDF file
+            content_hash: SHA-256 of the PDF, or None if caching is off
+            backend: Backend name used as part of the cache key
+            backend_version: Backend version; None disables caching for it
+            extract: Extraction method to call on a cache miss
+        
+        Returns:
+            Extraction result as returned by the backend method
+        """
+        if not (content_hash and backend_version):
+            return extract(pdf_path)
+        
+        cached = self._cache_get(content_hash, backend, backend_version)
+        if cached is not None:
+            text, pages, metadata = cached
+            logger.debug(f"Text cache hit for {pdf_path.name} ({backend})")
+            return {'text': text, 'pages': pages, 'metadata': metadata}
+        
+        extracted = extract(pdf_path)
+        # handle_errors' fallback result has no metadata; errors are not cached
+        if extracted and 'metadata' in extracted:
+            self.text_cache.put(content_hash, backend, backend_version, extracted['text'],
+                                extracted['pages'], extracted['metadata'])
+        return extracted
+    
+    def _cache_get(self, content_hash: str, backend: str,
+                   backend_version: str) -> Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Look up a cached extraction complete enough for the converter.
+        
+        Entries without metadata (page count, title, ...) were written by an
+        older nsgx that shares the cache and are treated as a miss, so they
+        get replaced by a full extraction.
+        
+        Args:
+            content_hash: SHA-256 of the PDF
+            backend: Backend name used as part of the cache key
+            backend_version: Backend version
+        
+        Returns:
+            Tuple of (text, pages, metadata), or None on a miss
+        """
+        cached = self.text_cache.get(content_hash, backend, backend_version)
+        if cached is None or not cached[2]:
+            return None
+        return cached
+    
+    def _get_ocr_version(self) -> Optional[str]:
+        """Get the PyMuPDF + Tesseract version used as OCR cache key."""
+        if self._ocr_version is None and OCR_AVAILABLE and PYMUPDF_AVAILABLE:
+            try:
+                self._ocr_version = f"{PYMUPDF_VERSION}+tesseract-{pytesseract.get_tesseract_version()}"
+            except Exception as e:
+                logger.debug(f"Could not determine Tesseract version: {e}")
+        return self._ocr_version
+    
     @handle_errors({'text': '', 'pages': []})
     def _extract_with_pymupdf(self, pdf_path: Path) -> Dict[str, Any]:
         """Extract text using PyMuPDF."""
         if not PYMUPDF_AVAILABLE:
             return {'text': '', 'pages': []}
         
-        doc = fitz.open(str(pdf_path))
+        metadata = {}
         pages = []
         full_text = []
+        for page, page_text in self._iter_pymupdf(pdf_path, metadata):
+            pages.append(page)
+            full_text.append(page_text)
+        
+        return {
+            'text': '\n'.join(full_text),
+            'pages': pages,
+            'metadata': metadata
+        }
+    
+    def _iter_pymupdf(self, pdf_path: Path, metadata: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Parse a PDF with PyMuPDF one page at a time.
+        
+        Args:
+            pdf_path: Path to PDF file
+            metadata: Dict that receives the document metadata
+        
+        Yields:
+            Tuples of (page dict, page's part of the full text)
+        """
+        doc = fitz.open(str(pdf_path))
         
         try:
+            # Extract metadata
+            doc_metadata = doc.metadata or {}
+            metadata.update({
+                'page_count': len(doc),
+                'title': doc_metadata.get('title', ''),
+                'author': doc_metadata.get('author', ''),
+                'subject': doc_metadata.get('subject', ''),
+                'keywords': doc_metadata.get('keywords', ''),
+                'creator': doc_metadata.get('creator', ''),
+                'producer': doc_metadata.get('producer', '')
+            })
+            
             for page_num, page in enumerate(doc, 1):
                 page_text = page.get_text()
-                pages.append({
+                yield {
                     'page_num': page_num,
                     'text': page_text,
                     'width': page.rect.width,
                     'height': page.rect.height
-                })
-                full_text.append(page_text)
-            
-            # Extract metadata
-            metadata = doc.metadata or {}
-            
-            return {
-                'text': '\n'.join(full_text),
-                'pages': pages,
-                'metadata': {
-                    'page_count': len(doc),
-                    'title': metadata.get('title', ''),
-                    'author': metadata.get('author', ''),
-                    'subject': metadata.get('subject', ''),
-                    'keywords': metadata.get('keywords', ''),
-                    'creator': metadata.get('creator', ''),
-                    'producer': metadata.get('producer', '')
-                }
-            }
+                }, page_text
         finally:
             doc.close()
     
     @handle_errors({'text': '', 'pages': []})
     def _extract_with_pdfminer(self, pdf_path: Path) -> Dict[str, Any]:
-        """Extract text using pdfminer.six."""
+        """
+        Extract text using pdfminer.six.
+        
+        One layout pass yields the pages, their sizes and the full text. The
+        full text is rendered the way pdfminer's extract_text does it (a blank
+        line after each text box, a form feed after each page), so it matches
+        the output of a separate extract_text call without parsing the PDF twice.
+        """
         if not PDFMINER_AVAILABLE:
             return {'text': '', 'pages': []}
         
-        # Extract full text
-        full_text = pdfminer_extract(str(pdf_path))
-        
-        # Extract page-by-page with layout analysis
+        metadata = {}
         pages = []
+        full_text = []
+        for page, page_text in self._iter_pdfminer(pdf_path, metadata):
+            pages.append(page)
+            full_text.append(page_text)
+        
+        return {
+            'text': ''.join(full_text),
+            'pages': pages,
+            'metadata': metadata
+        }
+    
+    def _iter_pdfminer(self, pdf_path: Path, metadata: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Parse a PDF with pdfminer.six layout analysis one page at a time.
+        
+        Each page's layout is released before the next page is parsed.
+        
+        Args:
+            pdf_path: Path to PDF file
+            metadata: Dict that receives the page count after the last page
+        
+        Yields:
+            Tuples of (page dict, page's part of the full text)
+        """
         laparams = LAParams(
             line_overlap=0.5,
             char_margin=2.0,
@@ -171,76 +527,123 @@ class PDFExtractor:
             detect_vertical=False
         )
         
-        for page_num, page_layout in enumerate(extract_pages(str(pdf_path), laparams=laparams), 1):
-            page_text = []
+        page_count = 0
+        with open(pdf_path, 'rb') as file:
+            rsrcmgr = PDFResourceManager()
+            device = PDFPageAggregator(rsrcmgr, laparams=laparams)
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
             
-            for element in page_layout:
-                if isinstance(element, LTTextContainer):
-                    page_text.append(element.get_text())
-            
-            pages.append({
-                'page_num': page_num,
-                'text': ''.join(page_text),
-                'width': page_layout.width,
-                'height': page_layout.height
-            })
+            for page_num, pdf_page in enumerate(PDFPage.get_pages(file), 1):
+                interpreter.process_page(pdf_page)
+                page_layout = device.get_result()
+                page_text = []
+                
+                for element in page_layout:
+                    if isinstance(element, LTTextContainer):
+                        page_text.append(element.get_text())
+                
+                full_text = []
+                _render_layout_text(page_layout, full_text)
+                full_text.append('\f')
+                page = {
+                    'page_num': page_num,
+                    'text': ''.join(page_text),
+                    'width': page_layout.width,
+                    'height': page_layout.height
+                }
+                
+                # Drop the layout before the next page is parsed
+                device.result = None
+                page_layout = None
+                page_count = page_num
+                yield page, ''.join(full_text)
         
-        return {
-            'text': full_text,
-            'pages': pages,
-            'metadata': {
-                'page_count': len(pages)
-            }
-        }
+        metadata['page_count'] = page_count
     
     @handle_errors({'text': '', 'pages': []})
     def _extract_with_ocr(self, pdf_path: Path) -> Dict[str, Any]:
-        """Extract text using OCR (for scanned PDFs)."""
+        """
+        Extract text using OCR (for scanned PDFs).
+        
+        Pages with a text layer keep it; only the others are rendered and
+        OCRed, in parallel over ocr_workers processes. With the text cache
+        enabled, rendered images and OCR text are stored per page hash, so a
+        page is never rendered or OCRed twice.
+        """
         if not OCR_AVAILABLE or not PYMUPDF_AVAILABLE:
             return {'text': '', 'pages': []}
         
+        ocr_version = self._get_ocr_version()
+        use_cache = bool(self.text_cache and ocr_version)
         doc = fitz.open(str(pdf_path))
         pages = []
-        full_text = []
+        pending = []  # (index into pages, page hash, PNG data) of pages still to OCR
         
         try:
             for page_num, page in enumerate(doc, 1):
                 # First try to get text normally
                 page_text = page.get_text()
-                
-                # If no text or very little text, try OCR
-                if len(page_text.strip()) < 50:
-                    # Render page as image
-                    mat = fitz.Matrix(2, 2)  # 2x zoom for better OCR
-                    pix = page.get_pixmap(matrix=mat)
-                    img_data = pix.tobytes("png")
-                    
-                    # OCR the image
-                    image = Image.open(io.BytesIO(img_data))
-                    ocr_text = pytesseract.image_to_string(image, lang='deu')  # German
-                    
-                    if ocr_text.strip():
-                        page_text = ocr_text
-                        logger.debug(f"Used OCR for page {page_num}")
-                
                 pages.append({
                     'page_num': page_num,
                     'text': page_text,
                     'width': page.rect.width,
                     'height': page.rect.height
                 })
-                full_text.append(page_text)
+                if len(page_text.strip()) >= MIN_PAGE_TEXT_CHARS:
+                    continue
+                
+                page_hash = _page_hash(doc, page)
+                if use_cache:
+                    ocr_text = self.text_cache.get_page_ocr(page_hash, OCR_ZOOM, ocr_version, OCR_LANG)
+                    if ocr_text is not None:
+                        if ocr_text.strip():
+                            pages[-1]['text'] = ocr_text
+                        continue
+                
+                png = self.text_cache.get_page_image(page_hash, OCR_ZOOM) if use_cache else None
+                if png is None:
+                    png = page.get_pixmap(matrix=fitz.Matrix(OCR_ZOOM, OCR_ZOOM)).tobytes("png")
+                    if use_cache:
+                        self.text_cache.put_page_image(page_hash, OCR_ZOOM, png)
+                pending.append((len(pages) - 1, page_hash, png))
             
-            return {
-                'text': '\n'.join(full_text),
-                'pages': pages,
-                'metadata': {
-                    'page_count': len(doc),
-                    'ocr_used': True
-                }
-            }
+            page_count = len(doc)
         finally:
             doc.close()
+        
+        for (index, page_hash, _), ocr_text in zip(pending, self._ocr_images([png for _, _, png in pending])):
+            if use_cache:
+                self.text_cache.put_page_ocr(page_hash, OCR_ZOOM, ocr_version, OCR_LANG, ocr_text)
+            if ocr_text.strip():
+                pages[index]['text'] = ocr_text
+                logger.debug(f"Used OCR for page {pages[index]['page_num']}")
+        
+        return {
+            'text': '\n'.join(page['text'] for page in pages),
+            'pages': pages,
+            'metadata': {
+                'page_count': page_count,
+                'ocr_used': True
+            }
+        }
+    
+    def _ocr_images(self, images: List[bytes]) -> List[str]:
+        """
+        OCR rendered pages, in a process pool if there is more than one.
+        
+        Args:
+            images: PNG data per page
+        
+        Returns:
+            OCR text per page, in the same order
+        """
+        workers = min(self.ocr_workers, len(images))
+        if workers <= 1:
+            return [_ocr_png(png, OCR_LANG) for png in images]
+        
+        logger.debug(f"OCR of {len(images)} pages with {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as pool:
+            return list(pool.map(_ocr_png, images, repeat(OCR_LANG)))
     
     def extract_from_directory(self, directory: str, 
                               pattern: str = "*.pdf") -> List[Dict[str, Any]]:
@@ -0,0 +1,282 @@
+"""
+Supervised worker processes for NSG PDF to XML/JSON converter.
+Runs each PDF conversion in a worker process under a wall-clock timeout and a
+memory cap, and keeps a quarantine list of PDFs that hung, ran out of memory
+or crashed a worker. Mirrors pdfExtractor/nsgx/workers.py.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Optional, Dict, List, Any, Callable, Iterable, Iterator, Tuple
+
+from utils import sha256_file
+
+logger = logging.getLogger('nsg_converter.supervisor')
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_RSS_MB = 2048
+DEFAULT_MAX_TASKS_PER_CHILD = 50
+QUARANTINE_FILENAME = 'quarantine.json'
+
+# Task outcomes reported by SupervisedPool.imap_unordered
+OK = 'ok'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+MEMORY = 'memory'
+CRASHED = 'crashed'
+QUARANTINE_STATUSES = (TIMEOUT, MEMORY, CRASHED)
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """
+    Get the resident memory of a process.
+    
+    Args:
+        pid: Process ID
+    
+    Returns:
+        Resident memory in MB, or None where /proc is unavailable
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def _worker_main(conn: Connection, func: Callable[..., Any], max_tasks: int):
+    """Run tasks received on conn until told to stop or max_tasks is reached."""
+    # Ctrl-C is handled by the supervisor, which kills the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    done = 0
+    while not max_tasks or done < max_tasks:
+        try:
+            args = conn.recv()
+        except EOFError:
+            break
+        if args is None:
+            break
+        try:
+            result = (True, func(*args))
+        except Exception as e:
+            result = (False, str(e) or type(e).__name__)
+        conn.send(result)
+        done += 1
+    conn.close()
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    conn: Connection
+    key: Any = None
+    started: float = 0.0
+    tasks_done: int = 0
+
+
+class SupervisedPool:
+    """
+    Worker processes that run one task at a time under a timeout and an RSS cap.
+    
+    The supervisor kills a worker that exceeds its limits even when it is
+    stuck in native code, and replaces workers after max_tasks_per_child
+    tasks. func is inherited by the forked workers, so it need not be
+    picklable; its arguments and results are.
+    """
+    
+    def __init__(self, func: Callable[..., Any], workers: int = 1, timeout: float = 0,
+                 max_rss_mb: float = 0, max_tasks_per_child: int = 0, poll_interval: float = 0.2):
+        """
+        Initialize the pool; workers are started on demand.
+        
+        Args:
+            func: Function each task calls
+            workers: Number of worker processes
+            timeout: Seconds allowed per task (0 = no limit)
+            max_rss_mb: Resident memory allowed per worker in MB (0 = no limit)
+            max_tasks_per_child: Tasks a worker runs before it is replaced (0 = never)
+            poll_interval: Seconds between limit checks
+        """
+        self.func = func
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context('fork')
+        self._idle: List[_Worker] = []
+        self._busy: List[_Worker] = []
+    
+    def __enter__(self) -> 'SupervisedPool':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """Stop idle workers and kill busy ones."""
+        for worker in self._idle:
+            self._stop(worker)
+        for worker in self._busy:
+            self._kill(worker)
+        self._idle, self._busy = [], []
+    
+    def _start(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        # Not a daemon: the OCR path starts its own tesseract process pool
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, self.func, self.max_tasks_per_child))
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+    
+    def _stop(self, worker: _Worker):
+        try:
+            worker.conn.send(None)
+        except OSError:
+            pass
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+    
+    def _kill(self, worker: _Worker):
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+    
+    def _check(self, worker: _Worker, now: float) -> Optional[Tuple[str, Any]]:
+        """
+        Get the outcome of a busy worker's task.
+        
+        Returns:
+            Tuple of (status, value), or None while the task is running within its limits
+        """
+        if worker.conn.poll():
+            try:
+                succeeded, value = worker.conn.recv()
+                return (OK if succeeded else ERROR), value
+            except (EOFError, OSError):
+                pass
+        if not worker.process.is_alive():
+            worker.process.join()
+            return CRASHED, f"worker exited with code {worker.process.exitcode}"
+        if self.timeout and now - worker.started > self.timeout:
+            return TIMEOUT, f"timed out after {self.timeout}s"
+        if self.max_rss_mb:
+            rss_mb = process_rss_mb(worker.process.pid)
+            if rss_mb is not None and rss_mb > self.max_rss_mb:
+                return MEMORY, f"used {rss_mb:.0f} MB, limit {self.max_rss_mb} MB"
+        return None
+    
+    def imap_unordered(self, tasks: Iterable[Tuple[Any, Tuple]]) -> Iterator[Tuple[Any, str, Any]]:
+        """
+        Run func(*args) for each (key, args) task, one task per worker at a time.
+        
+        Args:
+            tasks: Iterable of (key, args) pairs, pulled lazily
+        
+        Returns:
+            Iterator of (key, status, value) as tasks finish. status is OK (value
+            is the result), ERROR (value is the exception message) or one of
+            QUARANTINE_STATUSES (value says why the worker was killed or died).
+        """
+        tasks = iter(tasks)
+        exhausted = False
+        while True:
+            while not exhausted and len(self._busy) < self.workers:
+                try:
+                    key, args = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                worker = self._idle.pop() if self._idle else self._start()
+                worker.conn.send(args)
+                worker.key, worker.started = key, time.monotonic()
+                self._busy.append(worker)
+            if not self._busy:
+                return
+            
+            wait([worker.conn for worker in self._busy] + [worker.process.sentinel for worker in self._busy],
+                 timeout=self.poll_interval)
+            now = time.monotonic()
+            for worker in list(self._busy):
+                outcome = self._check(worker, now)
+                if outcome is None:
+                    continue
+                self._busy.remove(worker)
+                if outcome[0] in (OK, ERROR):
+                    worker.tasks_done += 1
+                    if self.max_tasks_per_child and worker.tasks_done >= self.max_tasks_per_child:
+                        self._stop(worker)
+                    else:
+                        self._idle.append(worker)
+                else:
+                    self._kill(worker)
+                yield worker.key, outcome[0], outcome[1]
+
+
+class Quarantine:
+    """PDFs that hung, exhausted memory or crashed a worker, keyed by content hash."""
+    
+    def __init__(self, quarantine_file: Path):
+        """
+        Load the quarantine list.
+        
+        Args:
+            quarantine_file: JSON file holding the list; created on the first entry
+        """
+        self.quarantine_file = Path(quarantine_file)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.quarantine_file.is_file():
+            with open(self.quarantine_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def reason_for(self, pdf_path: Path, content_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Check whether a PDF is quarantined.
+        
+        Args:
+            pdf_path: Path to PDF file
+            content_hash: SHA-256 of the PDF if already known; read from the file otherwise
+        
+        Returns:
+            Quarantine reason, or None if the PDF is not quarantined
+        """
+        if not self.entries:
+            return None
+        entry = self.entries.get(content_hash or sha256_file(pdf_path))
+        return entry['reason'] if entry else None
+    
+    def add(self, pdf_path: Path, reason: str, detail: str, content_hash: Optional[str] = None):
+        """
+        Quarantine a PDF and save the list right away, so it survives an aborted run.
+        
+        Args:
+            pdf_path: Path to PDF file
+            reason: One of QUARANTINE_STATUSES
+            detail: Human-readable description
+            content_hash: SHA-256 of the PDF if already known; read from the file otherwise
+        """
+        self.entries[content_hash or sha256_file(pdf_path)] = {
+            'path': str(pdf_path),
+            'reason': reason,
+            'detail': detail,
+            'timestamp': int(time.time())
+        }
+        self.quarantine_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.quarantine_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        logger.warning(f"Quarantined {pdf_path} ({detail}); delete it from {self.quarantine_file} to retry")
@@ -0,0 +1,254 @@
+"""
+Persistent extracted-text cache for NSG PDF to XML/JSON converter.
+Shares its SQLite file and schema with nsgx (pdfExtractor/nsgx/textcache.py),
+so both tools reuse each other's work on the same corpus. The page image,
+OCR and scan verdict tables are only used by the converter's OCR path.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Dict, List, Any, Tuple
+
+logger = logging.getLogger('nsg_converter.text_cache')
+
+DEFAULT_TEXT_CACHE = Path.home() / '.cache' / 'nsg' / 'text_cache.sqlite'
+TEXT_CACHE_ENV = 'NSG_TEXT_CACHE'
+DISABLED_VALUES = ('', '0', 'off', 'none', 'false')
+
+
+def default_cache_path() -> Optional[Path]:
+    """
+    Get the cache location configured by NSG_TEXT_CACHE.
+    
+    Returns:
+        Path of the cache file, or None if the cache is disabled
+    """
+    value = os.getenv(TEXT_CACHE_ENV, str(DEFAULT_TEXT_CACHE))
+    if value.strip().lower() in DISABLED_VALUES:
+        return None
+    return Path(value).expanduser()
+
+
+class TextCache:
+    """Cache of extracted text keyed by PDF content hash and extractor backend/version."""
+    
+    def __init__(self, cache_file: Path):
+        """
+        Initialize the cache, creating the database if needed.
+        
+        Args:
+            cache_file: Path to the SQLite cache file
+        """
+        self.cache_file = str(cache_file)
+        Path(self.cache_file).parent.mkdir(parents=True, exist_ok=True)
+        
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS extracted_text (
+                    content_hash TEXT,
+                    backend TEXT,
+                    backend_version TEXT,
+                    text TEXT,
+                    pages_json TEXT,
+                    metadata_json TEXT,
+                    timestamp INTEGER,
+                    PRIMARY KEY (content_hash, backend, backend_version)
+                )
+            ''')
+            # Scanned pages are keyed by their own content, so a page shared by several PDFs is OCRed once
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_images (
+                    page_hash TEXT,
+                    zoom REAL,
+                    png BLOB,
+                    timestamp INTEGER,
+                    PRIMARY KEY (page_hash, zoom)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_ocr (
+                    page_hash TEXT,
+                    zoom REAL,
+                    ocr_version TEXT,
+                    lang TEXT,
+                    text TEXT,
+                    timestamp INTEGER,
+                    PRIMARY KEY (page_hash, zoom, ocr_version, lang)
+                )
+            ''')
+            # Whether a PDF is a scan, so warm OCR runs need not open it to find out
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_verdicts (
+                    content_hash TEXT,
+                    detector_version TEXT,
+                    scanned INTEGER,
+                    timestamp INTEGER,
+                    PRIMARY KEY (content_hash, detector_version)
+                )
+            ''')
+            conn.commit()
+        
+        logger.debug(f"Using text cache {self.cache_file}")
+    
+    def get(self, content_hash: str, backend: str,
+            backend_version: str) -> Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Look up a cached extraction.
+        
+        Args:
+            content_hash: SHA-256 of the PDF file
+            backend: Extraction backend name
+            backend_version: Version of the backend library
+        
+        Returns:
+            Tuple of (text, pages, metadata), or None on a miss
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            row = conn.execute(
+                'SELECT text, pages_json, metadata_json FROM extracted_text '
+                'WHERE content_hash = ? AND backend = ? AND backend_version = ?',
+                (content_hash, backend, backend_version)
+            ).fetchone()
+        
+        if not row:
+            return None
+        try:
+            return row[0], json.loads(row[1]), json.loads(row[2] or '{}')
+        except json.JSONDecodeError:
+            return None
+    
+    def put(self, content_hash: str, backend: str, backend_version: str, text: str,
+            pages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Store an extraction.
+        
+        Args:
+            content_hash: SHA-256 of the PDF file
+            backend: Extraction backend name
+            backend_version: Version of the backend library
+            text: Full extracted text
+            pages: Per-page dicts with at least 'page_num' and 'text'
+            metadata: Document metadata reported by the backend
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO extracted_text
+                   (content_hash, backend, backend_version, text, pages_json, metadata_json, timestamp)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (content_hash, backend, backend_version, text, json.dumps(pages, ensure_ascii=False),
+                 json.dumps(metadata or {}, ensure_ascii=False), int(time.time()))
+            )
+            conn.commit()
+    
+    def get_scanned(self, content_hash: str, detector_version: str) -> Optional[bool]:
+        """
+        Look up whether a PDF was found to be scanned.
+        
+        Args:
+            content_hash: SHA-256 of the PDF file
+            detector_version: PyMuPDF version and detection thresholds
+        
+        Returns:
+            The stored verdict, or None on a miss
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            row = conn.execute(
+                'SELECT scanned FROM scan_verdicts WHERE content_hash = ? AND detector_version = ?',
+                (content_hash, detector_version)
+            ).fetchone()
+        return bool(row[0]) if row else None
+    
+    def put_scanned(self, content_hash: str, detector_version: str, scanned: bool) -> None:
+        """
+        Store whether a PDF is scanned.
+        
+        Args:
+            content_hash: SHA-256 of the PDF file
+            detector_version: PyMuPDF version and detection thresholds
+            scanned: The verdict
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO scan_verdicts (content_hash, detector_version, scanned, timestamp)
+                   VALUES (?, ?, ?, ?)''',
+                (content_hash, detector_version, int(scanned), int(time.time()))
+            )
+            conn.commit()
+    
+    def get_page_image(self, page_hash: str, zoom: float) -> Optional[bytes]:
+        """
+        Look up a rendered page image.
+        
+        Args:
+            page_hash: Hash of the page content (see pdf_extractor)
+            zoom: Render zoom factor
+        
+        Returns:
+            PNG data, or None on a miss
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            row = conn.execute(
+                'SELECT png FROM page_images WHERE page_hash = ? AND zoom = ?',
+                (page_hash, zoom)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def put_page_image(self, page_hash: str, zoom: float, png: bytes) -> None:
+        """
+        Store a rendered page image.
+        
+        Args:
+            page_hash: Hash of the page content
+            zoom: Render zoom factor
+            png: PNG data
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO page_images (page_hash, zoom, png, timestamp) VALUES (?, ?, ?, ?)',
+                (page_hash, zoom, png, int(time.time()))
+            )
+            conn.commit()
+    
+    def get_page_ocr(self, page_hash: str, zoom: float, ocr_version: str, lang: str) -> Optional[str]:
+        """
+        Look up the OCR text of a page.
+        
+        Args:
+            page_hash: Hash of the page content
+            zoom: Zoom factor the page was rendered at
+            ocr_version: PyMuPDF + Tesseract version
+            lang: Tesseract language
+        
+        Returns:
+            OCR text (possibly empty), or None on a miss
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            row = conn.execute(
+                'SELECT text FROM page_ocr WHERE page_hash = ? AND zoom = ? AND ocr_version = ? AND lang = ?',
+                (page_hash, zoom, ocr_version, lang)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def put_page_ocr(self, page_hash: str, zoom: float, ocr_version: str, lang: str, text: str) -> None:
+        """
+        Store the OCR text of a page.
+        
+        Args:
+            page_hash: Hash of the page content
+            zoom: Zoom factor the page was rendered at
+            ocr_version: PyMuPDF + Tesseract version
+            lang: Tesseract language
+            text: OCR text
+        """
+        with sqlite3.connect(self.cache_file, timeout=30) as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO page_ocr (page_hash, zoom, ocr_version, lang, text, timestamp)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (page_hash, zoom, ocr_version, lang, text, int(time.time()))
+            )
+            conn.commit()
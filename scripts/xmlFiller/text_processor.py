@@ -6,7 +6,7 @@ Handles text normalization, cleaning, and paragraph segmentation.
 import re
 import logging
 from collections import Counter
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable
 from utils import normalize_whitespace, split_paragraphs, determine_rubrum
 
 logger = logging.getLogger('nsg_converter.text_processor')
@@ -36,6 +36,47 @@ class TextProcessor:
         
         # Clean and normalize
         text = self.remove_headers_footers(text, pages)
+        processed = self._process_cleaned_text(text, extracted.get('metadata', {}))
+        processed['original_text'] = extracted.get('text', '')
+        return processed
+    
+    def process_pages(self, pages: Iterable[Dict[str, Any]],
+                      metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Process pages as they are extracted, e.g. from PDFExtractor.iter_pages.
+        
+        Each page is reduced to its lines and header/footer candidates as it
+        arrives, so no full-text copy or page list is built alongside them.
+        The result matches process_text on the pages joined with newlines
+        (PyMuPDF's full text), without 'original_text'.
+        
+        Args:
+            pages: Iterable of page dicts with 'text'
+            metadata: Document metadata to pass through
+        
+        Returns:
+            Processed text with paragraphs and metadata
+        """
+        lines = []
+        header_candidates = Counter()
+        footer_candidates = Counter()
+        page_count = 0
+        
+        for page in pages:
+            page_lines = page.get('text', '').split('\n')
+            self._count_header_footer_candidates(page_lines, header_candidates, footer_candidates)
+            lines.extend(page_lines)
+            page_count += 1
+        
+        if page_count < 3:
+            text = '\n'.join(lines)
+        else:
+            text = self._drop_header_footer_lines(lines, header_candidates, footer_candidates, page_count)
+        
+        return self._process_cleaned_text(text, metadata or {})
+    
+    def _process_cleaned_text(self, text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Dehyphenate, normalize and segment text whose headers/footers are removed."""
         text = self.dehyphenate(text)
         text = self.normalize_text(text)
         
@@ -46,10 +87,9 @@ class TextProcessor:
         paragraphs = self.enhance_paragraphs(paragraphs)
         
         return {
-            'original_text': extracted.get('text', ''),
             'cleaned_text': text,
             'paragraphs': paragraphs,
-            'metadata': extracted.get('metadata', {})
+            'metadata': metadata
         }
     
     def remove_headers_footers(self, text: str, pages: List[Dict]) -> str:
@@ -66,41 +106,42 @@ class TextProcessor:
         if len(pages) < 3:
             return text
         
-        # Collect lines from each page
-        page_lines = []
+        # Collect header/footer candidates from each page
+        header_candidates = Counter()
+        footer_candidates = Counter()
         for page in pages:
             page_text = page.get('text', '')
-            lines = page_text.split('\n')
-            page_lines.append(lines)
+            self._count_header_footer_candidates(page_text.split('\n'), header_candidates, footer_candidates)
         
+        return self._drop_header_footer_lines(text.split('\n'), header_candidates, footer_candidates,
+                                              len(pages))
+    
+    def _count_header_footer_candidates(self, lines: List[str], header_candidates: Counter,
+                                        footer_candidates: Counter) -> None:
+        """Count one page's first and last 3 lines as header/footer candidates."""
         # Find repeating lines at top (headers)
-        header_candidates = Counter()
-        for lines in page_lines:
-            if lines:
-                # Check first 3 lines
-                for line in lines[:3]:
-                    line = line.strip()
-                    if line and len(line) > 5:
-                        header_candidates[line] += 1
+        for line in lines[:3]:
+            line = line.strip()
+            if line and len(line) > 5:
+                header_candidates[line] += 1
         
         # Find repeating lines at bottom (footers)
-        footer_candidates = Counter()
-        for lines in page_lines:
-            if lines:
-                # Check last 3 lines
-                for line in lines[-3:]:
-                    line = line.strip()
-                    if line and len(line) > 5:
-                        footer_candidates[line] += 1
-        
+        for line in lines[-3:]:
+            line = line.strip()
+            if line and len(line) > 5:
+                footer_candidates[line] += 1
+    
+    def _drop_header_footer_lines(self, lines: List[str], header_candidates: Counter,
+                                  footer_candidates: Counter, page_count: int) -> str:
+        """Remove lines that start or end more than half of the pages, and page numbers."""
         # Identify headers/footers (appear on >50% of pages)
-        threshold = len(pages) * 0.5
+        threshold = page_count * 0.5
         headers = [line for line, count in header_candidates.items() if count > threshold]
         footers = [line for line, count in footer_candidates.items() if count > threshold]
         
         # Remove headers and footers
         cleaned_lines = []
-        for line in text.split('\n'):
+        for line in lines:
             line_stripped = line.strip()
             if line_stripped not in headers and line_stripped not in footers:
                 # Also filter out page numbers (common patterns)
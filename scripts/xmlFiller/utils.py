@@ -2,12 +2,16 @@
 Shared utilities for NSG PDF to XML/JSON converter.
 """
 
+import hashlib
+import json
 import logging
 import re
 import unicodedata
+from collections import defaultdict
 from datetime import datetime
 from functools import wraps
-from typing import Optional, Dict, Any, List
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
 import sys
 
 # Configure logging
@@ -190,6 +194,44 @@ def handle_errors(default_return=None):
         return wrapper
     return decorator
 
+# File helpers
+def sha256_file(path) -> str:
+    """Return the hex SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def group_pdfs_by_content(pdf_dir: Path, pattern: str = "*.pdf") -> List[Tuple[Path, str, List[str]]]:
+    """
+    Group PDFs with byte-identical content.
+    
+    Understands the content-addressed layout of linkDownloadScript
+    (index.json plus blobs/). Returns one (pdf_path, sha256, filename_bases)
+    triple per distinct PDF, ordered by first filename base; callers pass
+    the hash on instead of reading the file again.
+    """
+    names_by_hash = defaultdict(list)
+    path_by_hash = {}
+    
+    index_file = pdf_dir / 'index.json'
+    if index_file.is_file():
+        with open(index_file, 'r', encoding='utf-8') as f:
+            documents = json.load(f).get('documents', {})
+        for filename, entry in documents.items():
+            names_by_hash[entry['sha256']].append(Path(filename).stem)
+            path_by_hash[entry['sha256']] = pdf_dir / entry['blob']
+    else:
+        for pdf_file in sorted(pdf_dir.glob(pattern)):
+            content_hash = sha256_file(pdf_file)
+            names_by_hash[content_hash].append(pdf_file.stem)
+            path_by_hash.setdefault(content_hash, pdf_file)
+    
+    groups = [(path_by_hash[h], h, sorted(names)) for h, names in names_by_hash.items()]
+    groups.sort(key=lambda group: group[2][0])
+    return groups
+
 # Helper functions
 def clean_number(text: str) -> Optional[float]:
     """Extract and clean a number from text."""